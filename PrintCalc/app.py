@@ -1,77 +1,117 @@
 import os
 import logging
+import time
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
-
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Configure the database - use PostgreSQL
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+def default_config():
+    """Configuration read from the environment"""
+    return {
+        "SECRET_KEY": os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "INFO"),
+
+        # Configure the database - use PostgreSQL
+        "SQLALCHEMY_DATABASE_URI": os.environ.get("DATABASE_URL"),
+        "SQLALCHEMY_ENGINE_OPTIONS": {
+            "pool_recycle": 300,
+            "pool_pre_ping": True,
+        },
+
+        # Server-side cart storage (database, memory or file); the cookie only keeps the cart id.
+        # Runtime directories (carts, invoices, order events) default to the instance folder
+        "CART_STORE": os.environ.get("CART_STORE", "database"),
+        "CART_STORE_DIR": os.environ.get("CART_STORE_DIR"),
+        "CART_TTL_SECONDS": int(os.environ.get("CART_TTL_SECONDS", 24 * 60 * 60)),
+
+        # Order QR codes: bounded in-memory LRU plus an optional on-disk cache
+        "QR_CACHE_SIZE": int(os.environ.get("QR_CACHE_SIZE", 512)),
+        "QR_CACHE_DIR": os.environ.get("QR_CACHE_DIR"),
+
+        # Raise instead of logging when a view exceeds its SQL statement budget (tests)
+        "ASSERT_QUERY_BUDGETS": os.environ.get("ASSERT_QUERY_BUDGETS") == "1",
+
+        # PDF invoices (needs the pdf extras): rendered by a process pool and cached on disk per order.
+        # INVOICE_PDF_FONT must point to a TTF with Arabic glyphs, e.g. DejaVuSans.ttf; no font, no PDFs
+        "INVOICE_PDF_DIR": os.environ.get("INVOICE_PDF_DIR"),
+        "INVOICE_PDF_FONT": os.environ.get("INVOICE_PDF_FONT"),
+        "INVOICE_PDF_WORKERS": int(os.environ.get("INVOICE_PDF_WORKERS", 2)),
+        "INVOICE_PDF_WAIT_SECONDS": float(os.environ.get("INVOICE_PDF_WAIT_SECONDS", 5)),
+
+        # Live order board: order events reach every worker through this backend (local or file)
+        "ORDER_EVENTS_BACKEND": os.environ.get("ORDER_EVENTS_BACKEND", "local"),
+        "ORDER_EVENTS_DIR": os.environ.get("ORDER_EVENTS_DIR"),
+        "ORDER_STREAM_HEARTBEAT_SECONDS": float(os.environ.get("ORDER_STREAM_HEARTBEAT_SECONDS", 15)),
+        "ORDER_STREAM_MAX_SECONDS": float(os.environ.get("ORDER_STREAM_MAX_SECONDS", 300)),
+
+        # `flask archive-orders` moves orders completed this many days ago out of the live tables
+        "ORDER_ARCHIVE_AFTER_DAYS": int(os.environ.get("ORDER_ARCHIVE_AFTER_DAYS", 180)),
+        "ORDER_ARCHIVE_BATCH_SIZE": int(os.environ.get("ORDER_ARCHIVE_BATCH_SIZE", 1000)),
+
+        # Request/SQL metrics; with several workers each one writes its numbers to METRICS_DIR
+        "METRICS_DIR": os.environ.get("METRICS_DIR"),
+        "METRICS_TOKEN": os.environ.get("METRICS_TOKEN"),
+    }
+
+
+def create_app(config=None):
+    """Build the application without touching the database.
 
-# Initialize the app with the extension
-db.init_app(app)
+    Schema creation and default data live in `flask db-init` and `flask seed`
+    so that worker boot stays cheap; `config` overrides the environment.
+    """
+    started = time.perf_counter()
 
-with app.app_context():
-    # Import models to ensure tables are created
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    for key, name in (("CART_STORE_DIR", "carts"), ("INVOICE_PDF_DIR", "invoices"), ("ORDER_EVENTS_DIR", "order-events")):
+        if not app.config.get(key):
+            app.config[key] = os.path.join(app.instance_path, name)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Set up logging
+    logging.basicConfig(level=app.config["LOG_LEVEL"])
+
+    # Initialize the app with the extension
+    db.init_app(app)
     import models
-    
-    # Create all tables
-    db.create_all()
-    
-    # Initialize default settings if they don't exist
-    from models import PrintingPrice, AddOn, Employee
-    from werkzeug.security import generate_password_hash
-    
-    # Create default printing prices if they don't exist
-    if not PrintingPrice.query.first():
-        default_prices = [
-            PrintingPrice(name="وش أسود", price_per_unit=0.5, pages_per_unit=2),
-            PrintingPrice(name="وش وظهر أسود", price_per_unit=0.8, pages_per_unit=4)
-        ]
-        for price in default_prices:
-            db.session.add(price)
-    
-    # Create default add-ons if they don't exist
-    if not AddOn.query.first():
-        default_addons = [
-            AddOn(name="غلاف", price=7.0, is_active=True),
-            AddOn(name="تجليد", price=5.0, is_active=True)
-        ]
-        for addon in default_addons:
-            db.session.add(addon)
-    
-    # Create default admin employee if no employees exist
-    if not Employee.query.first():
-        admin_employee = Employee(
-            username="admin",
-            password=generate_password_hash("admin123"),
-            full_name="مدير النظام",
-            phone="01000000000",
-            is_active=True
-        )
-        db.session.add(admin_employee)
-    
-    db.session.commit()
-
-# Import routes after app initialization
-import routes
-
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+
+    # Set up the server-side cart store
+    from cart_store import init_cart_store
+    init_cart_store(app)
+
+    # Resolve the logged-in employee once per request, cached across requests
+    from auth_context import init_auth_context
+    init_auth_context(app)
+
+    # Count SQL statements per request for the per-view query budgets
+    from query_budget import init_query_budgets
+    init_query_budgets(app)
+
+    # Per-endpoint latency, status, SQL and pool metrics for /admin/metrics
+    from metrics import init_metrics
+    init_metrics(app)
+
+    # Pub/sub of order events for the live order board
+    from order_events import init_order_events
+    init_order_events(app)
+
+    # Register maintenance CLI commands
+    from commands import register_commands
+    register_commands(app)
+
+    # Routes are recorded when the module is imported and replayed onto each new app
+    import routes
+    routes.register(app)
+
+    app.extensions["startup_seconds"] = time.perf_counter() - started
+    app.logger.info("Application created in %.1f ms", app.extensions["startup_seconds"] * 1000)
+    return app
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, g, session
+from sqlalchemy import select
+from app import db
+from models import Employee
+from snapshot_cache import read_stamp, write_stamp
+
+ADMIN_USERNAME = 'admin'
+
+# Who is making the request; employee_id is None when nobody is logged in
+AuthContext = namedtuple('AuthContext', 'employee_id username full_name is_active is_admin')
+ANONYMOUS = AuthContext(None, None, None, False, False)
+# Host-wide stamp bumped on every employee edit; workers drop their cached contexts when it changes
+AUTH_STAMP = 'auth'
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire `ttl` seconds after being stored.
+
+    With a `stamp` name, every entry is dropped as soon as that stamp changes
+    (see snapshot_cache.write_stamp), in this worker and all others.
+    """
+
+    def __init__(self, ttl, max_entries=1024, stamp=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stamp = stamp
+        self._entries = {}
+        self._seen_stamp = read_stamp(stamp) if stamp else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        stamp = read_stamp(self.stamp) if self.stamp else None
+        with self._lock:
+            if stamp != self._seen_stamp:
+                self._entries.clear()
+                self._seen_stamp = stamp
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest if still full
+                now = time.monotonic()
+                for stale in [k for k, (expires, _) in self._entries.items() if expires < now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.max_entries:
+                    del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+def _load_auth_context(employee_id):
+    row = db.session.execute(
+        select(Employee.id, Employee.username, Employee.full_name, Employee.is_active)
+        .where(Employee.id == employee_id)
+    ).first()
+    if row is None:
+        return ANONYMOUS
+    return AuthContext(row.id, row.username, row.full_name, bool(row.is_active), row.username == ADMIN_USERNAME)
+
+
+def _get_cache():
+    return current_app.extensions['auth_cache']
+
+
+def current_auth():
+    """Return the AuthContext of this request, resolving it at most once.
+
+    Contexts are shared between requests through a per-process TTL cache, so
+    a hot path costs no query; invalidate_auth() reaches every worker through
+    the auth stamp, and AUTH_CACHE_TTL_SECONDS bounds staleness otherwise.
+    """
+    if 'auth' not in g:
+        employee_id = session.get('employee_id')
+        if not employee_id:
+            g.auth = ANONYMOUS
+        else:
+            cache = _get_cache()
+            auth = cache.get(employee_id)
+            if auth is None:
+                auth = _load_auth_context(employee_id)
+                cache.put(employee_id, auth)
+            g.auth = auth
+    return g.auth
+
+
+def is_admin():
+    """Check if the current user is the admin"""
+    return current_auth().is_admin
+
+
+def invalidate_auth(employee_id):
+    """Must be called after an employee is edited or deleted (and committed)"""
+    _get_cache().delete(employee_id)
+    write_stamp(AUTH_STAMP)
+    if g.get('auth') and g.auth.employee_id == employee_id:
+        g.pop('auth')
+
+
+def auth_cache_stats():
+    return _get_cache().stats()
+
+
+def _forget_auth():
+    # The app context (and so g) can outlive one request, e.g. under the CLI
+    g.pop('auth', None)
+
+
+def init_auth_context(app):
+    """Attach the per-process employee cache"""
+    app.extensions['auth_cache'] = TTLCache(app.config.get('AUTH_CACHE_TTL_SECONDS', 60), stamp=AUTH_STAMP)
+    app.before_request(_forget_auth)
@@ -0,0 +1,6 @@
+"""Benchmarks for the hot endpoints against generated datasets.
+
+    python -m bench generate /tmp/bench.db --orders 1000000
+    python -m bench run /tmp/bench.db --output before.json
+    python -m bench compare before.json after.json
+"""
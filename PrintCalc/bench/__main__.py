@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import sys
+
+
+def _create_app(database):
+    from app import create_app
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(database)}',
+        'LOG_LEVEL': 'WARNING',
+    })
+
+
+def generate_command(args):
+    from bench.datagen import generate_dataset
+
+    def progress(done, total, seconds):
+        print(f'\r{done}/{total} orders ({seconds:.0f}s)', end='', file=sys.stderr, flush=True)
+
+    app = _create_app(args.database)
+    with app.app_context():
+        summary = generate_dataset(args.years, args.subjects, args.books, args.orders,
+                                   args.days, args.max_items, args.seed, progress=progress)
+    print(file=sys.stderr)
+    print(json.dumps(summary))
+
+
+def run_command(args):
+    from bench.runner import run_benchmarks
+
+    app = _create_app(args.database)
+    results = run_benchmarks(app, args.iterations, args.warmup, args.only, args.seed)
+    for name, result in results['scenarios'].items():
+        print(f"{name:22} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+              f"p99 {result['p99_ms']:8.2f} ms  sql {result['sql_per_request']:5.1f}  errors {result['errors']}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+def compare_command(args):
+    from bench.runner import compare_results
+
+    with open(args.base) as base_file, open(args.current) as current_file:
+        rows = compare_results(json.load(base_file), json.load(current_file), args.threshold)
+    for name, base_p50, p50, base_p95, p95, regressed in rows:
+        print(f"{name:22} p50 {base_p50:8.2f} -> {p50:8.2f} ms  p95 {base_p95:8.2f} -> {p95:8.2f} ms"
+              + ('  REGRESSION' if regressed else ''))
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Benchmark the hot endpoints.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='generate a synthetic SQLite dataset')
+    generate.add_argument('database')
+    generate.add_argument('--years', type=int, default=6)
+    generate.add_argument('--subjects', type=int, default=12, help='subjects per year')
+    generate.add_argument('--books', type=int, default=8, help='books per subject')
+    generate.add_argument('--orders', type=int, default=100000)
+    generate.add_argument('--days', type=int, default=365, help='order history length')
+    generate.add_argument('--max-items', type=int, default=5)
+    generate.add_argument('--seed', type=int, default=42)
+    generate.set_defaults(handler=generate_command)
+
+    run = commands.add_parser('run', help='run the scenarios against a dataset')
+    run.add_argument('database')
+    run.add_argument('--iterations', type=int, default=200)
+    run.add_argument('--warmup', type=int, default=20)
+    run.add_argument('--only', nargs='+', help='scenario names to run')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--output', help='write the results as JSON')
+    run.set_defaults(handler=run_command)
+
+    compare = commands.add_parser('compare', help='compare two result files')
+    compare.add_argument('base')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.10, help='allowed p95 growth (0.10 = 10%%)')
+    compare.set_defaults(handler=compare_command)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
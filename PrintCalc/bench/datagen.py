@@ -0,0 +1,158 @@
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, text
+from app import db
+from models import AcademicYear, Subject, Book, PrintingPrice, AddOn, Employee, Order, OrderItem
+
+# Share of orders per status; orders older than RECENT_DAYS are nearly all completed
+RECENT_STATUS_MIX = (('new', 0.4), ('in_progress', 0.3), ('completed', 0.3))
+OLD_STATUS_MIX = (('new', 0.01), ('in_progress', 0.02), ('completed', 0.97))
+RECENT_DAYS = 3
+
+
+def _sqlite_fast_writes():
+    # Generated data can be regenerated, so trade durability for speed
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text('PRAGMA synchronous = OFF'))
+        db.session.execute(text('PRAGMA journal_mode = MEMORY'))
+
+
+def _insert_chunked(table, rows, chunk_size):
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(table), rows[start:start + chunk_size])
+    db.session.commit()
+
+
+def generate_catalog(years=6, subjects_per_year=12, books_per_subject=8, rng=None, chunk_size=10000):
+    """Insert years, subjects and books; about 5% of books are inactive.
+
+    Returns a list of (book_id, page_count, is_active).
+    """
+    rng = rng or random.Random(42)
+    first_year = (db.session.scalar(select(func.max(AcademicYear.id))) or 0) + 1
+    first_subject = (db.session.scalar(select(func.max(Subject.id))) or 0) + 1
+    first_book = (db.session.scalar(select(func.max(Book.id))) or 0) + 1
+
+    year_rows, subject_rows, book_rows = [], [], []
+    for y in range(years):
+        year_id = first_year + y
+        year_rows.append({'id': year_id, 'name': f'سنة {year_id}', 'is_active': True})
+        for s in range(subjects_per_year):
+            subject_id = first_subject + len(subject_rows)
+            subject_rows.append({'id': subject_id, 'name': f'مادة {subject_id}', 'year_id': year_id, 'is_active': True})
+            for b in range(books_per_subject):
+                book_rows.append({
+                    'id': first_book + len(book_rows),
+                    'name': f'كتاب {first_book + len(book_rows)}',
+                    'page_count': rng.randint(40, 400),
+                    'subject_id': subject_id,
+                    'is_active': rng.random() > 0.05,
+                })
+
+    _insert_chunked(AcademicYear, year_rows, chunk_size)
+    _insert_chunked(Subject, subject_rows, chunk_size)
+    _insert_chunked(Book, book_rows, chunk_size)
+    return [(row['id'], row['page_count'], row['is_active']) for row in book_rows]
+
+
+def _pick_status(rng, mix):
+    roll = rng.random()
+    for status, share in mix:
+        roll -= share
+        if roll < 0:
+            return status
+    return mix[-1][0]
+
+
+def generate_orders(count, books, days=365, max_items=5, rng=None, chunk_size=10000, progress=None):
+    """Insert `count` orders spread over the last `days` days with 1..max_items items each.
+
+    Orders get ascending created_at with their ids, like real traffic, and
+    costs priced the same way the quote engine does.
+    """
+    rng = rng or random.Random(42)
+    printing_types = db.session.execute(
+        select(PrintingPrice.id, PrintingPrice.price_per_unit, PrintingPrice.pages_per_unit)
+    ).all()
+    addons = db.session.execute(select(AddOn.id, AddOn.price)).all()
+    employee_ids = db.session.scalars(select(Employee.id)).all() or [None]
+    active_books = [(book_id, pages) for book_id, pages, active in books if active] or \
+                   [(book_id, pages) for book_id, pages, _ in books]
+
+    next_order_id = (db.session.scalar(select(func.max(Order.id))) or 0) + 1
+    next_item_id = (db.session.scalar(select(func.max(OrderItem.id))) or 0) + 1
+    now = datetime.utcnow()
+    start = now - timedelta(days=days)
+    span = (now - start).total_seconds()
+    recent = now - timedelta(days=RECENT_DAYS)
+
+    started = time.perf_counter()
+    for chunk_start in range(0, count, chunk_size):
+        order_rows, item_rows = [], []
+        for i in range(chunk_start, min(count, chunk_start + chunk_size)):
+            created_at = start + timedelta(seconds=span * (i + rng.random()) / count)
+            status = _pick_status(rng, RECENT_STATUS_MIX if created_at >= recent else OLD_STATUS_MIX)
+            printing_type_id, price_per_unit, pages_per_unit = rng.choice(printing_types)
+            chosen_addons = rng.sample(addons, rng.randint(0, len(addons)))
+
+            total_cost = sum(price for _, price in chosen_addons)
+            for book_id, pages in rng.sample(active_books, min(len(active_books), rng.randint(1, max_items))):
+                quantity = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+                unit_cost = -(-pages // pages_per_unit) * price_per_unit
+                item_rows.append({'id': next_item_id, 'order_id': next_order_id, 'book_id': book_id,
+                                  'quantity': quantity, 'unit_cost': unit_cost, 'total_cost': unit_cost * quantity})
+                total_cost += unit_cost * quantity
+                next_item_id += 1
+
+            order_rows.append({
+                'id': next_order_id,
+                'order_number': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                'customer_name': f'عميل {next_order_id}',
+                'customer_phone': f'010{next_order_id:08d}'[-11:],
+                'total_cost': total_cost,
+                'status': status,
+                'printing_type_id': printing_type_id,
+                'selected_addons': json.dumps([addon_id for addon_id, _ in chosen_addons]),
+                'created_at': created_at,
+                'completed_at': created_at + timedelta(hours=rng.randint(1, 48)) if status == 'completed' else None,
+                'employee_id': rng.choice(employee_ids),
+            })
+            next_order_id += 1
+
+        db.session.execute(insert(Order), order_rows)
+        db.session.execute(insert(OrderItem), item_rows)
+        db.session.commit()
+        if progress:
+            progress(chunk_start + len(order_rows), count, time.perf_counter() - started)
+
+
+def generate_dataset(years=6, subjects_per_year=12, books_per_subject=8, orders=100000,
+                     days=365, max_items=5, seed=42, chunk_size=10000, progress=None):
+    """Create the schema and defaults, then a scaled catalog and order history.
+
+    Must run inside an app context. The dashboard counters and reporting
+    rollups are rebuilt at the end so they match the generated orders.
+    """
+    from seed import create_schema, seed_defaults
+    from catalog import invalidate_catalog
+    from dashboard_stats import reconcile_order_counters
+    from price_matrix import rebuild_price_matrix, invalidate_price_matrix
+    from rollups import rebuild_rollups
+
+    create_schema()
+    seed_defaults()
+    _sqlite_fast_writes()
+
+    rng = random.Random(seed)
+    books = generate_catalog(years, subjects_per_year, books_per_subject, rng, chunk_size)
+    generate_orders(orders, books, days, max_items, rng, chunk_size, progress)
+    reconcile_order_counters()
+    rebuild_rollups()
+    rebuild_price_matrix()
+    db.session.commit()
+    invalidate_catalog()
+    invalidate_price_matrix()
+    return {'years': years, 'subjects': years * subjects_per_year, 'books': len(books), 'orders': orders}
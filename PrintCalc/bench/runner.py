@@ -0,0 +1,191 @@
+import platform
+import random
+import subprocess
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from app import db
+from models import Book, Subject, Employee, Order, PrintingPrice, AddOn
+
+# `prepare(client, fixtures)` runs untimed before every iteration, `request` is what gets timed
+Scenario = namedtuple('Scenario', 'name prepare request')
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated q-th percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def load_fixtures(sample_size=1000, seed=42):
+    """Ids and order numbers the scenarios draw from; must run in an app context"""
+    from order_listing import encode_cursor
+
+    rng = random.Random(seed)
+    book_ids = db.session.scalars(select(Book.id).where(Book.is_active == True).limit(sample_size)).all()
+    year_ids = db.session.scalars(
+        select(Subject.year_id).join(Book, Book.subject_id == Subject.id)
+        .where(Book.is_active == True).distinct().order_by(Subject.year_id)
+    ).all()
+    order_count = db.session.scalar(select(func.count(Order.id)))
+    order_numbers = db.session.scalars(
+        select(Order.order_number).order_by(func.random()).limit(sample_size)
+    ).all()
+    # A cursor about 90% of the way through the history for a deep admin page
+    deep_order = db.session.execute(
+        select(Order.id, Order.created_at).order_by(Order.created_at.desc(), Order.id.desc())
+        .offset(int(order_count * 0.9)).limit(1)
+    ).first()
+    return {
+        'rng': rng,
+        'book_ids': book_ids,
+        'year_ids': year_ids,
+        'order_numbers': order_numbers,
+        'deep_cursor': encode_cursor(deep_order) if deep_order else None,
+        'admin_id': db.session.scalar(select(Employee.id).where(Employee.username == 'admin')),
+        'printing_price_id': db.session.scalar(select(PrintingPrice.id).order_by(PrintingPrice.id)),
+        'addon_ids': db.session.scalars(select(AddOn.id)).all(),
+        'order_count': order_count,
+    }
+
+
+def _fill_cart(client, fixtures, books=5):
+    with client.session_transaction() as session:
+        session.pop('cart_id', None)
+    for book_id in fixtures['rng'].sample(fixtures['book_ids'], min(books, len(fixtures['book_ids']))):
+        client.get(f'/cart/add/{book_id}')
+
+
+def _calculate(client, fixtures):
+    return client.post('/cart/calculate', data={
+        'printing_price_id': fixtures['printing_price_id'],
+        'addons': fixtures['addon_ids'],
+    })
+
+
+def _prepare_invoice(client, fixtures):
+    _fill_cart(client, fixtures)
+    _calculate(client, fixtures)
+
+
+def _nothing(client, fixtures):
+    pass
+
+
+SCENARIOS = (
+    Scenario('user_select_books', _nothing, lambda client, fixtures: client.get('/books')),
+    # The books page is a shell; its content comes from these two APIs
+    Scenario('api_catalog', _nothing, lambda client, fixtures: client.get('/api/catalog')),
+    Scenario('api_catalog_books', _nothing, lambda client, fixtures: client.get(
+        '/api/catalog/books', query_string={'year_id': fixtures['rng'].choice(fixtures['year_ids'])})),
+    Scenario('calculate_cart_cost', _fill_cart, _calculate),
+    Scenario('print_invoice', _prepare_invoice, lambda client, fixtures: client.post('/invoice/print', data={
+        'customer_name': 'عميل تجريبي', 'customer_phone': '01000000000', 'amount_paid': '0',
+    })),
+    Scenario('admin_orders', _nothing, lambda client, fixtures: client.get('/admin/orders')),
+    Scenario('admin_orders_deep', _nothing, lambda client, fixtures: client.get(
+        '/admin/orders', query_string={'after': fixtures['deep_cursor']})),
+    Scenario('track_order', _nothing, lambda client, fixtures: client.get(
+        f"/order/{fixtures['rng'].choice(fixtures['order_numbers'])}")),
+)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(client, scenario, fixtures, iterations, warmup):
+    """Time one scenario; returns its latency percentiles (ms), SQL per request and errors"""
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    latencies = []
+    sql_counts = []
+    errors = 0
+    for iteration in range(warmup + iterations):
+        scenario.prepare(client, fixtures)
+        statements[0] = 0
+        event.listen(Engine, 'before_cursor_execute', count)
+        started = time.perf_counter()
+        try:
+            response = scenario.request(client, fixtures)
+        finally:
+            elapsed = time.perf_counter() - started
+            event.remove(Engine, 'before_cursor_execute', count)
+        if iteration < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        sql_counts.append(statements[0])
+        if response.status_code >= 400:
+            errors += 1
+
+    latencies.sort()
+    result = {'iterations': iterations, 'warmup': warmup, 'errors': errors}
+    for q in PERCENTILES:
+        result[f'p{q}_ms'] = percentile(latencies, q)
+    result.update({
+        'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+        'min_ms': latencies[0] if latencies else None,
+        'max_ms': latencies[-1] if latencies else None,
+        'sql_per_request': sum(sql_counts) / len(sql_counts) if sql_counts else None,
+    })
+    return result
+
+
+def run_benchmarks(app, iterations=200, warmup=20, only=None, seed=42):
+    """Drive every scenario (or those named in `only`) through the test client"""
+    with app.app_context():
+        fixtures = load_fixtures(seed=seed)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+        session['employee_id'] = fixtures['admin_id']
+        session['employee_name'] = 'benchmark'
+
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'],
+            'orders': fixtures['order_count'],
+            'iterations': iterations,
+            'warmup': warmup,
+        },
+        'scenarios': {},
+    }
+    for scenario in SCENARIOS:
+        if only and scenario.name not in only:
+            continue
+        results['scenarios'][scenario.name] = run_scenario(client, scenario, fixtures, iterations, warmup)
+    return results
+
+
+def compare_results(base, current, threshold=0.10):
+    """Rows of (scenario, base p50, p50, base p95, p95, regressed) for scenarios in both runs.
+
+    A scenario regresses when its p95 grows by more than `threshold`.
+    """
+    rows = []
+    for name, result in current['scenarios'].items():
+        before = base['scenarios'].get(name)
+        if before is None:
+            continue
+        regressed = result['p95_ms'] > before['p95_ms'] * (1 + threshold)
+        rows.append((name, before['p50_ms'], result['p50_ms'], before['p95_ms'], result['p95_ms'], regressed))
+    return rows
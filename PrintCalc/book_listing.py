@@ -0,0 +1,38 @@
+from collections import namedtuple
+from sqlalchemy import select
+from app import db
+from models import AcademicYear, Subject, Book
+
+BookPage = namedtuple('BookPage', 'items next_after')
+
+MAX_PER_PAGE = 100
+
+
+def get_books_page(subject_id=None, year_id=None, search=None, active=None, after=None, per_page=50):
+    """One page of books as plain dicts, ordered by id, with keyset pagination.
+
+    `after` is the last book id of the previous page; `next_after` is None on
+    the last page. The page is a single joined query whatever the filters.
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    query = (
+        select(Book.id, Book.name, Book.page_count, Book.description, Book.is_active,
+               Book.subject_id, Subject.name.label('subject_name'),
+               Subject.year_id, AcademicYear.name.label('year_name'))
+        .join(Subject, Subject.id == Book.subject_id)
+        .join(AcademicYear, AcademicYear.id == Subject.year_id)
+    )
+    if subject_id:
+        query = query.where(Book.subject_id == subject_id)
+    if year_id:
+        query = query.where(Subject.year_id == year_id)
+    if search:
+        query = query.where(Book.name.contains(search, autoescape=True))
+    if active is not None:
+        query = query.where(Book.is_active == active)
+    if after:
+        query = query.where(Book.id > after)
+
+    rows = db.session.execute(query.order_by(Book.id).limit(per_page + 1)).all()
+    items = [row._asdict() for row in rows[:per_page]]
+    return BookPage(items, items[-1]['id'] if len(rows) > per_page else None)
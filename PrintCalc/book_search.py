@@ -0,0 +1,141 @@
+import re
+import threading
+from collections import defaultdict
+from catalog import get_catalog
+
+NGRAM = 3
+
+# Harakat, superscript alef and tatweel carry no meaning for matching
+_DIACRITICS = re.compile('[ً-ٰٟـ]')
+_LETTER_VARIANTS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',  # أ إ آ ٱ -> ا
+    'ى': 'ي', 'ئ': 'ي',  # ى ئ -> ي
+    'ؤ': 'و',  # ؤ -> و
+    'ة': 'ه',  # ة -> ه
+})
+# Arabic-Indic and Persian digits -> ASCII
+_LETTER_VARIANTS.update(str.maketrans('٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹', '01234567890123456789'))
+_SEPARATORS = re.compile(r'[^\w]+')
+
+
+def normalize_arabic(text):
+    """Fold diacritics, alef/ya/ta-marbuta variants, digits and case so spellings compare equal"""
+    text = _DIACRITICS.sub('', text or '').translate(_LETTER_VARIANTS).lower()
+    return _SEPARATORS.sub(' ', text).strip()
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class BookSearchIndex:
+    """Trigram index (with token prefixes for short terms) over book, subject and year names"""
+
+    # Points per query term, by where it matches
+    NAME_TOKEN, NAME_PREFIX, NAME, SUBJECT, OTHER = 8, 5, 3, 2, 1
+
+    def __init__(self, books):
+        # Shorter names first, so ties favour the closest match
+        self.books = tuple(sorted(books, key=lambda book: (len(book.name), book.id)))
+        self.texts = []
+        self.names = []
+        self.subjects = []
+        grams = defaultdict(set)
+        prefixes = defaultdict(set)
+        name_tokens = defaultdict(set)
+        name_prefixes = defaultdict(set)
+        for doc, book in enumerate(self.books):
+            name, subject, year = (normalize_arabic(book.name), normalize_arabic(book.subject_name),
+                                   normalize_arabic(book.year_name))
+            text = f'{name} | {subject} | {year}'
+            self.texts.append(text)
+            self.names.append(name)
+            self.subjects.append(subject)
+            for gram in _ngrams(text):
+                grams[gram].add(doc)
+            for token in text.split():
+                for length in range(1, NGRAM):
+                    prefixes[token[:length]].add(doc)
+            for token in name.split():
+                name_tokens[token].add(doc)
+                for length in range(1, len(token) + 1):
+                    name_prefixes[token[:length]].add(doc)
+        self.grams = {key: frozenset(docs) for key, docs in grams.items()}
+        self.prefixes = {key: frozenset(docs) for key, docs in prefixes.items()}
+        self.name_tokens = {key: frozenset(docs) for key, docs in name_tokens.items()}
+        self.name_prefixes = {key: frozenset(docs) for key, docs in name_prefixes.items()}
+
+    def _candidates(self, term):
+        if len(term) < NGRAM:
+            return self.prefixes.get(term, frozenset())
+        postings = sorted((self.grams.get(gram, frozenset()) for gram in _ngrams(term)), key=len)
+        docs = postings[0]
+        for posting in postings[1:]:
+            if not docs:
+                break
+            docs = docs & posting
+        return {doc for doc in docs if term in self.texts[doc]}
+
+    def _add_scores(self, scores, term, docs):
+        exact = self.name_tokens.get(term, frozenset()) & docs
+        prefix = (self.name_prefixes.get(term, frozenset()) & docs) - exact
+        for doc in exact:
+            scores[doc] += self.NAME_TOKEN
+        for doc in prefix:
+            scores[doc] += self.NAME_PREFIX
+        for doc in docs - exact - prefix:
+            if term in self.names[doc]:
+                scores[doc] += self.NAME
+            elif term in self.subjects[doc]:
+                scores[doc] += self.SUBJECT
+            else:
+                scores[doc] += self.OTHER
+
+    def search(self, query, limit=20):
+        """Books matching every term of `query`, best first"""
+        terms = normalize_arabic(query).split()
+        if not terms:
+            return []
+
+        docs = None
+        for term in sorted(terms, key=len, reverse=True):
+            matches = self._candidates(term)
+            docs = matches if docs is None else docs & matches
+            if not docs:
+                return []
+
+        scores = dict.fromkeys(docs, 0)
+        for term in terms:
+            self._add_scores(scores, term, docs)
+
+        # Bucket by score; docs are numbered in tie-break order already
+        buckets = defaultdict(list)
+        for doc, score in scores.items():
+            buckets[score].append(doc)
+        results = []
+        for score in sorted(buckets, reverse=True):
+            results.extend(sorted(buckets[score])[:limit - len(results)])
+            if len(results) >= limit:
+                break
+        return [self.books[doc] for doc in results]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """Index of the current catalog snapshot, rebuilt whenever the catalog is reloaded"""
+    global _index
+    catalog = get_catalog()
+    index = _index
+    if index is None or index[0] is not catalog:
+        with _index_lock:
+            if _index is None or _index[0] is not catalog:
+                _index = (catalog, BookSearchIndex(catalog.books_by_id.values()))
+            index = _index
+    return index[1]
+
+
+def search_books(query, limit=20):
+    return get_search_index().search(query, limit)
@@ -0,0 +1,106 @@
+import json
+import uuid
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from models import Order, OrderItem
+from pricing import get_pricing
+from quote_engine import QuoteError, cart_spec_from_json, quote_carts
+from dashboard_stats import record_orders_created
+from rollups import RollupOrder, RollupItem, record_created_orders
+
+# Column lengths of Order
+CUSTOMER_FIELD_LIMITS = {
+    'customer_name': Order.customer_name.type.length,
+    'customer_phone': Order.customer_phone.type.length,
+}
+
+
+class BulkOrderError(ValueError):
+    """Raised when a bulk payload is malformed as a whole"""
+
+
+def create_orders_in_bulk(payload, employee_id=None):
+    """Create many orders from one payload in a single transaction.
+
+    `payload` is {"printing_price_id", "addons", "orders": [...]}, where each
+    order has customer_name, customer_phone, items and may override the
+    batch printing_price_id/addons. Every order is priced with one book
+    fetch; invalid orders are reported in `errors` and skipped, the rest
+    are inserted with two bulk INSERTs.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('orders'), list):
+        raise BulkOrderError('expected a JSON object with an orders list')
+
+    pricing = get_pricing()
+    errors = []
+    specs = []
+    accepted = []
+    for index, order_data in enumerate(payload['orders']):
+        try:
+            if not isinstance(order_data, dict):
+                raise QuoteError('each order must be a JSON object')
+            for field, limit in CUSTOMER_FIELD_LIMITS.items():
+                if len(str(order_data.get(field) or '')) > limit:
+                    raise QuoteError(f'{field} is longer than {limit} characters')
+            specs.append(cart_spec_from_json(order_data, pricing, payload))
+            accepted.append((index, order_data))
+        except QuoteError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    order_rows = []
+    item_rows = []
+    rollup_orders = []
+    created = []
+    now = datetime.utcnow()
+    for (index, order_data), quote in zip(accepted, quote_carts(specs)):
+        if isinstance(quote, QuoteError):
+            errors.append({'index': index, 'error': str(quote)})
+            continue
+
+        order_number = str(uuid.uuid4())
+        order_rows.append({
+            'order_number': order_number,
+            'customer_name': str(order_data.get('customer_name') or ''),
+            'customer_phone': str(order_data.get('customer_phone') or ''),
+            'total_cost': quote.total_cost,
+            'status': 'new',
+            'printing_type_id': quote.printing_type.id,
+            'selected_addons': json.dumps([addon.id for addon in quote.addons]),
+            'created_at': now,
+            'employee_id': employee_id,
+        })
+        item_rows.append([
+            {
+                'book_id': line.book_id,
+                'quantity': line.quantity,
+                'unit_cost': line.printing_cost_per_copy,
+                'total_cost': line.total_printing_cost,
+            } for line in quote.lines
+        ])
+        rollup_orders.append(RollupOrder(
+            now, quote.printing_type.id, quote.total_cost, [addon.id for addon in quote.addons],
+            [RollupItem(line.book_id, line.quantity, line.total_printing_cost) for line in quote.lines],
+        ))
+        created.append({'index': index, 'order_number': order_number, 'total_cost': quote.total_cost})
+
+    if order_rows:
+        # Map ids back through our own order numbers so RETURNING order doesn't matter
+        order_ids = dict(db.session.execute(
+            insert(Order).returning(Order.order_number, Order.id),
+            order_rows
+        ).all())
+
+        flat_items = []
+        for order_row, items in zip(order_rows, item_rows):
+            for item in items:
+                item['order_id'] = order_ids[order_row['order_number']]
+                flat_items.append(item)
+        db.session.execute(insert(OrderItem), flat_items)
+
+        record_orders_created(len(order_rows))
+        record_created_orders(rollup_orders)
+        db.session.commit()
+
+    errors.sort(key=lambda error: error['index'])
+    return {'created': created, 'errors': errors}
@@ -0,0 +1,229 @@
+import json
+import os
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from flask import g, session, current_app
+from sqlalchemy import select, update, delete
+from app import db
+from models import CartSession
+
+
+class CartStore(ABC):
+    """Interface of a server-side cart backend.
+
+    Carts are stored as JSON-compatible dicts under an opaque id and expire
+    `ttl` seconds after their last save.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    @abstractmethod
+    def load(self, cart_id):
+        """Return the stored dict, or None if missing or expired"""
+
+    @abstractmethod
+    def save(self, cart_id, data):
+        """Store the dict and push its expiry back by ttl seconds"""
+
+    @abstractmethod
+    def delete(self, cart_id):
+        """Remove the cart if it exists"""
+
+    @abstractmethod
+    def sweep(self):
+        """Remove expired carts and return how many were removed"""
+
+
+class DatabaseCartStore(CartStore):
+    """Carts kept in the cart_sessions table, shared by all workers"""
+
+    def load(self, cart_id):
+        data = db.session.execute(
+            select(CartSession.data)
+            .where(CartSession.id == cart_id, CartSession.expires_at > datetime.utcnow())
+        ).scalar()
+        return json.loads(data) if data else None
+
+    def save(self, cart_id, data):
+        now = datetime.utcnow()
+        values = {
+            'data': json.dumps(data),
+            'expires_at': now + timedelta(seconds=self.ttl),
+            'updated_at': now,
+        }
+        result = db.session.execute(
+            update(CartSession).where(CartSession.id == cart_id).values(**values)
+        )
+        if result.rowcount == 0:
+            db.session.add(CartSession(id=cart_id, **values))
+        db.session.commit()
+
+    def delete(self, cart_id):
+        db.session.execute(delete(CartSession).where(CartSession.id == cart_id))
+        db.session.commit()
+
+    def sweep(self):
+        result = db.session.execute(
+            delete(CartSession).where(CartSession.expires_at <= datetime.utcnow())
+        )
+        db.session.commit()
+        return result.rowcount
+
+
+class MemoryCartStore(CartStore):
+    """Carts kept in this process only; for tests and single-worker setups"""
+
+    def __init__(self, ttl):
+        super().__init__(ttl)
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def load(self, cart_id):
+        entry = self._carts.get(cart_id)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return json.loads(entry[1])
+
+    def save(self, cart_id, data):
+        with self._lock:
+            self._carts[cart_id] = (time.time() + self.ttl, json.dumps(data))
+
+    def delete(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [cart_id for cart_id, (expires_at, _) in self._carts.items() if expires_at <= now]
+            for cart_id in expired:
+                del self._carts[cart_id]
+        return len(expired)
+
+
+class FileCartStore(CartStore):
+    """Carts kept as one JSON file each in a local directory"""
+
+    def __init__(self, ttl, directory):
+        super().__init__(ttl)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, cart_id):
+        # Cart ids come from the signed session cookie, but never trust them as paths
+        if not cart_id.replace('-', '').replace('_', '').isalnum():
+            raise ValueError('invalid cart id')
+        return os.path.join(self.directory, f'{cart_id}.json')
+
+    def load(self, cart_id):
+        path = self._path(cart_id)
+        try:
+            if os.path.getmtime(path) + self.ttl <= time.time():
+                return None
+            with open(path) as cart_file:
+                return json.load(cart_file)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, cart_id, data):
+        path = self._path(cart_id)
+        # Unique per thread too: two requests of one worker may save the same cart at once
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as cart_file:
+            json.dump(data, cart_file)
+        os.replace(tmp_path, path)
+
+    def delete(self, cart_id):
+        try:
+            os.remove(self._path(cart_id))
+        except OSError:
+            pass
+
+    def sweep(self):
+        removed = 0
+        deadline = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.json') and os.path.getmtime(path) <= deadline:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+class ServerCart:
+    """Cart items and last calculation of the current browser"""
+
+    def __init__(self, cart_id, data=None):
+        data = data or {}
+        self.id = cart_id
+        self.items = data.get('items', [])
+        self.last_calculation = data.get('last_calculation')
+        self.modified = False
+
+    def to_dict(self):
+        return {'items': self.items, 'last_calculation': self.last_calculation}
+
+
+def create_cart_store(config):
+    """Build the backend selected by the CART_STORE setting"""
+    ttl = config.get('CART_TTL_SECONDS', 24 * 60 * 60)
+    backend = config.get('CART_STORE', 'database')
+    if backend == 'database':
+        return DatabaseCartStore(ttl)
+    if backend == 'memory':
+        return MemoryCartStore(ttl)
+    if backend == 'file':
+        return FileCartStore(ttl, config['CART_STORE_DIR'])
+    raise ValueError(f'Unknown CART_STORE backend: {backend}')
+
+
+def get_cart_store():
+    return current_app.extensions['cart_store']
+
+
+def current_cart():
+    """Return the cart of this request, loading it at most once"""
+    if 'cart' not in g:
+        cart_id = session.get('cart_id')
+        data = get_cart_store().load(cart_id) if cart_id else None
+        g.cart = ServerCart(cart_id, data)
+    return g.cart
+
+
+def clear_current_cart():
+    """Delete the stored cart and forget its id"""
+    cart = current_cart()
+    if cart.id:
+        get_cart_store().delete(cart.id)
+    session.pop('cart_id', None)
+    g.cart = ServerCart(None)
+
+
+def _save_modified_cart(response):
+    cart = g.get('cart')
+    if cart is not None and cart.modified:
+        if not cart.id:
+            cart.id = secrets.token_urlsafe(24)
+            session['cart_id'] = cart.id
+        get_cart_store().save(cart.id, cart.to_dict())
+        cart.modified = False
+    return response
+
+
+def _forget_loaded_cart():
+    # The app context (and so g) can outlive one request, e.g. under the CLI
+    g.pop('cart', None)
+
+
+def init_cart_store(app):
+    """Attach the configured cart store and persist modified carts after each request"""
+    app.extensions['cart_store'] = create_cart_store(app.config)
+    app.before_request(_forget_loaded_cart)
+    app.after_request(_save_modified_cart)
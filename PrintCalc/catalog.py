@@ -0,0 +1,102 @@
+import hashlib
+import json
+from collections import namedtuple
+from types import MappingProxyType
+from sqlalchemy import select
+from app import db
+from models import AcademicYear, Subject, Book
+from snapshot_cache import SnapshotCache
+
+# Read-only records used by the catalog pages instead of ORM objects
+CatalogYear = namedtuple('CatalogYear', 'id name description')
+CatalogBook = namedtuple('CatalogBook', 'id name page_count subject_id subject_name year_id year_name')
+CatalogSubject = namedtuple('CatalogSubject', 'id name book_count')
+CatalogSection = namedtuple('CatalogSection', 'year books subjects')
+# `version` is a digest of the content, identical in every worker that loaded the same data
+Catalog = namedtuple('Catalog', 'sections sections_by_year_id books_by_id version')
+
+# Active subjects for admin <select>s, with the serialized payload built once
+SubjectOption = namedtuple('SubjectOption', 'id name year_name')
+SubjectOptions = namedtuple('SubjectOptions', 'options payload etag')
+
+
+def _load_catalog():
+    """Load the active year -> subject -> book tree with a single joined query"""
+    rows = db.session.execute(
+        select(AcademicYear.id, AcademicYear.name, AcademicYear.description,
+               Subject.id, Subject.name,
+               Book.id, Book.name, Book.page_count)
+        .join(Subject, Subject.year_id == AcademicYear.id)
+        .join(Book, Book.subject_id == Subject.id)
+        .where(AcademicYear.is_active == True,
+               Subject.is_active == True,
+               Book.is_active == True)
+        .order_by(AcademicYear.id, Subject.id, Book.id)
+    ).all()
+
+    sections = []
+    books_by_id = {}
+    current_year = None
+    year_books = []
+
+    def close_section():
+        subjects = {}
+        for book in year_books:
+            subject = subjects.get(book.subject_id)
+            subjects[book.subject_id] = CatalogSubject(book.subject_id, book.subject_name,
+                                                       subject.book_count + 1 if subject else 1)
+        sections.append(CatalogSection(current_year, tuple(year_books), tuple(subjects.values())))
+
+    for year_id, year_name, year_description, subject_id, subject_name, book_id, book_name, page_count in rows:
+        if current_year is None or current_year.id != year_id:
+            if year_books:
+                close_section()
+            current_year = CatalogYear(year_id, year_name, year_description)
+            year_books = []
+
+        book = CatalogBook(book_id, book_name, page_count, subject_id, subject_name, year_id, year_name)
+        year_books.append(book)
+        books_by_id[book_id] = book
+
+    if year_books:
+        close_section()
+
+    return Catalog(
+        tuple(sections),
+        MappingProxyType({section.year.id: section for section in sections}),
+        MappingProxyType(books_by_id),
+        hashlib.sha1(repr(rows).encode('utf-8')).hexdigest(),
+    )
+
+
+def _load_subject_options():
+    """Load every active subject with its year name in one query"""
+    rows = db.session.execute(
+        select(Subject.id, Subject.name, AcademicYear.name)
+        .join(AcademicYear, AcademicYear.id == Subject.year_id)
+        .where(Subject.is_active == True)
+        .order_by(AcademicYear.id, Subject.id)
+    ).all()
+    options = tuple(SubjectOption(*row) for row in rows)
+    payload = json.dumps([option._asdict() for option in options], ensure_ascii=False)
+    return SubjectOptions(options, payload, hashlib.sha1(payload.encode('utf-8')).hexdigest())
+
+
+_catalog_cache = SnapshotCache('catalog', _load_catalog)
+_subject_options_cache = SnapshotCache('subject_options', _load_subject_options)
+
+
+def get_catalog():
+    """Return the cached catalog snapshot (no DB access once warm)"""
+    return _catalog_cache.get()
+
+
+def get_subject_options():
+    """Return the cached active subject options for admin forms"""
+    return _subject_options_cache.get()
+
+
+def invalidate_catalog():
+    """Must be called after any committed change to years, subjects or books"""
+    _catalog_cache.invalidate()
+    _subject_options_cache.invalidate()
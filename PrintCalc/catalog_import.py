@@ -0,0 +1,308 @@
+import csv
+import io
+from collections import namedtuple
+from sqlalchemy import insert, select, update
+from app import db
+from models import AcademicYear, Subject, Book
+from catalog import invalidate_catalog
+from price_matrix import update_books_prices, invalidate_price_matrix
+
+MAX_IMPORT_ROWS = 20000
+
+# Column -> accepted header names (compared without surrounding spaces, case-insensitively)
+IMPORT_COLUMNS = {
+    'year': ('year', 'السنة', 'السنة الدراسية'),
+    'subject': ('subject', 'المادة', 'المادة الدراسية'),
+    'book': ('book', 'الكتاب', 'اسم الكتاب'),
+    'page_count': ('page_count', 'pages', 'عدد الصفحات'),
+}
+
+# Column lengths of the models
+NAME_LIMITS = {
+    'year': AcademicYear.name.type.length,
+    'subject': Subject.name.type.length,
+    'book': Book.name.type.length,
+}
+
+CatalogRow = namedtuple('CatalogRow', 'line year subject book page_count')
+ImportIssue = namedtuple('ImportIssue', 'line message')
+
+# `id` is None for rows that will be inserted
+PlannedYear = namedtuple('PlannedYear', 'id year')
+PlannedSubject = namedtuple('PlannedSubject', 'id year subject')
+PlannedBook = namedtuple('PlannedBook', 'id year subject book old_page_count page_count')
+ImportPlan = namedtuple(
+    'ImportPlan',
+    'new_years reactivated_years new_subjects reactivated_subjects deactivated_subjects '
+    'new_books updated_books deactivated_books unchanged changes'
+)
+
+
+class CatalogImportError(ValueError):
+    """Raised when a catalog file can't be read as a whole"""
+
+
+def _clean(value):
+    """Cell value as a name with runs of whitespace collapsed ('' for empty cells)"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return ' '.join(str(value).split())
+
+
+def _csv_table(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except UnicodeDecodeError:
+        raise CatalogImportError('the CSV file must be UTF-8 encoded')
+
+
+def _xlsx_table(fileobj):
+    from openpyxl import load_workbook
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception:
+        raise CatalogImportError('not a valid XLSX file')
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_catalog_file(fileobj, filename):
+    """Raw CatalogRows of a CSV or XLSX sheet whose first row names the columns"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        table = _csv_table(fileobj)
+    elif extension == 'xlsx':
+        from order_export import xlsx_support_available
+        if not xlsx_support_available():
+            raise CatalogImportError('XLSX import needs the openpyxl package')
+        table = _xlsx_table(fileobj)
+    else:
+        raise CatalogImportError('the file must be .csv or .xlsx')
+
+    header = [_clean(value).lower() for value in next(table, None) or ()]
+    positions = {}
+    for column, names in IMPORT_COLUMNS.items():
+        matches = [index for index, value in enumerate(header) if value in names]
+        if not matches:
+            raise CatalogImportError(f'missing column: {column}')
+        positions[column] = matches[0]
+
+    rows = []
+    for line, values in enumerate(table, start=2):
+        values = list(values)
+        if not any(_clean(value) for value in values):
+            continue
+        if len(rows) == MAX_IMPORT_ROWS:
+            raise CatalogImportError(f'at most {MAX_IMPORT_ROWS} rows per import')
+        values += [None] * (len(header) - len(values))
+        rows.append(CatalogRow(line, *(values[positions[column]] for column in IMPORT_COLUMNS)))
+    return rows
+
+
+def validate_catalog_rows(rows):
+    """Check every row before anything is written; returns (clean rows, issues).
+
+    The import is all or nothing, so any issue means the file is rejected.
+    """
+    clean_rows = []
+    issues = []
+    first_line = {}
+    for row in rows:
+        names = {'year': _clean(row.year), 'subject': _clean(row.subject), 'book': _clean(row.book)}
+        row_issues = []
+        for column, name in names.items():
+            if not name:
+                row_issues.append(f'{column} is required')
+            elif len(name) > NAME_LIMITS[column]:
+                row_issues.append(f'{column} is longer than {NAME_LIMITS[column]} characters')
+
+        try:
+            if isinstance(row.page_count, bool):
+                raise ValueError
+            # Spreadsheets often write whole numbers as 120.0
+            page_count = float(_clean(row.page_count))
+            if not page_count.is_integer() or page_count <= 0:
+                raise ValueError
+            page_count = int(page_count)
+        except ValueError:
+            row_issues.append(f'page_count must be a positive whole number, got {_clean(row.page_count)!r}')
+
+        key = (names['year'], names['subject'], names['book'])
+        if not row_issues and key in first_line:
+            row_issues.append(f'duplicate of line {first_line[key]}')
+        first_line.setdefault(key, row.line)
+
+        if row_issues:
+            issues.extend(ImportIssue(row.line, message) for message in row_issues)
+        else:
+            clean_rows.append(CatalogRow(row.line, *key, page_count))
+    return clean_rows, issues
+
+
+def plan_catalog_import(rows, deactivate_missing=False):
+    """Diff validated rows against the catalog, matching years, subjects and books by name.
+
+    With `deactivate_missing`, the file is the whole catalog of the years it
+    lists: their active subjects and books that it doesn't mention are
+    deactivated. Inactive rows that the file lists are reactivated.
+    """
+    years = {}
+    for year_id, name, is_active in db.session.execute(
+            select(AcademicYear.id, AcademicYear.name, AcademicYear.is_active).order_by(AcademicYear.id)):
+        years.setdefault(_clean(name), (year_id, is_active))
+
+    file_year_ids = [years[row.year][0] for row in rows if row.year in years]
+    subjects = {}
+    if file_year_ids:
+        for subject_id, year_id, name, is_active in db.session.execute(
+                select(Subject.id, Subject.year_id, Subject.name, Subject.is_active)
+                .where(Subject.year_id.in_(set(file_year_ids)))
+                .order_by(Subject.id)):
+            subjects.setdefault((year_id, _clean(name)), (subject_id, is_active))
+
+    books = {}
+    extra_books = []
+    if subjects:
+        for book_id, subject_id, name, page_count, is_active in db.session.execute(
+                select(Book.id, Book.subject_id, Book.name, Book.page_count, Book.is_active)
+                .where(Book.subject_id.in_([subject_id for subject_id, _ in subjects.values()]))
+                .order_by(Book.id)):
+            key = (subject_id, _clean(name))
+            if key in books:
+                # Same name twice in a subject: the file matches the oldest one
+                extra_books.append((book_id, subject_id, name, is_active))
+            else:
+                books[key] = (book_id, page_count, is_active)
+
+    new_years, reactivated_years = {}, {}
+    new_subjects, reactivated_subjects = {}, {}
+    new_books, updated_books = [], []
+    seen_subject_ids, seen_book_ids = set(), set()
+    unchanged = 0
+    for row in rows:
+        year_id, year_active = years.get(row.year, (None, True))
+        if year_id is None:
+            new_years.setdefault(row.year, PlannedYear(None, row.year))
+        elif not year_active:
+            reactivated_years.setdefault(year_id, PlannedYear(year_id, row.year))
+
+        subject_id, subject_active = subjects.get((year_id, row.subject), (None, True))
+        if subject_id is None:
+            new_subjects.setdefault((row.year, row.subject), PlannedSubject(None, row.year, row.subject))
+        else:
+            seen_subject_ids.add(subject_id)
+            if not subject_active:
+                reactivated_subjects.setdefault(subject_id, PlannedSubject(subject_id, row.year, row.subject))
+
+        book_id, page_count, book_active = books.get((subject_id, row.book), (None, None, True))
+        if book_id is None:
+            new_books.append(PlannedBook(None, row.year, row.subject, row.book, None, row.page_count))
+            continue
+        seen_book_ids.add(book_id)
+        if page_count != row.page_count or not book_active:
+            updated_books.append(PlannedBook(book_id, row.year, row.subject, row.book, page_count, row.page_count))
+        else:
+            unchanged += 1
+
+    deactivated_subjects, deactivated_books = [], []
+    if deactivate_missing:
+        year_names = {year_id: name for name, (year_id, _) in years.items()}
+        for (year_id, name), (subject_id, is_active) in subjects.items():
+            if is_active and subject_id not in seen_subject_ids:
+                deactivated_subjects.append(PlannedSubject(subject_id, year_names[year_id], name))
+        subject_keys = {subject_id: (year_names[year_id], name) for (year_id, name), (subject_id, _) in subjects.items()}
+        missing = [(book_id, subject_id, name, is_active)
+                   for (subject_id, name), (book_id, _, is_active) in books.items()] + extra_books
+        for book_id, subject_id, name, is_active in sorted(missing):
+            # Books of deactivated subjects are hidden with their subject and left as they are
+            if is_active and book_id not in seen_book_ids and subject_id in seen_subject_ids:
+                deactivated_books.append(PlannedBook(book_id, *subject_keys[subject_id], _clean(name), None, None))
+
+    plan = ImportPlan(
+        new_years=list(new_years.values()),
+        reactivated_years=list(reactivated_years.values()),
+        new_subjects=list(new_subjects.values()),
+        reactivated_subjects=list(reactivated_subjects.values()),
+        deactivated_subjects=deactivated_subjects,
+        new_books=new_books,
+        updated_books=updated_books,
+        deactivated_books=deactivated_books,
+        unchanged=unchanged,
+        changes=0,
+    )
+    return plan._replace(changes=sum(len(changes) for changes in plan[:8]))
+
+
+def _set_active(model, ids, is_active):
+    if ids:
+        db.session.execute(
+            update(model).where(model.id.in_(ids)).values(is_active=is_active)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def apply_catalog_import(plan):
+    """Write a plan with bulk INSERT/UPDATE statements in one transaction.
+
+    Commits, recomputes the prices of new and resized books and invalidates
+    the catalog (and price matrix) caches once.
+    """
+    year_ids = {_clean(name): year_id for year_id, name in db.session.execute(
+        select(AcademicYear.id, AcademicYear.name).order_by(AcademicYear.id.desc()))}
+    if plan.new_years:
+        year_ids.update((name, year_id) for year_id, name in db.session.execute(
+            insert(AcademicYear).returning(AcademicYear.id, AcademicYear.name),
+            [{'name': year.year, 'description': '', 'is_active': True} for year in plan.new_years]
+        ))
+    _set_active(AcademicYear, [year.id for year in plan.reactivated_years], True)
+
+    if plan.new_subjects:
+        db.session.execute(
+            insert(Subject),
+            [{'name': subject.subject, 'description': '', 'is_active': True, 'year_id': year_ids[subject.year]}
+             for subject in plan.new_subjects]
+        )
+    _set_active(Subject, [subject.id for subject in plan.reactivated_subjects], True)
+    _set_active(Subject, [subject.id for subject in plan.deactivated_subjects], False)
+
+    priced_ids = []
+    if plan.new_books:
+        # Descending so that, as in the plan, the oldest of same-named subjects wins
+        subject_ids = {(year_id, _clean(name)): subject_id for subject_id, year_id, name in db.session.execute(
+            select(Subject.id, Subject.year_id, Subject.name)
+            .where(Subject.year_id.in_({year_ids[book.year] for book in plan.new_books}))
+            .order_by(Subject.id.desc()))}
+        priced_ids.extend(db.session.execute(
+            insert(Book).returning(Book.id),
+            [{'name': book.book, 'page_count': book.page_count, 'description': '', 'is_active': True,
+              'subject_id': subject_ids[(year_ids[book.year], book.subject)]} for book in plan.new_books]
+        ).scalars())
+    if plan.updated_books:
+        db.session.execute(
+            update(Book),
+            [{'id': book.id, 'page_count': book.page_count, 'is_active': True} for book in plan.updated_books]
+        )
+        priced_ids.extend(book.id for book in plan.updated_books if book.page_count != book.old_page_count)
+    _set_active(Book, [book.id for book in plan.deactivated_books], False)
+
+    if priced_ids:
+        update_books_prices(priced_ids)
+    db.session.commit()
+    invalidate_catalog()
+    if priced_ids:
+        invalidate_price_matrix()
+
+
+def import_catalog(rows, deactivate_missing=False, dry_run=False):
+    """Plan an import of validated rows and, unless `dry_run`, apply it; returns the plan"""
+    plan = plan_catalog_import(rows, deactivate_missing)
+    if dry_run or not plan.changes:
+        db.session.rollback()
+    else:
+        apply_catalog_import(plan)
+    return plan
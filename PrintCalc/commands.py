@@ -0,0 +1,223 @@
+import json
+import click
+
+
+def register_commands(app):
+    """Register the maintenance commands on `flask`"""
+
+    @app.cli.command('db-init')
+    def db_init_command():
+        """Create missing tables; run once per deploy, before starting workers."""
+        from seed import create_schema
+        create_schema()
+        click.echo('Database schema is up to date')
+
+    @app.cli.command('seed')
+    def seed_command():
+        """Insert default prices, add-ons, the admin account and order counters where missing."""
+        from seed import seed_defaults
+        seeded = seed_defaults()
+        click.echo(f"Seeded: {', '.join(seeded)}" if seeded else 'Nothing to seed')
+
+    @app.cli.command('cart-sweep')
+    def cart_sweep_command():
+        """Delete expired server-side carts."""
+        from cart_store import get_cart_store
+        removed = get_cart_store().sweep()
+        click.echo(f'Removed {removed} expired carts')
+
+    @app.cli.command('reconcile-order-counters')
+    def reconcile_order_counters_command():
+        """Recompute the dashboard order counters (run periodically from cron)."""
+        from dashboard_stats import reconcile_order_counters
+        drift = reconcile_order_counters()
+        for name, (stored, actual) in sorted(drift.items()):
+            click.echo(f'{name}: {stored} -> {actual}')
+        click.echo(f'{len(drift)} counters corrected')
+
+    @app.cli.command('archive-orders')
+    @click.option('--days', type=click.IntRange(min=0), default=None,
+                  help='Archive orders completed more than this many days ago (default ORDER_ARCHIVE_AFTER_DAYS).')
+    @click.option('--batch-size', type=click.IntRange(min=1), default=None, help='Orders moved per transaction.')
+    def archive_orders_command(days, batch_size):
+        """Move old completed orders and their items to the archive tables (run periodically from cron)."""
+        import time
+        from order_archive import archive_orders
+        days = app.config['ORDER_ARCHIVE_AFTER_DAYS'] if days is None else days
+        started = time.perf_counter()
+        result = archive_orders(days, batch_size or app.config['ORDER_ARCHIVE_BATCH_SIZE'])
+        click.echo(f'{result.orders} orders ({result.items} items) completed before {result.cutoff:%Y-%m-%d %H:%M} '
+                   f'archived in {result.batches} batches, {time.perf_counter() - started:.1f} s')
+
+    @app.cli.command('import-orders')
+    @click.argument('payload_file', type=click.File('r', encoding='utf-8'))
+    def import_orders_command(payload_file):
+        """Create orders in bulk from a JSON file (same format as /api/orders/bulk)."""
+        from bulk_orders import BulkOrderError, create_orders_in_bulk
+        try:
+            result = create_orders_in_bulk(json.load(payload_file))
+        except (BulkOrderError, ValueError) as e:
+            raise click.ClickException(str(e))
+        for error in result['errors']:
+            click.echo(f"order #{error['index']}: {error['error']}", err=True)
+        click.echo(f"{len(result['created'])} orders created, {len(result['errors'])} rejected")
+
+    @app.cli.command('import-catalog')
+    @click.argument('catalog_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--dry-run', is_flag=True, help='Only print the changes.')
+    @click.option('--deactivate-missing', is_flag=True,
+                  help='Deactivate subjects and books of the listed years that the file leaves out.')
+    def import_catalog_command(catalog_file, dry_run, deactivate_missing):
+        """Create or update years, subjects and books from a CSV/XLSX sheet (year, subject, book, page_count)."""
+        import time
+        from catalog_import import CatalogImportError, read_catalog_file, validate_catalog_rows, import_catalog
+        started = time.perf_counter()
+        try:
+            with open(catalog_file, 'rb') as source:
+                rows = read_catalog_file(source, catalog_file)
+        except CatalogImportError as e:
+            raise click.ClickException(str(e))
+        rows, issues = validate_catalog_rows(rows)
+        for issue in issues:
+            click.echo(f'line {issue.line}: {issue.message}', err=True)
+        if issues:
+            raise click.ClickException(f'{len(issues)} problems, nothing imported')
+
+        plan = import_catalog(rows, deactivate_missing, dry_run)
+        for year in plan.new_years:
+            click.echo(f'+ year {year.year}')
+        for year in plan.reactivated_years:
+            click.echo(f'* year {year.year} (reactivated)')
+        for subject in plan.new_subjects:
+            click.echo(f'+ subject {subject.year} / {subject.subject}')
+        for subject in plan.reactivated_subjects:
+            click.echo(f'* subject {subject.year} / {subject.subject} (reactivated)')
+        for subject in plan.deactivated_subjects:
+            click.echo(f'- subject {subject.year} / {subject.subject}')
+        for book in plan.new_books:
+            click.echo(f'+ book {book.year} / {book.subject} / {book.book} ({book.page_count} pages)')
+        for book in plan.updated_books:
+            change = 'reactivated' if book.old_page_count == book.page_count else f'{book.old_page_count} -> {book.page_count} pages'
+            click.echo(f'* book {book.year} / {book.subject} / {book.book} ({change})')
+        for book in plan.deactivated_books:
+            click.echo(f'- book {book.year} / {book.subject} / {book.book}')
+        click.echo(f'{len(plan.new_books)} new, {len(plan.updated_books)} updated, {len(plan.deactivated_books)} deactivated, '
+                   f'{plan.unchanged} unchanged books; {plan.changes} changes '
+                   f"{'not applied (dry run)' if dry_run else 'applied'} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """Create indexes declared on the models that are missing from existing tables."""
+        from app import db
+        created = 0
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+                created += 1
+        click.echo(f'{created} indexes checked')
+
+    @app.cli.command('rebuild-price-matrix')
+    def rebuild_price_matrix_command():
+        """Recompute every book x printing type price."""
+        import time
+        from app import db
+        from price_matrix import rebuild_price_matrix, invalidate_price_matrix
+        started = time.perf_counter()
+        rebuild_price_matrix()
+        db.session.commit()
+        invalidate_price_matrix()
+        click.echo(f'Price matrix rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='First day to rebuild (UTC), default the first order.')
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Last day to rebuild (UTC), default the last order.')
+    def rebuild_rollups_command(start, end):
+        """Recompute the daily reporting rollups from the orders."""
+        import time
+        from rollups import rebuild_rollups
+        started = time.perf_counter()
+        written = rebuild_rollups(start.date() if start else None, end.date() if end else None)
+        for table, rows in written.items():
+            click.echo(f'{table}: {rows} rows')
+        click.echo(f'Rollups rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+    @app.cli.command('export-orders')
+    @click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='First order day (UTC).')
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Last order day (UTC).')
+    @click.option('--status', type=click.Choice(['new', 'in_progress', 'completed']), default=None)
+    @click.option('--format', 'export_format', type=click.Choice(['csv', 'xlsx']), default=None,
+                  help='Default: from the file name, else csv.')
+    @click.option('--gzip', 'compress', is_flag=True, help='Gzip the CSV (implied by a .gz file name).')
+    def export_orders_command(output, start, end, status, export_format, compress):
+        """Export orders with their items to CSV (or XLSX), streaming rows from the database."""
+        import sys
+        from order_export import ExportError, export_filters, iter_export_rows, iter_csv, iter_gzip, \
+            xlsx_support_available, write_xlsx
+        export_format = export_format or ('xlsx' if output.endswith('.xlsx') else 'csv')
+        compress = compress or output.endswith('.gz')
+        try:
+            filters = export_filters(start.date() if start else None, end.date() if end else None, status)
+        except ExportError as e:
+            raise click.ClickException(str(e))
+
+        rows = 0
+
+        def counted(export_rows):
+            nonlocal rows
+            for row in export_rows:
+                rows += 1
+                yield row
+
+        if export_format == 'xlsx':
+            if not xlsx_support_available():
+                raise click.ClickException('XLSX export needs the openpyxl package')
+            if output == '-':
+                raise click.ClickException('XLSX can only be written to a file')
+            with open(output, 'wb') as output_file:
+                write_xlsx(counted(iter_export_rows(filters)), output_file)
+        else:
+            chunks = iter_csv(counted(iter_export_rows(filters)))
+            if compress:
+                chunks = iter_gzip(chunks)
+            output_file = sys.stdout.buffer if output == '-' else open(output, 'wb')
+            try:
+                for chunk in chunks:
+                    output_file.write(chunk)
+            finally:
+                if output_file is not sys.stdout.buffer:
+                    output_file.close()
+        click.echo(f'{rows} order items exported', err=True)
+
+    @app.cli.command('render-invoices')
+    @click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Day of the orders (UTC), default today.')
+    def render_invoices_command(day):
+        """Render the PDF invoices of one day's orders in parallel."""
+        from datetime import datetime
+        from invoice_pdf import pdf_support_available, render_invoices_for_day
+        if not pdf_support_available():
+            raise click.ClickException('PDF invoices need the pdf extras (reportlab, arabic-reshaper, python-bidi) '
+                                       'and INVOICE_PDF_FONT pointing to an Arabic TTF')
+        day = (day or datetime.utcnow()).date()
+        rendered, cached, failed = render_invoices_for_day(day)
+        click.echo(f'{day}: {rendered} rendered, {cached} already cached, {failed} failed')
+        if failed:
+            raise click.ClickException('some invoices could not be rendered')
+
+    @app.cli.command('check-query-budgets')
+    def check_query_budgets_command():
+        """Request every admin view and fail if one exceeds its SQL statement budget (adds a sample order to an empty database)."""
+        from query_budget import budget_samples, check_query_budgets
+        url_args, query_args = budget_samples()
+
+        failed = False
+        for endpoint, statements, budget, error in check_query_budgets(app, url_args, query_args):
+            click.echo(f'{endpoint}: {statements} / {budget}' + (f'  FAILED: {error}' if error else ''))
+            failed = failed or bool(error)
+        if failed:
+            raise click.ClickException('query budget check failed')
@@ -0,0 +1,120 @@
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import AcademicYear, Subject, Book, Employee, Order, ArchivedOrder, OrderCounter
+
+ORDER_STATUSES = ('new', 'in_progress', 'completed')
+TOTAL_COUNTER = 'total'
+# Archived orders stay in the total and status counters; this one says how many of them left `orders`
+ARCHIVED_COUNTER = 'archived'
+
+
+def _status_counter(status):
+    return f'status:{status}'
+
+
+def count_orders_by_status(model=Order):
+    """Count orders (or archived orders) per status with a single GROUP BY scan"""
+    rows = db.session.execute(
+        select(model.status, func.count(model.id)).group_by(model.status)
+    ).all()
+    return {status: count for status, count in rows}
+
+
+def _bump(name, delta):
+    db.session.execute(
+        update(OrderCounter)
+        .where(OrderCounter.name == name)
+        .values(value=OrderCounter.value + delta)
+    )
+
+
+def record_orders_created(count=1, status='new'):
+    """Count new orders; call before committing the transaction that inserts them"""
+    _bump(TOTAL_COUNTER, count)
+    _bump(_status_counter(status), count)
+
+
+def record_status_change(old_status, new_status, count=1):
+    """Move orders between status counters; call before committing the update"""
+    if old_status == new_status:
+        return
+    _bump(_status_counter(old_status), -count)
+    _bump(_status_counter(new_status), count)
+
+
+def record_orders_archived(count):
+    """Count orders moved to the archive; call before committing the move"""
+    archived = db.session.execute(
+        update(OrderCounter)
+        .where(OrderCounter.name == ARCHIVED_COUNTER)
+        .values(value=OrderCounter.value + count)
+    )
+    if not archived.rowcount:
+        # Counters seeded before the archive existed
+        db.session.add(OrderCounter(name=ARCHIVED_COUNTER, value=count))
+
+
+def reconcile_order_counters():
+    """Recompute all counters from the orders and archived orders tables and fix any drift.
+
+    Returns {counter name: (stored value, actual value)} for counters that
+    were wrong or missing.
+    """
+    by_status = count_orders_by_status()
+    archived_by_status = count_orders_by_status(ArchivedOrder)
+    actual = {
+        TOTAL_COUNTER: sum(by_status.values()) + sum(archived_by_status.values()),
+        ARCHIVED_COUNTER: sum(archived_by_status.values()),
+    }
+    for status in set(ORDER_STATUSES) | set(by_status) | set(archived_by_status):
+        actual[_status_counter(status)] = by_status.get(status, 0) + archived_by_status.get(status, 0)
+
+    stored = {counter.name: counter for counter in OrderCounter.query.with_for_update().all()}
+    drift = {}
+    for name, value in actual.items():
+        counter = stored.get(name)
+        if counter is None:
+            db.session.add(OrderCounter(name=name, value=value))
+            drift[name] = (None, value)
+        elif counter.value != value:
+            drift[name] = (counter.value, value)
+            counter.value = value
+    db.session.commit()
+    return drift
+
+
+def get_order_counts():
+    """Order totals for the dashboards from the counter rows (O(1) in orders)"""
+    counters = dict(db.session.execute(select(OrderCounter.name, OrderCounter.value)).all())
+    if TOTAL_COUNTER not in counters:
+        # First use on this database: seed the counters
+        try:
+            reconcile_order_counters()
+        except IntegrityError:
+            # Another request seeded them first; read theirs
+            db.session.rollback()
+        counters = dict(db.session.execute(select(OrderCounter.name, OrderCounter.value)).all())
+
+    return {
+        'total_orders': counters.get(TOTAL_COUNTER, 0),
+        'new_orders': counters.get(_status_counter('new'), 0),
+        'in_progress_orders': counters.get(_status_counter('in_progress'), 0),
+        'completed_orders': counters.get(_status_counter('completed'), 0),
+        'archived_orders': counters.get(ARCHIVED_COUNTER, 0),
+    }
+
+
+def get_catalog_and_employee_counts():
+    """Catalog and employee counts in a single statement"""
+    row = db.session.execute(
+        select(
+            select(func.count(AcademicYear.id)).scalar_subquery().label('years_count'),
+            select(func.count(Subject.id)).scalar_subquery().label('subjects_count'),
+            select(func.count(Book.id)).scalar_subquery().label('books_count'),
+            select(func.count(Employee.id)).scalar_subquery().label('total_employees'),
+            select(func.count(Employee.id)).where(Employee.is_active == True)
+            .scalar_subquery().label('active_employees'),
+        )
+    ).one()
+    return dict(row._mapping)
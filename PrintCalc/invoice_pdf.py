@@ -0,0 +1,300 @@
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from models import Book, PrintingPrice, AddOn, Employee
+from order_archive import ORDER_TABLES
+
+class InvoiceRenderError(RuntimeError):
+    """Raised when an invoice PDF could not be rendered"""
+
+
+STATUS_TEXT = {'new': 'جديد', 'in_progress': 'قيد التنفيذ', 'completed': 'مكتمل'}
+
+
+def pdf_support_available():
+    """PDF invoices need the `pdf` extras (reportlab, arabic-reshaper, python-bidi) and an Arabic TTF.
+
+    The built-in PDF fonts have no Arabic glyphs, so without INVOICE_PDF_FONT
+    the invoices would print empty boxes; the feature stays off instead.
+    """
+    try:
+        import reportlab
+        import arabic_reshaper
+        import bidi
+    except ImportError:
+        return False
+    font_path = current_app.config.get('INVOICE_PDF_FONT')
+    return bool(font_path) and os.path.isfile(font_path)
+
+
+def load_invoice_data(order_numbers):
+    """Plain, picklable invoice data for many orders with three queries, keyed by order number.
+
+    Orders missing from the live tables are looked up in the archive (two more queries).
+    """
+    orders = []
+    items = {}
+    missing = list(order_numbers)
+    for order_model, item_model in ORDER_TABLES:
+        found = db.session.execute(
+            select(order_model.id, order_model.order_number, order_model.customer_name, order_model.customer_phone,
+                   order_model.total_cost, order_model.status, order_model.selected_addons, order_model.created_at,
+                   order_model.completed_at,
+                   PrintingPrice.name.label('printing_type'), Employee.full_name.label('employee_name'))
+            .outerjoin(PrintingPrice, PrintingPrice.id == order_model.printing_type_id)
+            .outerjoin(Employee, Employee.id == order_model.employee_id)
+            .where(order_model.order_number.in_(missing))
+        ).all()
+        if found:
+            for order_id, name, quantity, unit_cost, total_cost in db.session.execute(
+                select(item_model.order_id, Book.name, item_model.quantity, item_model.unit_cost, item_model.total_cost)
+                .join(Book, Book.id == item_model.book_id)
+                .where(item_model.order_id.in_([order.id for order in found]))
+                .order_by(item_model.order_id, item_model.id)
+            ):
+                items.setdefault(order_id, []).append([name, quantity, unit_cost, total_cost])
+            orders += found
+            found_numbers = {order.order_number for order in found}
+            missing = [number for number in missing if number not in found_numbers]
+        if not missing:
+            break
+    if not orders:
+        return {}
+
+    addon_names = dict(db.session.execute(select(AddOn.id, AddOn.name)).all())
+
+    invoices = {}
+    for order in orders:
+        try:
+            addon_ids = json.loads(order.selected_addons or '[]')
+        except ValueError:
+            addon_ids = []
+        order_items = items.get(order.id, [])
+        invoices[order.order_number] = {
+            'order_number': order.order_number,
+            'customer_name': order.customer_name or '',
+            'customer_phone': order.customer_phone or '',
+            'status': order.status,
+            'created_at': order.created_at.strftime('%Y-%m-%d %H:%M') if order.created_at else '',
+            'completed_at': order.completed_at.strftime('%Y-%m-%d %H:%M') if order.completed_at else '',
+            'printing_type': order.printing_type or '',
+            'employee_name': order.employee_name or '',
+            'items': order_items,
+            'addons': [addon_names[addon_id] for addon_id in addon_ids if addon_id in addon_names],
+            # What the add-ons cost when the order was placed; AddOn.price may have changed since
+            'addons_cost': round(order.total_cost - sum(item[3] for item in order_items), 2) if addon_ids else 0,
+            'total_cost': order.total_cost,
+        }
+    return invoices
+
+
+def invoice_fingerprint(data):
+    """Digest of everything printed on the invoice; it changes whenever the order does"""
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _cache_dir():
+    return current_app.config['INVOICE_PDF_DIR']
+
+
+def cached_invoice_path(order_number, fingerprint):
+    return os.path.join(_cache_dir(), f'{order_number}-{fingerprint[:16]}.pdf')
+
+
+def _shape(text):
+    """Joined glyphs in visual (right-to-left) order, as reportlab draws text left to right"""
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def render_invoice_pdf(data, font_path):
+    """Render one invoice to PDF bytes with reportlab, using the Arabic TTF at `font_path`"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'InvoiceFont'
+    if font not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(font, font_path))
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    right = width - 40
+    y = height - 50
+
+    def line(text, size=11, x=right, gap=18):
+        nonlocal y
+        if y < 60:
+            pdf.showPage()
+            y = height - 50
+        pdf.setFont(font, size)
+        pdf.drawRightString(x, y, _shape(str(text)))
+        y -= gap
+
+    line('مكتبة سنتر أدم - فاتورة طباعة', size=16, gap=28)
+    line(f"رقم الطلب: {data['order_number']}")
+    line(f"التاريخ: {data['created_at']}")
+    line(f"العميل: {data['customer_name']}  -  {data['customer_phone']}")
+    line(f"نوع الطباعة: {data['printing_type']}")
+    line(f"الحالة: {STATUS_TEXT.get(data['status'], data['status'])}", gap=28)
+
+    line('الكتب', size=13, gap=20)
+    for name, quantity, unit_cost, total_cost in data['items']:
+        line(f'{name}  ×{quantity}  ({unit_cost:.2f})  =  {total_cost:.2f} ج.م')
+    if data['addons'] or data['addons_cost']:
+        y -= 8
+        line('الإضافات', size=13, gap=20)
+        for name in data['addons']:
+            line(name)
+        line(f"إجمالي الإضافات: {data['addons_cost']:.2f} ج.م")
+
+    y -= 10
+    line(f"الإجمالي: {data['total_cost']:.2f} ج.م", size=14, gap=24)
+    if data['employee_name']:
+        line(f"الموظف: {data['employee_name']}", size=9)
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _render_to_file(data, path, font_path):
+    """Pool task: render, write atomically and drop older versions of the same invoice"""
+    pdf = render_invoice_pdf(data, font_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as pdf_file:
+        pdf_file.write(pdf)
+    os.replace(tmp_path, path)
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{data['order_number']}-*.pdf")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = {}
+
+
+def _get_executor():
+    """Create the pool on first use; the caller holds `_executor_lock`"""
+    global _executor
+    if _executor is None:
+        # spawn: the workers never inherit the app's DB connections or threads
+        _executor = ProcessPoolExecutor(
+            max_workers=current_app.config.get('INVOICE_PDF_WORKERS') or None,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _executor
+
+
+def _discard_executor(broken):
+    """Drop a pool whose worker died (e.g. OOM-killed) so the next render starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _submit(data, path):
+    """Queue a render unless the same file is already being rendered"""
+    global _executor
+    with _executor_lock:
+        future = _pending.get(path)
+        if future is None:
+            args = (_render_to_file, data, path, current_app.config.get('INVOICE_PDF_FONT'))
+            try:
+                future = _get_executor().submit(*args)
+            except BrokenProcessPool:
+                _executor.shutdown(wait=False)
+                _executor = None
+                future = _get_executor().submit(*args)
+            future.executor = _executor
+            _pending[path] = future
+            future.add_done_callback(lambda done: _pending.pop(path, None))
+        return future
+
+
+def get_invoice_pdf(order_number, wait_seconds=0):
+    """Return (path or None, fingerprint) for an order's current invoice, or None if it doesn't exist.
+
+    A cached file is returned at once; otherwise the render is queued on the
+    process pool and waited for up to `wait_seconds`, returning a None path
+    if it is still running.
+    """
+    data = load_invoice_data([order_number]).get(order_number)
+    if data is None:
+        return None
+    fingerprint = invoice_fingerprint(data)
+    path = cached_invoice_path(order_number, fingerprint)
+    if os.path.exists(path):
+        return path, fingerprint
+
+    future = None
+    try:
+        future = _submit(data, path)
+        return future.result(timeout=wait_seconds), fingerprint
+    except FutureTimeout:
+        return None, fingerprint
+    except BrokenProcessPool as e:
+        _discard_executor(future.executor if future is not None else _executor)
+        raise InvoiceRenderError(f'invoice worker died while rendering {order_number}') from e
+    except Exception as e:
+        # Raised inside the render, e.g. an unreadable INVOICE_PDF_FONT
+        raise InvoiceRenderError(f'could not render invoice {order_number}: {e}') from e
+
+
+def schedule_invoice_pdfs(order_numbers):
+    """Start rendering invoices in the background (e.g. right after an order is created)"""
+    if not pdf_support_available():
+        return []
+    futures = []
+    for order_number, data in load_invoice_data(order_numbers).items():
+        path = cached_invoice_path(order_number, invoice_fingerprint(data))
+        if not os.path.exists(path):
+            try:
+                futures.append(_submit(data, path))
+            except (OSError, RuntimeError):
+                # The order is already committed; the PDF is rendered on first download instead
+                current_app.logger.exception('Could not queue invoice PDF for %s', order_number)
+    return futures
+
+
+def render_invoices_for_day(day, chunk_size=500):
+    """Render every invoice of orders created on `day` (UTC) in parallel.
+
+    Meant for `flask render-invoices`; returns (rendered, already cached, failed).
+    """
+    start = datetime.combine(day, datetime.min.time())
+    order_numbers = []
+    for model, _ in ORDER_TABLES:
+        order_numbers += db.session.scalars(
+            select(model.order_number)
+            .where(model.created_at >= start, model.created_at < start + timedelta(days=1))
+            .order_by(model.id)
+        ).all()
+
+    futures = []
+    for offset in range(0, len(order_numbers), chunk_size):
+        futures += schedule_invoice_pdfs(order_numbers[offset:offset + chunk_size])
+    done, _ = wait(futures)
+    failed = sum(1 for future in done if future.exception() is not None)
+    return len(futures) - failed, len(order_numbers) - len(futures), failed
@@ -1,4 +1,11 @@
-from app import app
+from app import create_app
+
+app = create_app()
 
 if __name__ == '__main__':
+    # The development server sets up its own database; production runs `flask db-init` and `flask seed`
+    from seed import create_schema, seed_defaults
+    with app.app_context():
+        create_schema()
+        seed_defaults()
     app.run(host='0.0.0.0', port=5000, debug=True)
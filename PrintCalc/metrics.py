@@ -0,0 +1,325 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# Running totals of the workers that have exited, kept in METRICS_DIR
+DEAD_WORKERS_FILE = 'metrics-dead.json'
+
+
+class Histogram:
+    """Per-bucket (non-cumulative) counts plus sum and count"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {'counts': self.counts, 'sum': self.sum, 'count': self.count}
+
+
+class Metrics:
+    """Request, SQL and pool metrics of this process"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.statuses = {}
+        self.sql_statements = {}
+        self.sql_seconds = {}
+        self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+        self.last_flush = 0.0
+
+    def observe_request(self, endpoint, status, seconds, statements, sql_seconds):
+        with self.lock:
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self.statuses[endpoint] = {}
+                self.sql_statements[endpoint] = 0
+                self.sql_seconds[endpoint] = 0.0
+            self.latency[endpoint].observe(seconds)
+            self.statuses[endpoint][status] = self.statuses[endpoint].get(status, 0) + 1
+            self.sql_statements[endpoint] += statements
+            self.sql_seconds[endpoint] += sql_seconds
+
+    def observe_pool_wait(self, seconds):
+        with self.lock:
+            self.pool_wait.observe(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'latency': {endpoint: histogram.to_dict() for endpoint, histogram in self.latency.items()},
+                'statuses': {endpoint: dict(counts) for endpoint, counts in self.statuses.items()},
+                'sql_statements': dict(self.sql_statements),
+                'sql_seconds': dict(self.sql_seconds),
+                'pool_wait': self.pool_wait.to_dict(),
+            }
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """This process's metrics, starting afresh in a forked worker"""
+    global _metrics
+    if _metrics.pid != os.getpid():
+        _metrics = Metrics()
+    return _metrics
+
+
+def _start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None and has_request_context():
+        g.sql_seconds = g.get('sql_seconds', 0.0) + time.perf_counter() - started
+
+
+_checkout = threading.local()
+
+
+def _start_checkout_timer(session, transaction):
+    # A session's outermost transaction begins right before it checks a connection out
+    if transaction.parent is None:
+        _checkout.started = time.perf_counter()
+
+
+def _clear_checkout_timer(session, transaction):
+    if transaction.parent is None:
+        _checkout.started = None
+
+
+def _stop_checkout_timer(dbapi_connection, connection_record, connection_proxy):
+    # Includes waiting for a free connection and the pre-ping
+    started = getattr(_checkout, 'started', None)
+    if started is not None:
+        _checkout.started = None
+        get_metrics().observe_pool_wait(time.perf_counter() - started)
+
+
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_seconds = 0.0
+
+
+def _record_request(response):
+    from query_budget import sql_statement_count
+
+    started = g.get('request_started')
+    if started is None:
+        return response
+    metrics = get_metrics()
+    metrics.observe_request(
+        request.endpoint or 'unmatched',
+        str(response.status_code),
+        time.perf_counter() - started,
+        sql_statement_count(),
+        g.get('sql_seconds', 0.0),
+    )
+    flush_interval = current_app.config.get('METRICS_FLUSH_SECONDS', 1.0)
+    if current_app.config.get('METRICS_DIR') and time.monotonic() - metrics.last_flush >= flush_interval:
+        flush_metrics()
+    return response
+
+
+def flush_metrics():
+    """Write this process's metrics to METRICS_DIR for the other workers to merge"""
+    metrics_dir = current_app.config.get('METRICS_DIR')
+    if not metrics_dir:
+        return
+    metrics = get_metrics()
+    path = os.path.join(metrics_dir, f'metrics-{metrics.pid}.json')
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        _write(path, metrics.snapshot())
+        metrics.last_flush = time.monotonic()
+    except OSError:
+        current_app.logger.warning('Could not write metrics file %s', path)
+
+
+def _merge_histogram(total, part):
+    total['counts'] = [a + b for a, b in zip(total['counts'], part['counts'])]
+    total['sum'] += part['sum']
+    total['count'] += part['count']
+
+
+def _merge(merged, part):
+    """Add the metrics of `part` into `merged` (None to start from `part`)"""
+    if merged is None:
+        return part
+    for endpoint, histogram in part['latency'].items():
+        if endpoint in merged['latency']:
+            _merge_histogram(merged['latency'][endpoint], histogram)
+        else:
+            merged['latency'][endpoint] = histogram
+    for endpoint, counts in part['statuses'].items():
+        totals = merged['statuses'].setdefault(endpoint, {})
+        for status, count in counts.items():
+            totals[status] = totals.get(status, 0) + count
+    for key in ('sql_statements', 'sql_seconds'):
+        for endpoint, value in part[key].items():
+            merged[key][endpoint] = merged[key].get(endpoint, 0) + value
+    _merge_histogram(merged['pool_wait'], part['pool_wait'])
+    return merged
+
+
+def _read(path):
+    try:
+        with open(path) as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, snapshot):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as metrics_file:
+        json.dump(snapshot, metrics_file)
+    os.replace(tmp_path, path)
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _retire(metrics_dir, path):
+    """Fold an exited worker's file into metrics-dead.json and remove it"""
+    with open(os.path.join(metrics_dir, 'metrics-dead.lock'), 'w') as lock_file:
+        # Several workers may collect at once; only one folds each file
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        part = _read(path)
+        if part is not None:
+            dead_path = os.path.join(metrics_dir, DEAD_WORKERS_FILE)
+            _write(dead_path, _merge(_read(dead_path), part))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def collect_metrics():
+    """Metrics summed over every worker that wrote to METRICS_DIR (or just this one).
+
+    Files of exited workers are folded into metrics-dead.json before they are
+    removed, so the directory doesn't grow with restarts and the totals never
+    go backwards.
+    """
+    metrics_dir = current_app.config.get('METRICS_DIR')
+    if not metrics_dir:
+        return get_metrics().snapshot()
+
+    flush_metrics()
+    merged = None
+    for path in glob.glob(os.path.join(metrics_dir, 'metrics-*.json')):
+        try:
+            pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+        except ValueError:
+            continue
+        if not _process_exists(pid):
+            try:
+                _retire(metrics_dir, path)
+            except OSError:
+                current_app.logger.warning('Could not retire metrics file %s', path)
+            continue
+        part = _read(path)
+        if part is not None:
+            merged = _merge(merged, part)
+    dead = _read(os.path.join(metrics_dir, DEAD_WORKERS_FILE))
+    if dead is not None:
+        merged = _merge(merged, dead)
+    return merged or get_metrics().snapshot()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, buckets, histogram, labels=''):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(buckets + (float('inf'),), histogram['counts']):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{name}_bucket{{{labels}le="{le}"}} {cumulative}')
+    braces = f'{{{labels.rstrip(",")}}}' if labels else ''
+    lines.append(f'{name}_sum{braces} {histogram["sum"]}')
+    lines.append(f'{name}_count{braces} {histogram["count"]}')
+    return lines
+
+
+def render_metrics(snapshot):
+    """Prometheus text exposition (format 0.0.4) of a metrics snapshot"""
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by endpoint.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for endpoint in sorted(snapshot['latency']):
+        lines += _histogram_lines('http_request_duration_seconds', LATENCY_BUCKETS,
+                                  snapshot['latency'][endpoint], f'endpoint="{_label(endpoint)}",')
+
+    lines += ['# HELP http_requests_total Responses by endpoint and status code.',
+              '# TYPE http_requests_total counter']
+    for endpoint in sorted(snapshot['statuses']):
+        for status, count in sorted(snapshot['statuses'][endpoint].items()):
+            lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",status="{status}"}} {count}')
+
+    lines += ['# HELP sql_statements_total SQL statements issued while serving each endpoint.',
+              '# TYPE sql_statements_total counter']
+    for endpoint, count in sorted(snapshot['sql_statements'].items()):
+        lines.append(f'sql_statements_total{{endpoint="{_label(endpoint)}"}} {count}')
+
+    lines += ['# HELP sql_duration_seconds_total Time spent executing SQL for each endpoint.',
+              '# TYPE sql_duration_seconds_total counter']
+    for endpoint, seconds in sorted(snapshot['sql_seconds'].items()):
+        lines.append(f'sql_duration_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds}')
+
+    lines += ['# HELP db_pool_checkout_wait_seconds Time to check a connection out of the pool.',
+              '# TYPE db_pool_checkout_wait_seconds histogram']
+    lines += _histogram_lines('db_pool_checkout_wait_seconds', POOL_WAIT_BUCKETS, snapshot['pool_wait'])
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Record latency, status, SQL count/time per endpoint and pool checkout waits"""
+    if not event.contains(Engine, 'before_cursor_execute', _start_sql_timer):
+        event.listen(Engine, 'before_cursor_execute', _start_sql_timer)
+        event.listen(Engine, 'after_cursor_execute', _stop_sql_timer)
+    if not event.contains(Pool, 'checkout', _stop_checkout_timer):
+        event.listen(Session, 'after_transaction_create', _start_checkout_timer)
+        event.listen(Session, 'after_transaction_end', _clear_checkout_timer)
+        event.listen(Pool, 'checkout', _stop_checkout_timer)
+    app.before_request(_start_request_timer)
+    app.after_request(_record_request)
@@ -1,6 +1,6 @@
 from app import db
-from sqlalchemy import Column, Integer, String, Float, Text, Boolean, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, ForeignKey, Date, DateTime, Index
+from sqlalchemy.orm import relationship, joinedload, selectinload
 from datetime import datetime
 import uuid
 
@@ -32,6 +32,11 @@ class Subject(db.Model):
     # Relationship with books
     books = relationship('Book', backref='subject', lazy=True, cascade='all, delete-orphan')
     
+    @classmethod
+    def query_with_year(cls):
+        """Query that loads each subject's academic year in the same SELECT"""
+        return cls.query.options(joinedload(cls.academic_year))
+    
     def __repr__(self):
         return f'<Subject {self.name}>'
 
@@ -96,6 +101,11 @@ class Employee(db.Model):
 class Order(db.Model):
     """Model for customer orders"""
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Keyset pagination of the admin orders list, with and without a status filter
+        Index('ix_orders_status_created_at_id', 'status', 'created_at', 'id'),
+        Index('ix_orders_created_at_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     order_number = Column(String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
@@ -114,6 +124,14 @@ class Order(db.Model):
     employee = relationship('Employee', backref='orders')
     order_items = relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     
+    @classmethod
+    def query_with_items(cls):
+        """Query that loads the printing type, items and their books up front (2 SELECTs)"""
+        return cls.query.options(
+            joinedload(cls.printing_type),
+            selectinload(cls.order_items).joinedload(OrderItem.book),
+        )
+    
     def __repr__(self):
         return f'<Order {self.order_number}>'
 
@@ -122,7 +140,8 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False)
+    # Items are always read per order (order pages, invoices, exports)
+    order_id = Column(Integer, ForeignKey('orders.id'), nullable=False, index=True)
     book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
     unit_cost = Column(Float, nullable=False)  # Cost per copy
@@ -133,3 +152,143 @@ class OrderItem(db.Model):
     
     def __repr__(self):
         return f'<OrderItem {self.book_id} x{self.quantity}>'
+
+class ArchivedOrder(db.Model):
+    """Model for completed orders moved out of `orders` by the archival job (same columns and ids)"""
+    __tablename__ = 'archived_orders'
+    __table_args__ = (
+        # Day ranges of the rollup rebuild, exports and invoice rendering
+        Index('ix_archived_orders_created_at', 'created_at'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # the order's id in `orders`
+    order_number = Column(String(36), unique=True, nullable=False)
+    customer_name = Column(String(100))
+    customer_phone = Column(String(20))
+    total_cost = Column(Float, nullable=False)
+    status = Column(String(20), nullable=False)
+    printing_type_id = Column(Integer, ForeignKey('printing_prices.id'))
+    selected_addons = Column(Text)
+    created_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    employee_id = Column(Integer, ForeignKey('employees.id'))
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Same attribute names as Order so the order pages render either
+    printing_type = relationship('PrintingPrice')
+    employee = relationship('Employee')
+    order_items = relationship('ArchivedOrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    
+    @classmethod
+    def query_with_items(cls):
+        """Query that loads the printing type, items and their books up front (2 SELECTs)"""
+        return cls.query.options(
+            joinedload(cls.printing_type),
+            selectinload(cls.order_items).joinedload(ArchivedOrderItem.book),
+        )
+    
+    def __repr__(self):
+        return f'<ArchivedOrder {self.order_number}>'
+
+class ArchivedOrderItem(db.Model):
+    """Model for the items of archived orders"""
+    __tablename__ = 'archived_order_items'
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey('archived_orders.id'), nullable=False, index=True)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
+    quantity = Column(Integer, nullable=False, default=1)
+    unit_cost = Column(Float, nullable=False)
+    total_cost = Column(Float, nullable=False)
+    
+    book = relationship('Book')
+    
+    def __repr__(self):
+        return f'<ArchivedOrderItem {self.book_id} x{self.quantity}>'
+
+class CartSession(db.Model):
+    """Model for server-side carts, keyed by the opaque id kept in the cookie"""
+    __tablename__ = 'cart_sessions'
+    
+    id = Column(String(64), primary_key=True)
+    data = Column(Text, nullable=False)  # JSON of cart items and the last calculation
+    expires_at = Column(DateTime, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CartSession {self.id}>'
+
+class OrderCounter(db.Model):
+    """Model for incrementally maintained order counters (total and per status)"""
+    __tablename__ = 'order_counters'
+    
+    name = Column(String(40), primary_key=True)  # e.g. "total", "status:new"
+    value = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<OrderCounter {self.name}={self.value}>'
+
+class BookPrice(db.Model):
+    """Model for the materialized price of one copy of a book per printing type"""
+    __tablename__ = 'book_prices'
+    
+    book_id = Column(Integer, ForeignKey('books.id'), primary_key=True)
+    printing_type_id = Column(Integer, ForeignKey('printing_prices.id'), primary_key=True)
+    units = Column(Integer, nullable=False)  # ceil(page_count / pages_per_unit)
+    unit_price = Column(Float, nullable=False)  # units * price_per_unit, i.e. cost of one copy
+    
+    def __repr__(self):
+        return f'<BookPrice {self.book_id}/{self.printing_type_id}={self.unit_price}>'
+
+class DailyTypeRollup(db.Model):
+    """Model for orders, revenue and copies per day (UTC) and printing type"""
+    __tablename__ = 'daily_type_rollups'
+    
+    day = Column(Date, primary_key=True)
+    printing_type_id = Column(Integer, primary_key=True)  # no FK: history outlives deleted types
+    orders_count = Column(Integer, nullable=False, default=0)  # by created_at day
+    revenue = Column(Float, nullable=False, default=0)
+    copies = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)  # by completed_at day
+    completed_revenue = Column(Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyTypeRollup {self.day}/{self.printing_type_id}>'
+
+class DailyBookRollup(db.Model):
+    """Model for copies and revenue per day (UTC) and book"""
+    __tablename__ = 'daily_book_rollups'
+    
+    day = Column(Date, primary_key=True)
+    book_id = Column(Integer, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    copies = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyBookRollup {self.day}/{self.book_id}>'
+
+class MonthlyBookRollup(db.Model):
+    """Model for copies and revenue per month (UTC) and book, for long report ranges"""
+    __tablename__ = 'monthly_book_rollups'
+    
+    month = Column(Date, primary_key=True)  # first day of the month
+    book_id = Column(Integer, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    copies = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<MonthlyBookRollup {self.month}/{self.book_id}>'
+
+class DailyAddonRollup(db.Model):
+    """Model for orders and copies using each add-on per day (UTC)"""
+    __tablename__ = 'daily_addon_rollups'
+    
+    day = Column(Date, primary_key=True)
+    addon_id = Column(Integer, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    copies = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyAddonRollup {self.day}/{self.addon_id}>'
@@ -0,0 +1,91 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, literal, select
+from app import db
+from models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from dashboard_stats import record_orders_archived
+
+# Live tables first: lookups only reach the archive when the order isn't live
+ORDER_TABLES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+ORDER_COLUMNS = ('id', 'order_number', 'customer_name', 'customer_phone', 'total_cost', 'status',
+                 'printing_type_id', 'selected_addons', 'created_at', 'completed_at', 'employee_id')
+ITEM_COLUMNS = ('order_id', 'book_id', 'quantity', 'unit_cost', 'total_cost')
+
+ArchiveResult = namedtuple('ArchiveResult', 'orders items batches cutoff')
+
+
+def archive_orders(older_than_days, batch_size=1000):
+    """Move orders completed more than `older_than_days` ago, with their items, to the archive tables.
+
+    Each batch is copied with INSERT ... SELECT and deleted from the live
+    tables in its own transaction, so the job can be stopped and rerun at
+    any point. Order ids are kept, which makes the archive safe to join
+    with the live tables.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    # SQLite hands the largest rowid out again once it is deleted; keep that order live
+    newest_id = db.session.scalar(select(func.max(Order.id)))
+    archived_orders = archived_items = batches = 0
+    while True:
+        # (status, created_at, id) index order: finds old completed orders without sorting them all
+        order_ids = db.session.scalars(
+            select(Order.id)
+            .where(Order.status == 'completed', Order.completed_at < cutoff, Order.id != newest_id)
+            .order_by(Order.created_at, Order.id)
+            .limit(batch_size)
+            .with_for_update()
+        ).all()
+        if not order_ids:
+            break
+
+        now = datetime.utcnow()
+        db.session.execute(
+            insert(ArchivedOrder).from_select(
+                ORDER_COLUMNS + ('archived_at',),
+                select(*(getattr(Order, column) for column in ORDER_COLUMNS), literal(now, ArchivedOrder.archived_at.type))
+                .where(Order.id.in_(order_ids))
+            )
+        )
+        archived_items += db.session.execute(
+            insert(ArchivedOrderItem).from_select(
+                ITEM_COLUMNS,
+                select(*(getattr(OrderItem, column) for column in ITEM_COLUMNS))
+                .where(OrderItem.order_id.in_(order_ids))
+                .order_by(OrderItem.id)
+            )
+        ).rowcount
+        db.session.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+        db.session.execute(delete(Order).where(Order.id.in_(order_ids)))
+        record_orders_archived(len(order_ids))
+        db.session.commit()
+
+        archived_orders += len(order_ids)
+        batches += 1
+    db.session.commit()
+    return ArchiveResult(archived_orders, archived_items, batches, cutoff)
+
+
+def get_order_state(order_number):
+    """(status, total_cost, created_at, completed_at) of a live or archived order, or None"""
+    for model, _ in ORDER_TABLES:
+        state = db.session.execute(
+            select(model.status, model.total_cost, model.created_at, model.completed_at)
+            .where(model.order_number == order_number)
+        ).first()
+        if state is not None:
+            return state
+    return None
+
+
+def get_order_with_items(order_number):
+    """The Order, or else the ArchivedOrder, with its items and books loaded; None if neither exists"""
+    for model, _ in ORDER_TABLES:
+        order = model.query_with_items().filter_by(order_number=order_number).first()
+        if order is not None:
+            return order
+    return None
+
+
+def is_archived(order):
+    return isinstance(order, ArchivedOrder)
@@ -0,0 +1,284 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from flask import current_app
+
+
+class Subscription:
+    """One listener's queue of pending events; slow listeners lose the oldest events"""
+
+    def __init__(self, bus, maxsize):
+        self._bus = bus
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, event):
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """Return the next event, or None after `timeout` seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class OrderEventBus:
+    """In-process pub/sub delivering order events to every open stream of this worker"""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.delivered = 0
+
+    def subscribe(self):
+        subscription = Subscription(self, self.maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def deliver(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+        self.delivered += len(subscribers)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+class EventFanout(ABC):
+    """Interface of the backend carrying events between workers.
+
+    publish() hands an event to the backend; start(deliver) is called once,
+    when the first stream opens in this worker, and must arrange for
+    deliver(event) to be called for every event published by any worker
+    (including this one).
+    """
+
+    @abstractmethod
+    def publish(self, event):
+        pass
+
+    @abstractmethod
+    def start(self, deliver):
+        pass
+
+
+class LocalFanout(EventFanout):
+    """Events stay in this process; for a single worker"""
+
+    def __init__(self):
+        self._deliver = None
+
+    def publish(self, event):
+        if self._deliver is not None:
+            self._deliver(event)
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+
+class FileFanout(EventFanout):
+    """Events appended as JSON lines to files that every worker on the host tails.
+
+    A stand-in for a broker (e.g. Redis pub/sub) when all workers share a
+    machine. Events go to numbered segment files; once a segment passes
+    `max_bytes` publishers move on to the next one and old segments are
+    removed, while tailers read each segment to its end before following and
+    keep reading it until they follow the next one.
+    """
+
+    def __init__(self, directory, poll_seconds=0.25, max_bytes=1024 * 1024):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f'order-events-{segment:08d}.jsonl')
+
+    def _segments(self):
+        segments = []
+        for path in glob.glob(os.path.join(self.directory, 'order-events-*.jsonl')):
+            try:
+                segments.append(int(os.path.basename(path)[len('order-events-'):-len('.jsonl')]))
+            except ValueError:
+                pass
+        return sorted(segments)
+
+    def publish(self, event):
+        line = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+        segments = self._segments()
+        segment = segments[-1] if segments else 0
+        # One O_APPEND write per event, so lines from several workers never interleave
+        fd = os.open(self._path(segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_bytes:
+            os.close(os.open(self._path(segment + 1), os.O_WRONLY | os.O_CREAT, 0o644))
+            for old in segments:
+                if old < segment - 1:
+                    try:
+                        os.remove(self._path(old))
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _drain(events_file, pending, deliver):
+        """Deliver every complete line after the read position; return the partial rest"""
+        chunk = events_file.read()
+        if not chunk:
+            return pending, False
+        *lines, pending = (pending + chunk).split(b'\n')
+        for line in lines:
+            try:
+                deliver(json.loads(line))
+            except ValueError:
+                pass
+        return pending, True
+
+    def _open(self, segment, at_end):
+        try:
+            events_file = open(self._path(segment), 'rb')
+        except FileNotFoundError:
+            return None
+        if at_end:
+            events_file.seek(0, os.SEEK_END)
+        return events_file
+
+    def _tail(self, deliver):
+        # Start at the end of the newest segment: only events from now on
+        segments = self._segments()
+        segment = segments[-1] if segments else -1
+        events_file = self._open(segment, at_end=True)
+        pending = b''
+        # The segment before this one, kept open until the next switch: a publisher that
+        # listed the segments just before a rotation may still append to it
+        previous, previous_pending = None, b''
+        while True:
+            if events_file is not None:
+                pending, read = self._drain(events_file, pending, deliver)
+                if read:
+                    continue
+            if previous is not None:
+                previous_pending, _ = self._drain(previous, previous_pending, deliver)
+            newer = [number for number in self._segments() if number > segment]
+            if not newer:
+                time.sleep(self.poll_seconds)
+                continue
+            # Finish this segment (a last write may have landed since), then follow the next
+            if previous is not None:
+                previous.close()
+            previous, previous_pending = None, b''
+            if events_file is not None:
+                previous_pending, _ = self._drain(events_file, pending, deliver)
+                previous = events_file
+            segment = newer[0]
+            events_file = self._open(segment, at_end=False)
+            pending = b''
+
+    def start(self, deliver):
+        threading.Thread(target=self._tail, args=(deliver,), name='order-events-tail', daemon=True).start()
+
+
+class OrderEvents:
+    """The bus of this worker plus the fan-out backend feeding it"""
+
+    def __init__(self, fanout, maxsize=100):
+        self.bus = OrderEventBus(maxsize)
+        self.fanout = fanout
+        self._started = False
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event):
+        self.published += 1
+        self.fanout.publish(event)
+
+    def subscribe(self):
+        # Workers that never serve a stream never start a tail thread
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self.fanout.start(self.bus.deliver)
+                    self._started = True
+        return self.bus.subscribe()
+
+    def stats(self):
+        return {
+            'published': self.published,
+            'delivered': self.bus.delivered,
+            'subscribers': self.bus.subscriber_count(),
+        }
+
+
+def create_fanout(config):
+    """Build the backend selected by the ORDER_EVENTS_BACKEND setting"""
+    backend = config.get('ORDER_EVENTS_BACKEND', 'local')
+    if backend == 'local':
+        return LocalFanout()
+    if backend == 'file':
+        return FileFanout(config['ORDER_EVENTS_DIR'])
+    raise ValueError(f'Unknown ORDER_EVENTS_BACKEND: {backend}')
+
+
+def get_order_events():
+    return current_app.extensions['order_events']
+
+
+def order_payload(order):
+    """The fields of an order the live board shows"""
+    return {
+        'order_number': order.order_number,
+        'customer_name': order.customer_name,
+        'total_cost': order.total_cost,
+        'status': order.status,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+    }
+
+
+def publish_order_event(event_type, orders):
+    """Publish an event after its transaction committed.
+
+    `orders` is a list of order_payload() dicts (just order_number and status
+    for status changes). Totals are not included: boards fetch them from
+    /api/orders/counts when events arrive. The orders are already saved, so
+    a failing backend is logged instead of failing the request.
+    """
+    try:
+        get_order_events().publish({
+            'type': event_type,
+            'orders': orders,
+            'at': time.time(),
+        })
+    except Exception:
+        current_app.logger.exception('Publishing the %s order event failed', event_type)
+
+
+def init_order_events(app):
+    """Attach the order event bus and its configured fan-out backend"""
+    app.extensions['order_events'] = OrderEvents(create_fanout(app.config))
@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app import db
+from models import Book, PrintingPrice, AddOn, Employee
+from order_archive import ORDER_TABLES
+from dashboard_stats import ORDER_STATUSES
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# (header, width in characters for XLSX)
+EXPORT_COLUMNS = (
+    ('رقم الطلب', 38),
+    ('تاريخ الطلب', 20),
+    ('تاريخ الإكمال', 20),
+    ('الحالة', 12),
+    ('اسم العميل', 24),
+    ('رقم الهاتف', 16),
+    ('نوع الطباعة', 18),
+    ('الإضافات', 20),
+    ('إجمالي الطلب', 12),
+    ('الموظف', 16),
+    ('رقم الكتاب', 10),
+    ('اسم الكتاب', 32),
+    ('الكمية', 8),
+    ('سعر النسخة', 10),
+    ('إجمالي البند', 12),
+)
+
+CSV_FLUSH_ROWS = 1000
+
+# Spreadsheets run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+ExportFilters = namedtuple('ExportFilters', 'start end status')
+
+
+class ExportError(ValueError):
+    """Raised for an invalid export filter"""
+
+
+def export_filters(start=None, end=None, status=None):
+    """Validated filters on the orders' created_at day (UTC) range and status"""
+    if start is not None and end is not None and start > end:
+        raise ExportError('start must not be after end')
+    if status is not None and status not in ORDER_STATUSES:
+        raise ExportError(f'unknown status: {status}')
+    return ExportFilters(start, end, status)
+
+
+def _export_statement(order_model, item_model, filters):
+    """One row per item of the orders in `order_model` (live or archived) matching `filters`"""
+    conditions = []
+    if filters.start is not None:
+        conditions.append(order_model.created_at >= datetime.combine(filters.start, datetime.min.time()))
+    if filters.end is not None:
+        conditions.append(order_model.created_at < datetime.combine(filters.end + timedelta(days=1), datetime.min.time()))
+    if filters.status is not None:
+        conditions.append(order_model.status == filters.status)
+    # The selected_addons JSON (8th column) is replaced by the add-on names in iter_export_rows
+    return (
+        select(order_model.order_number, order_model.created_at, order_model.completed_at, order_model.status,
+               order_model.customer_name, order_model.customer_phone, PrintingPrice.name, order_model.selected_addons,
+               order_model.total_cost, Employee.username,
+               item_model.book_id, Book.name, item_model.quantity, item_model.unit_cost, item_model.total_cost)
+        .join(item_model, item_model.order_id == order_model.id)
+        .outerjoin(Book, Book.id == item_model.book_id)
+        .outerjoin(PrintingPrice, PrintingPrice.id == order_model.printing_type_id)
+        .outerjoin(Employee, Employee.id == order_model.employee_id)
+        .where(*conditions)
+        .order_by(order_model.id, item_model.id)
+    )
+
+
+def _as_text(value):
+    """Free text (names, phones) as a literal cell, never a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iter_export_rows(filters, chunk_size=2000):
+    """Yield one tuple per order item, in EXPORT_COLUMNS order, without loading the whole result.
+
+    Archived orders come first, then the live ones. Runs on its own
+    connection with a server-side cursor where the driver supports one
+    (stream_results), fetching `chunk_size` rows at a time, so memory stays
+    flat however many orders match. Text cells that a spreadsheet would
+    read as a formula get a leading apostrophe.
+    """
+    addons_text = {}
+    with db.engine.connect() as connection:
+        addon_names = dict(connection.execute(select(AddOn.id, AddOn.name)).all())
+        for order_model, item_model in reversed(ORDER_TABLES):
+            result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(
+                _export_statement(order_model, item_model, filters)
+            )
+            for rows in result.partitions(chunk_size):
+                for row in rows:
+                    selected = row.selected_addons
+                    if selected not in addons_text:
+                        try:
+                            ids = json.loads(selected) if selected else []
+                        except ValueError:
+                            ids = []
+                        addons_text[selected] = _as_text('، '.join(addon_names.get(addon_id, f'#{addon_id}') for addon_id in ids))
+                    yield tuple(row[:4]) + (
+                        _as_text(row[4]), _as_text(row[5]), _as_text(row[6]), addons_text[selected],
+                        round(row[8], 2), _as_text(row[9]), row[10], _as_text(row[11]), row[12],
+                        round(row[13], 2), round(row[14], 2),
+                    )
+
+
+def _csv_datetime(value):
+    return value.isoformat(' ', 'seconds') if value is not None else ''
+
+
+def iter_csv(rows):
+    """Encode rows as UTF-8 CSV (with a BOM so Excel reads Arabic correctly) in chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for header, _ in EXPORT_COLUMNS])
+    batch = []
+    order_number = None
+    for row in rows:
+        # The order columns repeat on every item row; format its dates once per order
+        if row[0] != order_number:
+            order_number = row[0]
+            dates = (_csv_datetime(row[1]), _csv_datetime(row[2]))
+        batch.append((order_number,) + dates + row[3:])
+        if len(batch) == CSV_FLUSH_ROWS:
+            writer.writerows(batch)
+            batch.clear()
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    writer.writerows(batch)
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_gzip(chunks, level=6):
+    """Gzip a stream of byte chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def xlsx_support_available():
+    """XLSX export needs the optional openpyxl package"""
+    try:
+        import openpyxl
+    except ImportError:
+        return False
+    return True
+
+
+def write_xlsx(rows, fileobj):
+    """Write rows to an XLSX workbook with openpyxl's write-only (constant memory) mode.
+
+    The XLSX zip can only be finished once every row is known, so it goes to
+    `fileobj` (e.g. a temporary file) rather than being streamed.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('الطلبات')
+    sheet.sheet_view.rightToLeft = True
+    for index, (_, width) in enumerate(EXPORT_COLUMNS, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+    sheet.append([header for header, _ in EXPORT_COLUMNS])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fileobj)
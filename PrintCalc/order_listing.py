@@ -0,0 +1,58 @@
+import base64
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import tuple_
+from models import Order
+
+OrderPage = namedtuple('OrderPage', 'items next_cursor prev_cursor')
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not produced by encode_cursor"""
+
+
+def encode_cursor(order):
+    """Opaque cursor pointing at an order's (created_at, id) position"""
+    raw = f'{order.created_at.isoformat()}|{order.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, order_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def get_orders_page(status=None, after=None, before=None, per_page=20):
+    """One page of orders, newest first, using keyset pagination on (created_at, id).
+
+    `after` continues to older orders, `before` goes back to newer ones. Each
+    page is a single index range scan, so deep pages cost the same as page 1.
+    """
+    position = tuple_(Order.created_at, Order.id)
+    query = Order.query
+    if status:
+        query = query.filter(Order.status == status)
+
+    if before:
+        # Walk towards newer orders, then flip back to newest-first
+        query = query.filter(position > tuple_(*decode_cursor(before)))
+        rows = query.order_by(Order.created_at.asc(), Order.id.asc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_newer, has_older = has_more, True
+    else:
+        if after:
+            query = query.filter(position < tuple_(*decode_cursor(after)))
+        rows = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_newer, has_older = bool(after), len(rows) > per_page
+
+    return OrderPage(
+        items,
+        encode_cursor(items[-1]) if items and has_older else None,
+        encode_cursor(items[0]) if items and has_newer else None,
+    )
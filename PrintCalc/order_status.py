@@ -0,0 +1,131 @@
+from collections import Counter, namedtuple
+from datetime import datetime
+from sqlalchemy import select, update
+from app import db
+from models import Order
+from dashboard_stats import ORDER_STATUSES, record_status_change
+from rollups import record_completions
+
+# Target status -> statuses an order may move to it from
+ALLOWED_TRANSITIONS = {
+    'new': ('in_progress',),
+    'in_progress': ('new', 'completed'),
+    'completed': ('new', 'in_progress'),
+}
+
+# The order details page may move an order from any status to any other one
+ANY_TRANSITION = {
+    status: tuple(source for source in ORDER_STATUSES if source != status) for status in ORDER_STATUSES
+}
+
+MAX_BULK_STATUS = 5000
+
+BulkStatusResult = namedtuple(
+    'BulkStatusResult', 'status updated skipped not_found by_previous_status order_numbers more'
+)
+
+
+class BulkStatusError(ValueError):
+    """Raised when a bulk status request is malformed as a whole"""
+
+
+def _selection(order_numbers, status, printing_type_id):
+    if order_numbers is not None:
+        if not isinstance(order_numbers, list) or not all(isinstance(number, str) for number in order_numbers):
+            raise BulkStatusError('order_numbers must be a list of strings')
+        if len(order_numbers) > MAX_BULK_STATUS:
+            raise BulkStatusError(f'at most {MAX_BULK_STATUS} orders per request')
+        return [Order.order_number.in_(order_numbers)]
+
+    if status is None and printing_type_id is None:
+        raise BulkStatusError('give order_numbers or a filter')
+    criteria = []
+    if status is not None:
+        if status not in ORDER_STATUSES:
+            raise BulkStatusError(f'unknown status: {status}')
+        criteria.append(Order.status == status)
+    if printing_type_id is not None:
+        try:
+            criteria.append(Order.printing_type_id == int(printing_type_id))
+        except (TypeError, ValueError):
+            raise BulkStatusError('printing_type_id must be an integer')
+    return criteria
+
+
+def bulk_update_status(new_status, employee_id=None, order_numbers=None, status=None, printing_type_id=None,
+                       transitions=ALLOWED_TRANSITIONS):
+    """Move many orders to `new_status` with one UPDATE ... WHERE id IN (...) per current status.
+
+    Orders are picked by `order_numbers` or by a filter on the current
+    status and/or printing type (at most MAX_BULK_STATUS per call, `more`
+    says whether the filter matched further orders). Orders whose current
+    status can't move to `new_status` under `transitions` are skipped. Each
+    UPDATE re-checks the current status and RETURNs the rows it changed,
+    and only those move the status counters and completion rollups, so a
+    concurrent change is neither overwritten nor counted twice. Commits.
+    """
+    if new_status not in transitions:
+        raise BulkStatusError(f'unknown status: {new_status}')
+    sources = transitions[new_status]
+
+    matched = db.session.execute(
+        select(Order.id, Order.order_number, Order.status, Order.completed_at, Order.printing_type_id,
+               Order.total_cost)
+        .where(*_selection(order_numbers, status, printing_type_id))
+        .order_by(Order.id)
+        .limit(MAX_BULK_STATUS + 1)
+        .with_for_update()
+    ).all()
+    more = order_numbers is None and len(matched) > MAX_BULK_STATUS
+    matched = matched[:MAX_BULK_STATUS]
+
+    eligible = [row for row in matched if row.status in sources]
+    not_found = []
+    if order_numbers is not None:
+        found = {row.order_number for row in matched}
+        not_found = sorted(set(order_numbers) - found)
+
+    values = {'status': new_status, 'employee_id': employee_id}
+    if new_status == 'completed':
+        values['completed_at'] = datetime.utcnow()
+    by_previous_status = Counter()
+    changed = []
+    for previous in sources:
+        ids = [row.id for row in eligible if row.status == previous]
+        if not ids:
+            continue
+        # RETURNING gives completed_at as this UPDATE left it: the new completion time, or for
+        # reopened orders the old one (cleared just below)
+        rows = db.session.execute(
+            update(Order)
+            .where(Order.id.in_(ids), Order.status == previous)
+            .values(**values)
+            .returning(Order.id, Order.order_number, Order.completed_at, Order.printing_type_id, Order.total_cost)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not rows:
+            continue
+        if previous == 'completed':
+            # Reopened orders no longer count as completed on their completion day
+            record_completions([(row.completed_at, row.printing_type_id, row.total_cost) for row in rows], sign=-1)
+            db.session.execute(
+                update(Order).where(Order.id.in_([row.id for row in rows])).values(completed_at=None)
+                .execution_options(synchronize_session=False)
+            )
+        record_status_change(previous, new_status, len(rows))
+        by_previous_status[previous] = len(rows)
+        changed.extend(rows)
+    if new_status == 'completed' and changed:
+        record_completions([(row.completed_at, row.printing_type_id, row.total_cost) for row in changed])
+    db.session.commit()
+
+    changed_ids = {row.id for row in changed}
+    return BulkStatusResult(
+        status=new_status,
+        updated=len(changed),
+        skipped=len(matched) - len(changed),
+        not_found=not_found,
+        by_previous_status=dict(by_previous_status),
+        order_numbers=[row.order_number for row in eligible if row.id in changed_ids],
+        more=more,
+    )
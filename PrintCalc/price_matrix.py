@@ -0,0 +1,113 @@
+import hashlib
+from types import MappingProxyType
+from sqlalchemy import delete, insert, select
+from app import db
+from models import Book, BookPrice, PrintingPrice
+from snapshot_cache import SnapshotCache
+
+
+class PriceMatrix:
+    """Read-only (units, price per copy) of every book, keyed by printing type id then book id.
+
+    `version` is a digest of the content, identical in every worker that loaded the same data.
+    """
+
+    def __init__(self, by_type, version):
+        self.by_type = by_type
+        self.version = version
+
+    def lookup(self, book_id, printing_type_id):
+        """(units, price per copy) or None when the pair is not materialized"""
+        prices = self.by_type.get(printing_type_id)
+        return prices.get(book_id) if prices is not None else None
+
+    def price(self, book_id, printing_type_id):
+        entry = self.lookup(book_id, printing_type_id)
+        return entry[1] if entry is not None else None
+
+
+def _price_rows(*conditions):
+    """SELECT producing book_prices rows for every book x printing type matching `conditions`"""
+    units = (Book.page_count + PrintingPrice.pages_per_unit - 1) // PrintingPrice.pages_per_unit
+    return (
+        select(Book.id, PrintingPrice.id, units, units * PrintingPrice.price_per_unit)
+        .select_from(Book)
+        .join(PrintingPrice, PrintingPrice.pages_per_unit > 0)
+        .where(*conditions)
+    )
+
+
+def rebuild_price_matrix():
+    """Recompute the whole matrix with one DELETE and one INSERT ... SELECT (caller commits)"""
+    db.session.execute(delete(BookPrice))
+    db.session.execute(
+        insert(BookPrice).from_select(['book_id', 'printing_type_id', 'units', 'unit_price'], _price_rows())
+    )
+
+
+def update_book_prices(book_id):
+    """Recompute one book's row of the matrix after it is added or its page_count changes"""
+    db.session.execute(delete(BookPrice).where(BookPrice.book_id == book_id))
+    db.session.execute(
+        insert(BookPrice).from_select(['book_id', 'printing_type_id', 'units', 'unit_price'],
+                                      _price_rows(Book.id == book_id))
+    )
+
+
+def update_books_prices(book_ids):
+    """Recompute the rows of many books at once (e.g. after a catalog import)"""
+    db.session.execute(delete(BookPrice).where(BookPrice.book_id.in_(book_ids)))
+    db.session.execute(
+        insert(BookPrice).from_select(['book_id', 'printing_type_id', 'units', 'unit_price'],
+                                      _price_rows(Book.id.in_(book_ids)))
+    )
+
+
+def update_printing_type_prices(printing_type_id):
+    """Recompute one printing type's column after it is added or its price/pages change"""
+    db.session.execute(delete(BookPrice).where(BookPrice.printing_type_id == printing_type_id))
+    db.session.execute(
+        insert(BookPrice).from_select(['book_id', 'printing_type_id', 'units', 'unit_price'],
+                                      _price_rows(PrintingPrice.id == printing_type_id))
+    )
+
+
+def delete_book_prices(book_id):
+    db.session.execute(delete(BookPrice).where(BookPrice.book_id == book_id))
+
+
+def delete_books_prices(book_ids):
+    """Drop the rows of many books (a list or a SELECT of ids) before the books themselves are deleted"""
+    db.session.execute(delete(BookPrice).where(BookPrice.book_id.in_(book_ids)))
+
+
+def delete_printing_type_prices(printing_type_id):
+    db.session.execute(delete(BookPrice).where(BookPrice.printing_type_id == printing_type_id))
+
+
+def _load_price_matrix():
+    """Load the materialized matrix into nested dicts with one query"""
+    by_type = {}
+    rows = db.session.execute(
+        select(BookPrice.printing_type_id, BookPrice.book_id, BookPrice.units, BookPrice.unit_price)
+        .order_by(BookPrice.printing_type_id, BookPrice.book_id)
+    ).all()
+    for printing_type_id, book_id, units, unit_price in rows:
+        by_type.setdefault(printing_type_id, {})[book_id] = (units, unit_price)
+    return PriceMatrix(
+        MappingProxyType({printing_type_id: MappingProxyType(prices) for printing_type_id, prices in by_type.items()}),
+        hashlib.sha1(repr(rows).encode('utf-8')).hexdigest(),
+    )
+
+
+_price_matrix_cache = SnapshotCache('price_matrix', _load_price_matrix)
+
+
+def get_price_matrix():
+    """Return the cached price matrix snapshot"""
+    return _price_matrix_cache.get()
+
+
+def invalidate_price_matrix():
+    """Must be called after committing any change made with the functions above"""
+    _price_matrix_cache.invalidate()
@@ -0,0 +1,66 @@
+from collections import namedtuple
+from types import MappingProxyType
+from sqlalchemy import select
+from app import db
+from models import PrintingPrice, AddOn
+from snapshot_cache import SnapshotCache
+
+# Read-only records for active printing types and add-ons
+PrintingType = namedtuple('PrintingType', 'id name price_per_unit pages_per_unit description')
+AddOnInfo = namedtuple('AddOnInfo', 'id name price description')
+
+
+class Pricing(namedtuple('Pricing', 'printing_types addons')):
+    """Active printing types and add-ons, each keyed by id in id order"""
+    __slots__ = ()
+
+    def printing_type_list(self):
+        return tuple(self.printing_types.values())
+
+    def addon_list(self):
+        return tuple(self.addons.values())
+
+    def selected_addons(self, addon_ids):
+        """Return the active add-ons among the submitted ids, ignoring unknown ones"""
+        selected = []
+        for addon_id in addon_ids:
+            try:
+                addon = self.addons.get(int(addon_id))
+            except (TypeError, ValueError):
+                continue
+            if addon is not None and addon not in selected:
+                selected.append(addon)
+        return selected
+
+
+def _load_pricing():
+    """Load active printing prices and add-ons"""
+    printing_types = db.session.execute(
+        select(PrintingPrice.id, PrintingPrice.name, PrintingPrice.price_per_unit,
+               PrintingPrice.pages_per_unit, PrintingPrice.description)
+        .where(PrintingPrice.is_active == True)
+        .order_by(PrintingPrice.id)
+    ).all()
+    addons = db.session.execute(
+        select(AddOn.id, AddOn.name, AddOn.price, AddOn.description)
+        .where(AddOn.is_active == True)
+        .order_by(AddOn.id)
+    ).all()
+
+    return Pricing(
+        MappingProxyType({row.id: PrintingType(*row) for row in printing_types}),
+        MappingProxyType({row.id: AddOnInfo(*row) for row in addons}),
+    )
+
+
+_pricing_cache = SnapshotCache('pricing', _load_pricing)
+
+
+def get_pricing():
+    """Return the cached pricing snapshot"""
+    return _pricing_cache.get()
+
+
+def invalidate_pricing():
+    """Must be called after any committed change to printing prices or add-ons"""
+    _pricing_cache.invalidate()
@@ -0,0 +1,126 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+QR_MIMETYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping with a fixed number of entries"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+_memory_cache = None
+_memory_cache_lock = threading.Lock()
+
+
+def _get_memory_cache():
+    global _memory_cache
+    if _memory_cache is None:
+        with _memory_cache_lock:
+            if _memory_cache is None:
+                _memory_cache = LRUCache(current_app.config.get('QR_CACHE_SIZE', 512))
+    return _memory_cache
+
+
+def qr_etag(data, image_format):
+    """Strong ETag of the QR image for `data`; the image is fully determined by it"""
+    return hashlib.sha1(f'{image_format}:{data}'.encode('utf-8')).hexdigest()
+
+
+def _disk_path(data, image_format):
+    cache_dir = current_app.config.get('QR_CACHE_DIR')
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, f'{qr_etag(data, image_format)}.{image_format}')
+
+
+def render_qr(data, image_format):
+    """Generate the QR image bytes for `data` as PNG or SVG"""
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    if image_format == 'svg':
+        import qrcode.image.svg
+        image = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+    else:
+        image = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = io.BytesIO()
+    image.save(buffer)
+    return buffer.getvalue()
+
+
+def get_cached_qr(data, image_format):
+    """Return the image from the memory or disk cache, or None"""
+    key = (image_format, data)
+    image = _get_memory_cache().get(key)
+    if image is not None:
+        return image
+
+    path = _disk_path(data, image_format)
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'rb') as image_file:
+                image = image_file.read()
+        except OSError:
+            return None
+        _get_memory_cache().put(key, image)
+        return image
+    return None
+
+
+def generate_and_cache_qr(data, image_format):
+    """Render the image and store it in the memory and (optional) disk cache"""
+    image = render_qr(data, image_format)
+    _get_memory_cache().put((image_format, data), image)
+
+    path = _disk_path(data, image_format)
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as image_file:
+                image_file.write(image)
+            os.replace(tmp_path, path)
+        except OSError:
+            current_app.logger.warning('Could not write QR cache file %s', path)
+    return image
+
+
+def qr_cache_stats():
+    return _get_memory_cache().stats()
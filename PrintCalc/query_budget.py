@@ -0,0 +1,161 @@
+from functools import wraps
+from flask import g, has_request_context, current_app, request, url_for
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in assert mode when a view issues more SQL statements than its budget"""
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+
+
+def sql_statement_count():
+    """Number of SQL statements issued so far in this request"""
+    return g.get('sql_statements', 0)
+
+
+def query_budget(max_statements):
+    """Declare the maximum number of SQL statements a view may issue.
+
+    With ASSERT_QUERY_BUDGETS enabled (tests, `flask check-query-budgets`) an
+    overrun raises QueryBudgetExceeded; otherwise it is logged as a warning.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = f(*args, **kwargs)
+            used = sql_statement_count()
+            if used > max_statements:
+                message = f'{request.endpoint} issued {used} SQL statements (budget {max_statements})'
+                if current_app.config.get('ASSERT_QUERY_BUDGETS'):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+        decorated_function.query_budget = max_statements
+        return decorated_function
+    return decorator
+
+
+def _reset_statement_count():
+    # The app context (and so g) can outlive one request, e.g. under the CLI
+    g.sql_statements = 0
+
+
+def init_query_budgets(app):
+    """Count SQL statements per request on every engine"""
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+    app.before_request(_reset_statement_count)
+
+
+SAMPLE_NAME = 'عينة فحص الاستعلامات'
+
+
+def budget_samples():
+    """(url_args, query_args) for check_query_budgets from the database.
+
+    On a database without orders (e.g. freshly seeded for CI) a sample year,
+    subject, book and order are created first, so that every view has
+    something to show.
+    """
+    from app import db
+    from models import AcademicYear, Subject, Book, Order, PrintingPrice
+
+    order = Order.query.order_by(Order.id).first()
+    if order is None:
+        from bulk_orders import create_orders_in_bulk
+        from catalog import invalidate_catalog
+        from price_matrix import update_books_prices, invalidate_price_matrix
+
+        book = Book.query.filter_by(is_active=True).order_by(Book.id).first()
+        if book is None:
+            year = AcademicYear.query.filter_by(name=SAMPLE_NAME).first()
+            if year is None:
+                year = AcademicYear(name=SAMPLE_NAME, is_active=True)
+                db.session.add(year)
+                db.session.flush()
+            subject = Subject(name=SAMPLE_NAME, year_id=year.id, is_active=True)
+            db.session.add(subject)
+            db.session.flush()
+            book = Book(name=SAMPLE_NAME, page_count=10, subject_id=subject.id, is_active=True)
+            db.session.add(book)
+            db.session.flush()
+            update_books_prices([book.id])
+            db.session.commit()
+            invalidate_catalog()
+            invalidate_price_matrix()
+        create_orders_in_bulk({
+            'printing_price_id': PrintingPrice.query.order_by(PrintingPrice.id).first().id,
+            'orders': [{'customer_name': SAMPLE_NAME, 'items': [{'book_id': book.id, 'quantity': 1}]}],
+        })
+        order = Order.query.order_by(Order.id).first()
+
+    year_id = db.session.scalar(
+        select(Subject.year_id)
+        .join(Book, Book.subject_id == Subject.id)
+        .join(AcademicYear, AcademicYear.id == Subject.year_id)
+        .where(Book.is_active.is_(True), Subject.is_active.is_(True), AcademicYear.is_active.is_(True))
+        .order_by(Book.id)
+        .limit(1)
+    )
+    return {'order_number': order.order_number}, {'api_catalog_books': {'year_id': year_id}}
+
+
+def check_query_budgets(app, url_args, query_args=None):
+    """Request every budgeted GET view as the admin with assertions on.
+
+    `url_args` supplies sample values for URL parameters (e.g. order_number),
+    `query_args` maps endpoints to the query string they need (e.g. year_id).
+    Returns a list of (endpoint, statements, budget, error) tuples.
+    """
+    query_args = query_args or {}
+    from models import Employee
+
+    results = []
+    previous = app.config.get('ASSERT_QUERY_BUDGETS'), app.config.get('PROPAGATE_EXCEPTIONS')
+    app.config['ASSERT_QUERY_BUDGETS'] = True
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    try:
+        with app.app_context():
+            admin = Employee.query.filter_by(username='admin').first()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['admin_logged_in'] = True
+            session['employee_id'] = admin.id if admin else None
+
+        for rule in app.url_map.iter_rules():
+            view = app.view_functions[rule.endpoint]
+            budget = getattr(view, 'query_budget', None)
+            if budget is None or 'GET' not in rule.methods:
+                continue
+            if any(arg not in url_args for arg in rule.arguments):
+                results.append((rule.endpoint, None, budget, 'no sample value for URL arguments'))
+                continue
+
+            with app.test_request_context():
+                url = url_for(rule.endpoint, **{arg: url_args[arg] for arg in rule.arguments},
+                              **query_args.get(rule.endpoint, {}))
+
+            statements = []
+
+            def count(*args):
+                statements.append(1)
+
+            event.listen(Engine, 'before_cursor_execute', count)
+            try:
+                response = client.get(url)
+                error = None if response.status_code < 400 else f'HTTP {response.status_code}'
+            except QueryBudgetExceeded as e:
+                error = str(e)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            finally:
+                event.remove(Engine, 'before_cursor_execute', count)
+            results.append((rule.endpoint, len(statements), budget, error))
+    finally:
+        app.config['ASSERT_QUERY_BUDGETS'], app.config['PROPAGATE_EXCEPTIONS'] = previous
+    return results
@@ -0,0 +1,162 @@
+from collections import namedtuple
+from sqlalchemy import select
+from app import db
+from models import Book
+from price_matrix import get_price_matrix
+
+# One priced cart line and one priced cart
+QuoteLine = namedtuple('QuoteLine', 'book_id name pages quantity units_needed printing_cost_per_copy total_printing_cost')
+Quote = namedtuple('Quote', 'lines printing_type addons total_printing_cost addons_cost total_cost')
+
+# What the engine needs to price one cart: (book_id, quantity) pairs,
+# a pricing.PrintingType and the selected pricing.AddOnInfo records
+CartSpec = namedtuple('CartSpec', 'items printing_type addons')
+
+
+class QuoteError(ValueError):
+    """Raised when a cart cannot be priced (unknown book, bad quantity...)"""
+
+
+def units_needed(page_count, pages_per_unit):
+    """Printing units for one copy, i.e. ceil(page_count / pages_per_unit)"""
+    return -(-page_count // pages_per_unit)
+
+
+def price_columns(page_counts, quantities, pages_per_unit, prices_per_unit):
+    """Price parallel columns of lines in a single pass.
+
+    Returns (units, cost_per_copy, total_cost) columns in the same order.
+    """
+    units = [-(-pages // per_unit) for pages, per_unit in zip(page_counts, pages_per_unit)]
+    per_copy = [count * price for count, price in zip(units, prices_per_unit)]
+    totals = [cost * quantity for cost, quantity in zip(per_copy, quantities)]
+    return units, per_copy, totals
+
+
+def fetch_books(book_ids):
+    """Fetch name and page count of many books with one query"""
+    if not book_ids:
+        return {}
+    rows = db.session.execute(
+        select(Book.id, Book.name, Book.page_count).where(Book.id.in_(book_ids))
+    ).all()
+    return {row.id: (row.name, row.page_count) for row in rows}
+
+
+def parse_items(items):
+    """Normalise [{'book_id', 'quantity'}] or [[book_id, quantity]] into (book_id, quantity) pairs"""
+    if not isinstance(items, (list, tuple)) or not items:
+        raise QuoteError('items must be a non-empty list')
+
+    pairs = []
+    for item in items:
+        if isinstance(item, dict):
+            book_id, quantity = item.get('book_id', item.get('id')), item.get('quantity', 1)
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            book_id, quantity = item
+        else:
+            raise QuoteError(f'invalid item: {item!r}')
+
+        if isinstance(book_id, bool) or isinstance(quantity, bool):
+            raise QuoteError(f'invalid item: {item!r}')
+        try:
+            book_id, quantity = int(book_id), int(quantity)
+        except (TypeError, ValueError):
+            raise QuoteError(f'invalid item: {item!r}')
+        if quantity < 1:
+            raise QuoteError(f'quantity must be at least 1 for book {book_id}')
+        pairs.append((book_id, quantity))
+    return pairs
+
+
+def cart_spec_from_json(data, pricing, defaults=None):
+    """Build a CartSpec from a JSON cart, falling back to batch-level defaults"""
+    defaults = defaults or {}
+
+    printing_price_id = data.get('printing_price_id', defaults.get('printing_price_id'))
+    try:
+        printing_type = pricing.printing_types.get(int(printing_price_id))
+    except (TypeError, ValueError):
+        printing_type = None
+    if printing_type is None:
+        raise QuoteError(f'unknown printing_price_id: {printing_price_id!r}')
+
+    addon_ids = data.get('addons', defaults.get('addons', []))
+    if not isinstance(addon_ids, list):
+        raise QuoteError('addons must be a list of ids')
+
+    return CartSpec(parse_items(data.get('items')), printing_type, pricing.selected_addons(addon_ids))
+
+
+def quote_carts(carts):
+    """Price many CartSpecs with one book fetch.
+
+    Per-copy prices come from the materialized price matrix; lines it does
+    not cover yet are priced in one vectorised pass. Returns a list aligned
+    with `carts` holding a Quote, or a QuoteError for carts that reference
+    unknown books.
+    """
+    books = fetch_books({book_id for cart in carts for book_id, _ in cart.items})
+    matrix = get_price_matrix()
+
+    # (units, cost per copy) of every priceable line, in cart order
+    line_prices = []
+    missing_lines, page_counts, pages_per_unit, prices_per_unit = [], [], [], []
+    results = []
+    for cart in carts:
+        missing = [book_id for book_id, _ in cart.items if book_id not in books]
+        if missing:
+            results.append(QuoteError(f'unknown book ids: {missing}'))
+            continue
+        results.append(None)
+        for book_id, quantity in cart.items:
+            entry = matrix.lookup(book_id, cart.printing_type.id)
+            if entry is None:
+                missing_lines.append(len(line_prices))
+                page_counts.append(books[book_id][1])
+                pages_per_unit.append(cart.printing_type.pages_per_unit)
+                prices_per_unit.append(cart.printing_type.price_per_unit)
+            line_prices.append(entry)
+
+    if missing_lines:
+        units, per_copy, _ = price_columns(page_counts, [1] * len(page_counts), pages_per_unit, prices_per_unit)
+        for position, line_units, line_cost in zip(missing_lines, units, per_copy):
+            line_prices[position] = (line_units, line_cost)
+
+    # Slice the lines back into carts
+    offset = 0
+    for index, cart in enumerate(carts):
+        if results[index] is not None:
+            continue
+        lines = []
+        for position, (book_id, quantity) in enumerate(cart.items, start=offset):
+            line_units, per_copy = line_prices[position]
+            lines.append(QuoteLine(book_id, books[book_id][0], books[book_id][1], quantity,
+                                   line_units, per_copy, per_copy * quantity))
+        offset += len(cart.items)
+
+        total_printing_cost = sum(line.total_printing_cost for line in lines)
+        addons_cost = sum(addon.price for addon in cart.addons)
+        results[index] = Quote(lines, cart.printing_type, list(cart.addons),
+                               total_printing_cost, addons_cost, total_printing_cost + addons_cost)
+    return results
+
+
+def quote_cart(items, printing_type, addons=()):
+    """Price a single cart, raising QuoteError if it cannot be priced"""
+    result = quote_carts([CartSpec(items, printing_type, addons)])[0]
+    if isinstance(result, QuoteError):
+        raise result
+    return result
+
+
+def quote_to_dict(quote):
+    """JSON-friendly representation of a Quote"""
+    return {
+        'printing_price': quote.printing_type._asdict(),
+        'lines': [line._asdict() for line in quote.lines],
+        'total_printing_cost': quote.total_printing_cost,
+        'selected_addons': [addon._asdict() for addon in quote.addons],
+        'addons_cost': quote.addons_cost,
+        'total_cost': quote.total_cost,
+    }
@@ -0,0 +1,368 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import Date, DateTime, cast, delete, distinct, func, insert, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from models import (Book, PrintingPrice, AddOn, DailyTypeRollup, DailyBookRollup, DailyAddonRollup,
+                    MonthlyBookRollup)
+from order_archive import ORDER_TABLES
+
+# What the rollups need to know about a newly created order
+RollupOrder = namedtuple('RollupOrder', 'created_at printing_type_id total_cost addon_ids items')
+# items: (book_id, quantity, total_cost) per order line
+RollupItem = namedtuple('RollupItem', 'book_id quantity total_cost')
+
+Report = namedtuple('Report', 'start end daily by_type top_books addons totals')
+
+TOP_BOOKS = 20
+
+
+def _upsert(model, key_columns, rows):
+    """Add the measures of each row onto its rollup row, creating missing rows.
+
+    Rows with the same key are merged first, so every key appears once per
+    statement.
+    """
+    merged = {}
+    for row in rows:
+        key = tuple(row[column] for column in key_columns)
+        current = merged.get(key)
+        if current is None:
+            merged[key] = dict(row)
+        else:
+            for column, value in row.items():
+                if column not in key_columns:
+                    current[column] += value
+    if not merged:
+        return
+
+    rows = list(merged.values())
+    measures = [column for column in rows[0] if column not in key_columns]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = dialect_insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: getattr(model, column) + statement.excluded[column] for column in measures},
+        )
+        db.session.execute(statement, rows)
+        return
+
+    for row in rows:
+        result = db.session.execute(
+            update(model)
+            .where(*[getattr(model, column) == row[column] for column in key_columns])
+            .values({column: getattr(model, column) + row[column] for column in measures})
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(model), [row])
+
+
+def record_created_orders(orders):
+    """Add new orders (RollupOrder records) to the rollups.
+
+    Call before committing the transaction that inserts them.
+    """
+    type_rows = []
+    book_rows = []
+    addon_rows = []
+    for order in orders:
+        day = order.created_at.date()
+        copies = sum(item.quantity for item in order.items)
+        type_rows.append({
+            'day': day, 'printing_type_id': order.printing_type_id,
+            'orders_count': 1, 'revenue': order.total_cost, 'copies': copies,
+        })
+        # An order counts once per book, even when the book is on several of its lines
+        order_books = {}
+        for item in order.items:
+            row = order_books.get(item.book_id)
+            if row is None:
+                order_books[item.book_id] = {
+                    'day': day, 'book_id': item.book_id,
+                    'orders_count': 1, 'copies': item.quantity, 'revenue': item.total_cost,
+                }
+            else:
+                row['copies'] += item.quantity
+                row['revenue'] += item.total_cost
+        book_rows.extend(order_books.values())
+        for addon_id in set(order.addon_ids):
+            addon_rows.append({'day': day, 'addon_id': addon_id, 'orders_count': 1, 'copies': copies})
+
+    _upsert(DailyTypeRollup, ['day', 'printing_type_id'], type_rows)
+    _upsert(DailyBookRollup, ['day', 'book_id'], book_rows)
+    _upsert(MonthlyBookRollup, ['month', 'book_id'], [
+        {
+            'month': row['day'].replace(day=1), 'book_id': row['book_id'],
+            'orders_count': row['orders_count'], 'copies': row['copies'], 'revenue': row['revenue'],
+        }
+        for row in book_rows
+    ])
+    _upsert(DailyAddonRollup, ['day', 'addon_id'], addon_rows)
+
+
+def record_completions(completions, sign=1):
+    """Count orders as completed on their completed_at day, or take them back with sign=-1.
+
+    `completions` holds (completed_at, printing_type_id, total_cost) tuples;
+    call before committing the status change.
+    """
+    _upsert(DailyTypeRollup, ['day', 'printing_type_id'], [
+        {
+            'day': completed_at.date(), 'printing_type_id': printing_type_id,
+            'completed_count': sign, 'completed_revenue': sign * total_cost,
+        }
+        for completed_at, printing_type_id, total_cost in completions
+        if completed_at is not None and printing_type_id is not None
+    ])
+
+
+def _day(column):
+    return func.date(column, type_=Date)
+
+
+def _month(column):
+    """First day of the month of a date column"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.date(column, 'start of month', type_=Date)
+    return cast(func.date_trunc('month', column), Date)
+
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _in_days(column, start, end):
+    """Conditions keeping `column` (a date or a timestamp) within days start..end"""
+    def as_bound(day):
+        if isinstance(column.type, DateTime):
+            return datetime.combine(day, datetime.min.time())
+        return day
+
+    conditions = []
+    if start is not None:
+        conditions.append(column >= as_bound(start))
+    if end is not None:
+        conditions.append(column < as_bound(end + timedelta(days=1)))
+    return conditions
+
+
+def _all_orders(day_column, start, end):
+    """Live and archived orders whose `day_column` falls within days start..end, as one subquery"""
+    return union_all(*(
+        select(model.id, model.status, model.printing_type_id, model.total_cost, model.selected_addons,
+               model.created_at, model.completed_at)
+        .where(*_in_days(getattr(model, day_column), start, end))
+        for model, _ in ORDER_TABLES
+    )).subquery()
+
+
+def _all_order_items(start, end):
+    """Items of the live and archived orders created within days start..end, with that created_at"""
+    return union_all(*(
+        select(item_model.order_id, item_model.book_id, item_model.quantity, item_model.total_cost,
+               order_model.created_at)
+        .join(order_model, order_model.id == item_model.order_id)
+        .where(*_in_days(order_model.created_at, start, end))
+        for order_model, item_model in ORDER_TABLES
+    )).subquery()
+
+
+def rebuild_rollups(start=None, end=None, chunk_size=5000):
+    """Recompute the rollup rows of days start..end (everything when None) from the live and archived orders.
+
+    Types and books are rebuilt with INSERT ... SELECT; add-ons need the
+    selected_addons JSON, which is streamed in chunks. Commits and returns
+    the number of rows written per rollup table.
+    """
+    for model in (DailyTypeRollup, DailyBookRollup, DailyAddonRollup):
+        db.session.execute(delete(model).where(*_in_days(model.day, start, end)))
+
+    orders = _all_orders('created_at', start, end)
+    items = _all_order_items(start, end)
+    copies_per_order = (
+        select(items.c.order_id, func.sum(items.c.quantity).label('copies'))
+        .group_by(items.c.order_id)
+        .subquery()
+    )
+    created_day = _day(orders.c.created_at)
+
+    db.session.execute(
+        insert(DailyTypeRollup).from_select(
+            ['day', 'printing_type_id', 'orders_count', 'revenue', 'copies', 'completed_count', 'completed_revenue'],
+            select(created_day, orders.c.printing_type_id, func.count(orders.c.id), func.sum(orders.c.total_cost),
+                   func.coalesce(func.sum(copies_per_order.c.copies), 0), 0, 0)
+            .outerjoin(copies_per_order, copies_per_order.c.order_id == orders.c.id)
+            .where(orders.c.printing_type_id.isnot(None))
+            .group_by(created_day, orders.c.printing_type_id)
+        )
+    )
+    completed_orders = _all_orders('completed_at', start, end)
+    completed_day = _day(completed_orders.c.completed_at)
+    completions = db.session.execute(
+        select(completed_day, completed_orders.c.printing_type_id, func.count(completed_orders.c.id),
+               func.sum(completed_orders.c.total_cost))
+        .where(completed_orders.c.status == 'completed', completed_orders.c.completed_at.isnot(None),
+               completed_orders.c.printing_type_id.isnot(None))
+        .group_by(completed_day, completed_orders.c.printing_type_id)
+    ).all()
+    _upsert(DailyTypeRollup, ['day', 'printing_type_id'], [
+        {
+            'day': day, 'printing_type_id': printing_type_id,
+            'orders_count': 0, 'revenue': 0, 'copies': 0,
+            'completed_count': count, 'completed_revenue': revenue,
+        }
+        for day, printing_type_id, count, revenue in completions
+    ])
+
+    item_day = _day(items.c.created_at)
+    db.session.execute(
+        insert(DailyBookRollup).from_select(
+            ['day', 'book_id', 'orders_count', 'copies', 'revenue'],
+            select(item_day, items.c.book_id, func.count(distinct(items.c.order_id)),
+                   func.sum(items.c.quantity), func.sum(items.c.total_cost))
+            .group_by(item_day, items.c.book_id)
+        )
+    )
+
+    # Whole months touched by the range, re-aggregated from their (now complete) daily rows
+    month_start = start.replace(day=1) if start is not None else None
+    month_end = _next_month(end) - timedelta(days=1) if end is not None else None
+    db.session.execute(delete(MonthlyBookRollup).where(*_in_days(MonthlyBookRollup.month, month_start, month_end)))
+    month = _month(DailyBookRollup.day)
+    db.session.execute(
+        insert(MonthlyBookRollup).from_select(
+            ['month', 'book_id', 'orders_count', 'copies', 'revenue'],
+            select(month, DailyBookRollup.book_id, func.sum(DailyBookRollup.orders_count),
+                   func.sum(DailyBookRollup.copies), func.sum(DailyBookRollup.revenue))
+            .where(*_in_days(DailyBookRollup.day, month_start, month_end))
+            .group_by(month, DailyBookRollup.book_id)
+        )
+    )
+
+    addon_counts = {}
+    rows = db.session.execute(
+        select(orders.c.created_at, orders.c.selected_addons, copies_per_order.c.copies)
+        .outerjoin(copies_per_order, copies_per_order.c.order_id == orders.c.id)
+        .where(orders.c.selected_addons.isnot(None), orders.c.selected_addons != '[]')
+        .execution_options(yield_per=chunk_size)
+    )
+    for created_at, selected_addons, copies in rows:
+        try:
+            addon_ids = set(json.loads(selected_addons))
+        except (TypeError, ValueError):
+            continue
+        for addon_id in addon_ids:
+            key = (created_at.date(), addon_id)
+            orders_count, addon_copies = addon_counts.get(key, (0, 0))
+            addon_counts[key] = (orders_count + 1, addon_copies + (copies or 0))
+    addon_rows = [
+        {'day': day, 'addon_id': addon_id, 'orders_count': orders_count, 'copies': copies}
+        for (day, addon_id), (orders_count, copies) in addon_counts.items()
+    ]
+    for offset in range(0, len(addon_rows), chunk_size):
+        db.session.execute(insert(DailyAddonRollup), addon_rows[offset:offset + chunk_size])
+
+    db.session.commit()
+    written = {
+        model.__tablename__: db.session.scalar(select(func.count()).select_from(model).where(*_in_days(model.day, start, end)))
+        for model in (DailyTypeRollup, DailyBookRollup, DailyAddonRollup)
+    }
+    written[MonthlyBookRollup.__tablename__] = db.session.scalar(
+        select(func.count()).select_from(MonthlyBookRollup)
+        .where(*_in_days(MonthlyBookRollup.month, month_start, month_end))
+    )
+    return written
+
+
+def get_report(start, end):
+    """Revenue and volume for days start..end, read from the rollup tables only (4 statements)"""
+    in_range = _in_days(DailyTypeRollup.day, start, end)
+    daily = db.session.execute(
+        select(DailyTypeRollup.day,
+               func.sum(DailyTypeRollup.orders_count).label('orders_count'),
+               func.sum(DailyTypeRollup.revenue).label('revenue'),
+               func.sum(DailyTypeRollup.copies).label('copies'),
+               func.sum(DailyTypeRollup.completed_count).label('completed_count'),
+               func.sum(DailyTypeRollup.completed_revenue).label('completed_revenue'))
+        .where(*in_range)
+        .group_by(DailyTypeRollup.day)
+        .order_by(DailyTypeRollup.day)
+    ).all()
+
+    by_type = db.session.execute(
+        select(DailyTypeRollup.printing_type_id, PrintingPrice.name,
+               func.sum(DailyTypeRollup.orders_count).label('orders_count'),
+               func.sum(DailyTypeRollup.revenue).label('revenue'),
+               func.sum(DailyTypeRollup.copies).label('copies'),
+               func.sum(DailyTypeRollup.completed_count).label('completed_count'),
+               func.sum(DailyTypeRollup.completed_revenue).label('completed_revenue'))
+        .outerjoin(PrintingPrice, PrintingPrice.id == DailyTypeRollup.printing_type_id)
+        .where(*in_range)
+        .group_by(DailyTypeRollup.printing_type_id, PrintingPrice.name)
+        .order_by(func.sum(DailyTypeRollup.revenue).desc())
+    ).all()
+
+    # Whole months come from the monthly rollup, only the days at either edge from the daily one
+    first_month = start if start.day == 1 else _next_month(start)
+    after_months = (end + timedelta(days=1)).replace(day=1)
+    if first_month < after_months:
+        parts = [
+            select(MonthlyBookRollup.book_id, MonthlyBookRollup.copies, MonthlyBookRollup.revenue,
+                   MonthlyBookRollup.orders_count)
+            .where(MonthlyBookRollup.month >= first_month, MonthlyBookRollup.month < after_months)
+        ]
+        edges = [(start, first_month - timedelta(days=1)), (after_months, end)]
+    else:
+        parts = []
+        edges = [(start, end)]
+    for edge_start, edge_end in edges:
+        if edge_start <= edge_end:
+            parts.append(
+                select(DailyBookRollup.book_id, DailyBookRollup.copies, DailyBookRollup.revenue,
+                       DailyBookRollup.orders_count)
+                .where(*_in_days(DailyBookRollup.day, edge_start, edge_end))
+            )
+    books = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+    top = (
+        select(books.c.book_id,
+               func.sum(books.c.copies).label('copies'),
+               func.sum(books.c.revenue).label('revenue'),
+               func.sum(books.c.orders_count).label('orders_count'))
+        .group_by(books.c.book_id)
+        .order_by(func.sum(books.c.copies).desc(), books.c.book_id)
+        .limit(TOP_BOOKS)
+        .subquery()
+    )
+    top_books = db.session.execute(
+        select(top.c.book_id, Book.name, top.c.copies, top.c.revenue, top.c.orders_count)
+        .outerjoin(Book, Book.id == top.c.book_id)
+        .order_by(top.c.copies.desc(), top.c.book_id)
+    ).all()
+
+    addons = db.session.execute(
+        select(DailyAddonRollup.addon_id, AddOn.name,
+               func.sum(DailyAddonRollup.orders_count).label('orders_count'),
+               func.sum(DailyAddonRollup.copies).label('copies'))
+        .outerjoin(AddOn, AddOn.id == DailyAddonRollup.addon_id)
+        .where(*_in_days(DailyAddonRollup.day, start, end))
+        .group_by(DailyAddonRollup.addon_id, AddOn.name)
+        .order_by(func.sum(DailyAddonRollup.orders_count).desc())
+    ).all()
+
+    totals = {
+        'orders_count': sum(row.orders_count for row in daily),
+        'revenue': sum(row.revenue for row in daily),
+        'copies': sum(row.copies for row in daily),
+        'completed_count': sum(row.completed_count for row in daily),
+        'completed_revenue': sum(row.completed_revenue for row in daily),
+    }
+    return Report(start, end, daily, by_type, top_books, addons, totals)
+
+
+def default_report_range(today=None):
+    """The last 30 days (UTC, like the order timestamps), today included"""
+    end = today or datetime.utcnow().date()
+    return end - timedelta(days=29), end
@@ -1,9 +1,73 @@
-import math
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+import hashlib
+import hmac
+import json
+import tempfile
+import time
+from datetime import datetime, timezone
+from flask import (render_template, request, redirect, url_for, flash, jsonify, session, abort, make_response, current_app,
+                   send_file, stream_with_context)
 from functools import wraps
-from app import app, db
+from sqlalchemy import select
+from app import db
 from models import AcademicYear, Subject, Book, PrintingPrice, AddOn, Employee, Order, OrderItem
-from werkzeug.security import check_password_hash
+from catalog import get_catalog, get_subject_options, invalidate_catalog
+from pricing import get_pricing, invalidate_pricing
+from price_matrix import (get_price_matrix, invalidate_price_matrix, update_book_prices, update_printing_type_prices,
+                          delete_book_prices, delete_books_prices, delete_printing_type_prices)
+from quote_engine import QuoteError, cart_spec_from_json, quote_cart, quote_carts, quote_to_dict, units_needed
+from snapshot_cache import all_cache_stats
+from cart_store import current_cart, clear_current_cart
+from qr_codes import QR_MIMETYPES, qr_etag, get_cached_qr, generate_and_cache_qr, qr_cache_stats
+from bulk_orders import BulkOrderError, create_orders_in_bulk
+from order_listing import InvalidCursor, get_orders_page
+from order_status import ANY_TRANSITION, BulkStatusError, bulk_update_status
+from rollups import RollupOrder, RollupItem, record_created_orders, get_report, default_report_range
+from order_export import (EXPORT_FORMATS, ExportError, export_filters, iter_export_rows, iter_csv, iter_gzip,
+                          xlsx_support_available, write_xlsx)
+from catalog_import import CatalogImportError, CatalogRow, read_catalog_file, validate_catalog_rows, import_catalog
+from order_archive import get_order_state, get_order_with_items, is_archived
+from order_events import get_order_events, order_payload, publish_order_event
+from book_listing import get_books_page
+from book_search import search_books
+from invoice_pdf import InvoiceRenderError, pdf_support_available, get_invoice_pdf, schedule_invoice_pdfs
+from query_budget import query_budget
+from metrics import collect_metrics, render_metrics
+from dashboard_stats import get_order_counts, get_catalog_and_employee_counts, record_orders_created
+from auth_context import is_admin, invalidate_auth, auth_cache_stats
+from werkzeug.security import check_password_hash, generate_password_hash
+
+class RouteRecorder:
+    """Collects routes and error handlers until register(app) adds them to an app.
+
+    Unlike a Blueprint it keeps the plain endpoint names used by url_for().
+    """
+
+    def __init__(self):
+        self._deferred = []
+
+    def route(self, rule, **options):
+        def decorator(f):
+            self._deferred.append(lambda app: app.route(rule, **options)(f))
+            return f
+        return decorator
+
+    def errorhandler(self, code):
+        def decorator(f):
+            self._deferred.append(lambda app: app.errorhandler(code)(f))
+            return f
+        return decorator
+
+    def register(self, app):
+        for deferred in self._deferred:
+            deferred(app)
+
+
+site = RouteRecorder()
+
+
+def register(app):
+    """Add every route of the site to `app`"""
+    site.register(app)
 
 # Admin credentials
 ADMIN_USERNAME = "admin"
@@ -29,17 +93,8 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def is_admin():
-    """Check if current user is admin"""
-    # Check if logged in and if it's admin user
-    employee_id = session.get('employee_id')
-    if employee_id:
-        employee = Employee.query.get(employee_id)
-        return employee and employee.username == 'admin'
-    return False
-
 # Main routes
-@app.route('/')
+@site.route('/')
 @login_required
 def index():
     """Main landing page - redirect based on user role"""
@@ -50,7 +105,7 @@ def index():
         return redirect(url_for('admin_login'))
 
 # Admin authentication routes
-@app.route('/admin/login', methods=['GET', 'POST'])
+@site.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     """Admin login page"""
     if request.method == 'POST':
@@ -81,7 +136,7 @@ def admin_login():
     
     return render_template('admin/login.html')
 
-@app.route('/admin/logout')
+@site.route('/admin/logout')
 def admin_logout():
     """Admin logout"""
     session.pop('admin_logged_in', None)
@@ -91,46 +146,31 @@ def admin_logout():
     return redirect(url_for('index'))
 
 # Admin routes
-@app.route('/admin')
+@site.route('/admin')
 @admin_required
+@query_budget(3)
 def admin_dashboard():
     """Admin dashboard"""
-    years_count = AcademicYear.query.count()
-    subjects_count = Subject.query.count()
-    books_count = Book.query.count()
-    
-    # Get order statistics
-    total_orders = Order.query.count()
-    new_orders = Order.query.filter_by(status='new').count()
-    in_progress_orders = Order.query.filter_by(status='in_progress').count()
-    completed_orders = Order.query.filter_by(status='completed').count()
-    
-    # Get employee statistics
-    total_employees = Employee.query.count()
-    active_employees = Employee.query.filter_by(is_active=True).count()
+    # Catalog/employee counts in one statement, order counts from counter rows
+    counts = get_catalog_and_employee_counts()
+    counts.update(get_order_counts())
+    
     recent_employees = Employee.query.filter(Employee.last_login.isnot(None)).order_by(Employee.last_login.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html', 
-                         years_count=years_count,
-                         subjects_count=subjects_count,
-                         books_count=books_count,
-                         total_orders=total_orders,
-                         new_orders=new_orders,
-                         in_progress_orders=in_progress_orders,
-                         completed_orders=completed_orders,
-                         total_employees=total_employees,
-                         active_employees=active_employees,
                          recent_employees=recent_employees,
-                         employee_name=session.get('employee_name', 'الموظف'))
+                         employee_name=session.get('employee_name', 'الموظف'),
+                         **counts)
 
-@app.route('/admin/years')
+@site.route('/admin/years')
 @admin_required
+@query_budget(1)
 def admin_years():
     """Manage academic years"""
     years = AcademicYear.query.all()
     return render_template('admin/years.html', years=years)
 
-@app.route('/admin/years/add', methods=['POST'])
+@site.route('/admin/years/add', methods=['POST'])
 @admin_required
 def add_year():
     """Add new academic year"""
@@ -141,13 +181,14 @@ def add_year():
         year = AcademicYear(name=name, description=description)
         db.session.add(year)
         db.session.commit()
+        invalidate_catalog()
         flash('تم إضافة السنة الدراسية بنجاح', 'success')
     else:
         flash('يرجى إدخال اسم السنة الدراسية', 'error')
     
     return redirect(url_for('admin_years'))
 
-@app.route('/admin/years/edit/<int:year_id>', methods=['POST'])
+@site.route('/admin/years/edit/<int:year_id>', methods=['POST'])
 @admin_required
 def edit_year(year_id):
     """Edit academic year"""
@@ -158,30 +199,36 @@ def edit_year(year_id):
     year.is_active = request.form.get('is_active') == 'on'
     
     db.session.commit()
+    invalidate_catalog()
     flash('تم تحديث السنة الدراسية بنجاح', 'success')
     
     return redirect(url_for('admin_years'))
 
-@app.route('/admin/years/delete/<int:year_id>', methods=['POST'])
+@site.route('/admin/years/delete/<int:year_id>', methods=['POST'])
 @admin_required
 def delete_year(year_id):
     """Delete academic year"""
     year = AcademicYear.query.get_or_404(year_id)
+    # The cascade deletes the year's books; their price rows must go first
+    delete_books_prices(select(Book.id).join(Subject, Subject.id == Book.subject_id).where(Subject.year_id == year.id))
     db.session.delete(year)
     db.session.commit()
+    invalidate_catalog()
+    invalidate_price_matrix()
     flash('تم حذف السنة الدراسية بنجاح', 'success')
     
     return redirect(url_for('admin_years'))
 
-@app.route('/admin/subjects')
+@site.route('/admin/subjects')
 @admin_required
+@query_budget(2)
 def admin_subjects():
     """Manage subjects"""
-    subjects = Subject.query.join(AcademicYear).all()
+    subjects = Subject.query_with_year().all()
     years = AcademicYear.query.filter_by(is_active=True).all()
     return render_template('admin/subjects.html', subjects=subjects, years=years)
 
-@app.route('/admin/subjects/add', methods=['POST'])
+@site.route('/admin/subjects/add', methods=['POST'])
 @admin_required
 def add_subject():
     """Add new subject"""
@@ -193,13 +240,14 @@ def add_subject():
         subject = Subject(name=name, description=description, year_id=year_id)
         db.session.add(subject)
         db.session.commit()
+        invalidate_catalog()
         flash('تم إضافة المادة بنجاح', 'success')
     else:
         flash('يرجى إدخال اسم المادة واختيار السنة الدراسية', 'error')
     
     return redirect(url_for('admin_subjects'))
 
-@app.route('/admin/subjects/edit/<int:subject_id>', methods=['POST'])
+@site.route('/admin/subjects/edit/<int:subject_id>', methods=['POST'])
 @admin_required
 def edit_subject(subject_id):
     """Edit subject"""
@@ -211,30 +259,62 @@ def edit_subject(subject_id):
     subject.is_active = request.form.get('is_active') == 'on'
     
     db.session.commit()
+    invalidate_catalog()
     flash('تم تحديث المادة بنجاح', 'success')
     
     return redirect(url_for('admin_subjects'))
 
-@app.route('/admin/subjects/delete/<int:subject_id>', methods=['POST'])
+@site.route('/admin/subjects/delete/<int:subject_id>', methods=['POST'])
 @admin_required
 def delete_subject(subject_id):
     """Delete subject"""
     subject = Subject.query.get_or_404(subject_id)
+    # The cascade deletes the subject's books; their price rows must go first
+    delete_books_prices(select(Book.id).where(Book.subject_id == subject.id))
     db.session.delete(subject)
     db.session.commit()
+    invalidate_catalog()
+    invalidate_price_matrix()
     flash('تم حذف المادة بنجاح', 'success')
     
     return redirect(url_for('admin_subjects'))
 
-@app.route('/admin/books')
+@site.route('/admin/books')
 @admin_required
+@query_budget(0)
 def admin_books():
-    """Manage books"""
-    books = Book.query.join(Subject).join(AcademicYear).all()
-    subjects = Subject.query.filter_by(is_active=True).all()
-    return render_template('admin/books.html', books=books, subjects=subjects)
+    """Manage books; rows and subject options are loaded by the page from the JSON API"""
+    return render_template('admin/books.html')
+
+@site.route('/admin/api/books')
+@admin_required
+@query_budget(1)
+def admin_api_books():
+    """Paginated, filterable list of books as JSON"""
+    status = request.args.get('status')
+    page = get_books_page(
+        subject_id=request.args.get('subject_id', type=int),
+        year_id=request.args.get('year_id', type=int),
+        search=request.args.get('q', '').strip() or None,
+        active={'active': True, 'inactive': False}.get(status),
+        after=request.args.get('after', type=int),
+        per_page=request.args.get('per_page', 50, type=int),
+    )
+    return jsonify({'books': page.items, 'next_after': page.next_after})
+
+@site.route('/admin/api/subjects')
+@admin_required
+@query_budget(1)
+def admin_api_subjects():
+    """Active subject options for the admin forms, served from the catalog cache"""
+    options = get_subject_options()
+    response = make_response(options.payload)
+    response.mimetype = 'application/json'
+    response.set_etag(options.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
-@app.route('/admin/books/add', methods=['POST'])
+@site.route('/admin/books/add', methods=['POST'])
 @admin_required
 def add_book():
     """Add new book"""
@@ -249,7 +329,11 @@ def add_book():
             if page_count > 0:
                 book = Book(name=name, page_count=page_count, description=description, subject_id=subject_id)
                 db.session.add(book)
+                db.session.flush()
+                update_book_prices(book.id)
                 db.session.commit()
+                invalidate_catalog()
+                invalidate_price_matrix()
                 flash('تم إضافة الكتاب بنجاح', 'success')
             else:
                 flash('عدد الصفحات يجب أن يكون أكبر من صفر', 'error')
@@ -260,11 +344,12 @@ def add_book():
     
     return redirect(url_for('admin_books'))
 
-@app.route('/admin/books/edit/<int:book_id>', methods=['POST'])
+@site.route('/admin/books/edit/<int:book_id>', methods=['POST'])
 @admin_required
 def edit_book(book_id):
     """Edit book"""
     book = Book.query.get_or_404(book_id)
+    old_page_count = book.page_count
     
     book.name = request.form.get('name', book.name)
     
@@ -283,31 +368,83 @@ def edit_book(book_id):
     book.subject_id = request.form.get('subject_id', book.subject_id)
     book.is_active = request.form.get('is_active') == 'on'
     
+    page_count_changed = book.page_count != old_page_count
+    if page_count_changed:
+        update_book_prices(book.id)
     db.session.commit()
+    invalidate_catalog()
+    if page_count_changed:
+        invalidate_price_matrix()
     flash('تم تحديث الكتاب بنجاح', 'success')
     
     return redirect(url_for('admin_books'))
 
-@app.route('/admin/books/delete/<int:book_id>', methods=['POST'])
+@site.route('/admin/books/delete/<int:book_id>', methods=['POST'])
 @admin_required
 def delete_book(book_id):
     """Delete book"""
     book = Book.query.get_or_404(book_id)
+    delete_book_prices(book.id)
     db.session.delete(book)
     db.session.commit()
+    invalidate_catalog()
+    invalidate_price_matrix()
     flash('تم حذف الكتاب بنجاح', 'success')
     
     return redirect(url_for('admin_books'))
 
-@app.route('/admin/settings')
+@site.route('/admin/catalog/import', methods=['GET', 'POST'])
 @admin_required
+def import_catalog_file():
+    """Upload a year/subject/book/page_count sheet, preview the changes, then apply them in one go"""
+    if request.method == 'GET':
+        return render_template('admin/catalog_import.html')
+    
+    deactivate_missing = request.form.get('deactivate_missing') == 'on'
+    try:
+        if request.form.get('rows'):
+            # Rows carried over from the preview, re-validated and re-planned against the current catalog
+            rows = [CatalogRow(*row) for row in json.loads(request.form['rows'])]
+        else:
+            upload = request.files.get('catalog_file')
+            if not upload or not upload.filename:
+                flash('يرجى اختيار ملف CSV أو Excel', 'error')
+                return redirect(url_for('import_catalog_file'))
+            rows = read_catalog_file(upload.stream, upload.filename)
+    except CatalogImportError as e:
+        flash(f'تعذر قراءة الملف: {e}', 'error')
+        return redirect(url_for('import_catalog_file'))
+    except (ValueError, TypeError):
+        flash('بيانات الاستيراد غير صحيحة', 'error')
+        return redirect(url_for('import_catalog_file'))
+    
+    rows, issues = validate_catalog_rows(rows)
+    if issues:
+        return render_template('admin/catalog_import.html', issues=issues)
+    if not rows:
+        flash('الملف لا يحتوي على أي كتب', 'error')
+        return redirect(url_for('import_catalog_file'))
+    
+    apply = request.form.get('action') == 'apply'
+    plan = import_catalog(rows, deactivate_missing, dry_run=not apply)
+    if not apply:
+        return render_template('admin/catalog_import.html', plan=plan, deactivate_missing=deactivate_missing,
+                               rows_json=json.dumps([list(row) for row in rows], ensure_ascii=False))
+    
+    flash(f'تم استيراد الكتالوج: {len(plan.new_books)} كتاب جديد، {len(plan.updated_books)} كتاب محدث، '
+          f'{len(plan.deactivated_books)} كتاب معطل', 'success')
+    return redirect(url_for('admin_books'))
+
+@site.route('/admin/settings')
+@admin_required
+@query_budget(2)
 def admin_settings():
     """Manage printing prices and add-ons"""
     printing_prices = PrintingPrice.query.all()
     addons = AddOn.query.all()
     return render_template('admin/settings.html', printing_prices=printing_prices, addons=addons)
 
-@app.route('/admin/settings/printing-price/add', methods=['POST'])
+@site.route('/admin/settings/printing-price/add', methods=['POST'])
 @admin_required
 def add_printing_price():
     """Add new printing price"""
@@ -328,7 +465,11 @@ def add_printing_price():
                 description=description
             )
             db.session.add(printing_price)
+            db.session.flush()
+            update_printing_type_prices(printing_price.id)
             db.session.commit()
+            invalidate_pricing()
+            invalidate_price_matrix()
             flash('تم إضافة نوع الطباعة بنجاح', 'success')
         except ValueError:
             flash('يرجى إدخال أرقام صحيحة للسعر وعدد الصفحات', 'error')
@@ -337,13 +478,14 @@ def add_printing_price():
     
     return redirect(url_for('admin_settings'))
 
-@app.route('/admin/settings/printing-price/edit/<int:price_id>', methods=['POST'])
+@site.route('/admin/settings/printing-price/edit/<int:price_id>', methods=['POST'])
 @admin_required
 def edit_printing_price(price_id):
     """Edit printing price"""
     printing_price = PrintingPrice.query.get_or_404(price_id)
     
     printing_price.name = request.form.get('name', printing_price.name)
+    old_rate = (printing_price.price_per_unit, printing_price.pages_per_unit)
     
     try:
         printing_price.price_per_unit = float(request.form.get('price_per_unit', printing_price.price_per_unit))
@@ -355,23 +497,32 @@ def edit_printing_price(price_id):
     printing_price.description = request.form.get('description', printing_price.description)
     printing_price.is_active = request.form.get('is_active') == 'on'
     
+    rate_changed = (printing_price.price_per_unit, printing_price.pages_per_unit) != old_rate
+    if rate_changed:
+        update_printing_type_prices(printing_price.id)
     db.session.commit()
+    invalidate_pricing()
+    if rate_changed:
+        invalidate_price_matrix()
     flash('تم تحديث نوع الطباعة بنجاح', 'success')
     
     return redirect(url_for('admin_settings'))
 
-@app.route('/admin/settings/printing-price/delete/<int:price_id>', methods=['POST'])
+@site.route('/admin/settings/printing-price/delete/<int:price_id>', methods=['POST'])
 @admin_required
 def delete_printing_price(price_id):
     """Delete printing price"""
     printing_price = PrintingPrice.query.get_or_404(price_id)
+    delete_printing_type_prices(printing_price.id)
     db.session.delete(printing_price)
     db.session.commit()
+    invalidate_pricing()
+    invalidate_price_matrix()
     flash('تم حذف نوع الطباعة بنجاح', 'success')
     
     return redirect(url_for('admin_settings'))
 
-@app.route('/admin/settings/addon/add', methods=['POST'])
+@site.route('/admin/settings/addon/add', methods=['POST'])
 @admin_required
 def add_addon():
     """Add new add-on"""
@@ -385,6 +536,7 @@ def add_addon():
             addon = AddOn(name=name, price=price, description=description)
             db.session.add(addon)
             db.session.commit()
+            invalidate_pricing()
             flash('تم إضافة الإضافة بنجاح', 'success')
         except ValueError:
             flash('يرجى إدخال رقم صحيح للسعر', 'error')
@@ -393,7 +545,7 @@ def add_addon():
     
     return redirect(url_for('admin_settings'))
 
-@app.route('/admin/settings/addon/edit/<int:addon_id>', methods=['POST'])
+@site.route('/admin/settings/addon/edit/<int:addon_id>', methods=['POST'])
 @admin_required
 def edit_addon(addon_id):
     """Edit add-on"""
@@ -411,29 +563,73 @@ def edit_addon(addon_id):
     addon.is_active = request.form.get('is_active') == 'on'
     
     db.session.commit()
+    invalidate_pricing()
     flash('تم تحديث الإضافة بنجاح', 'success')
     
     return redirect(url_for('admin_settings'))
 
-@app.route('/admin/settings/addon/delete/<int:addon_id>', methods=['POST'])
+@site.route('/admin/settings/addon/delete/<int:addon_id>', methods=['POST'])
 @admin_required
 def delete_addon(addon_id):
     """Delete add-on"""
     addon = AddOn.query.get_or_404(addon_id)
     db.session.delete(addon)
     db.session.commit()
+    invalidate_pricing()
     flash('تم حذف الإضافة بنجاح', 'success')
     
     return redirect(url_for('admin_settings'))
 
+@site.route('/admin/cache/stats')
+@admin_required
+@query_budget(0)
+def admin_cache_stats():
+    """Hit/miss counters of the in-process caches in this worker"""
+    stats = all_cache_stats()
+    stats['qr'] = qr_cache_stats()
+    stats['auth'] = auth_cache_stats()
+    stats['order_events'] = get_order_events().stats()
+    return jsonify(stats)
+
+@site.route('/admin/reports')
+@admin_required
+@query_budget(4)
+def admin_reports():
+    """Revenue and volume over a date range, read from the daily rollups only"""
+    start, end = default_report_range()
+    try:
+        if request.args.get('start'):
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        if request.args.get('end'):
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    except ValueError:
+        flash('تاريخ غير صحيح', 'error')
+        start, end = default_report_range()
+    if start > end:
+        start, end = end, start
+    
+    return render_template('admin/reports.html', report=get_report(start, end))
+
+@site.route('/admin/metrics')
+@query_budget(0)
+def admin_metrics():
+    """Prometheus metrics for admins, or for scrapers sending the METRICS_TOKEN bearer token"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    scraper = token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not scraper and not session.get('admin_logged_in'):
+        abort(403)
+    return current_app.response_class(render_metrics(collect_metrics()),
+                                      mimetype='text/plain; version=0.0.4')
+
 # User routes
-@app.route('/user')
+@site.route('/user')
 def user_select_year():
     """User interface - select academic year"""
     years = AcademicYear.query.filter_by(is_active=True).all()
     return render_template('user/select_year.html', years=years)
 
-@app.route('/calculate')
+@site.route('/calculate')
 @login_required
 def calculate_redirect():
     """Redirect to book selection"""
@@ -442,39 +638,20 @@ def calculate_redirect():
         return redirect(url_for('admin_login'))
     return redirect(url_for('user_select_books'))
 
-@app.route('/books')
+@site.route('/books')
 @login_required
 def user_select_books():
     """User interface to select books from all years"""
     # Allow both admin and employees to access cost calculation
     # (This is now allowed for all logged-in users)
     
-    # Initialize cart if not exists
-    if 'cart' not in session:
-        session['cart'] = []
-    
-    years = AcademicYear.query.filter_by(is_active=True).all()
-    years_with_books = []
-    
-    for year in years:
-        subjects = Subject.query.filter_by(year_id=year.id, is_active=True).all()
-        year_books = []
-        for subject in subjects:
-            books = Book.query.filter_by(subject_id=subject.id, is_active=True).all()
-            for book in books:
-                book.subject_name = subject.name
-                book.year_name = year.name
-                year_books.append(book)
-        
-        if year_books:
-            years_with_books.append({
-                'year': year,
-                'books': year_books
-            })
-    
-    return render_template('user/select_books.html', years_with_books=years_with_books)
+    # Years and books are loaded page by page from /api/catalog by static/js/app.js
+    cart = current_cart().items
+    return render_template('user/select_books.html',
+                         cart=cart,
+                         cart_ids=sorted({item['id'] for item in cart}))
 
-@app.route('/cart/add/<int:book_id>')
+@site.route('/cart/add/<int:book_id>')
 @login_required
 def add_to_cart(book_id):
     """Add book to cart - admin only"""
@@ -483,18 +660,16 @@ def add_to_cart(book_id):
         return redirect(url_for('admin_login'))
     
     book = Book.query.get_or_404(book_id)
-    
-    if 'cart' not in session:
-        session['cart'] = []
+    cart = current_cart()
     
     # Check if book already in cart, if yes increase quantity
-    for item in session['cart']:
+    for item in cart.items:
         if item['id'] == book_id:
             # Handle old cart items that don't have quantity field
             if 'quantity' not in item:
                 item['quantity'] = 1
             item['quantity'] += 1
-            session.modified = True
+            cart.modified = True
             flash(f'تم زيادة كمية كتاب {book.name} (الكمية: {item["quantity"]})', 'success')
             return redirect(url_for('user_select_books'))
     
@@ -502,7 +677,7 @@ def add_to_cart(book_id):
     subject = Subject.query.get(book.subject_id)
     year = AcademicYear.query.get(subject.year_id)
     
-    session['cart'].append({
+    cart.items.append({
         'id': book_id,
         'name': book.name,
         'pages': book.page_count,
@@ -510,12 +685,12 @@ def add_to_cart(book_id):
         'year_name': year.name,
         'quantity': 1
     })
-    session.modified = True
+    cart.modified = True
     
     flash(f'تم إضافة كتاب {book.name} للسلة', 'success')
     return redirect(url_for('user_select_books'))
 
-@app.route('/cart/remove/<int:book_id>')
+@site.route('/cart/remove/<int:book_id>')
 @login_required
 def remove_from_cart(book_id):
     """Remove book from cart - admin only"""
@@ -523,76 +698,73 @@ def remove_from_cart(book_id):
         flash('ليس لديك صلاحية لحذف الكتب. يرجى التواصل مع المدير.', 'error')
         return redirect(url_for('admin_login'))
     
-    if 'cart' in session:
-        session['cart'] = [item for item in session['cart'] if item['id'] != book_id]
-        session.modified = True
+    cart = current_cart()
+    if cart.items:
+        cart.items = [item for item in cart.items if item['id'] != book_id]
+        cart.modified = True
         flash('تم حذف الكتاب من السلة', 'success')
     
     return redirect(url_for('view_cart'))
 
-@app.route('/cart')
+@site.route('/cart')
 @login_required
 def view_cart():
     """View cart and calculate total cost - admin and employees"""
     # Allow both admin and employees to view cart for cost calculation
     
-    if 'cart' not in session or not session['cart']:
+    cart = current_cart()
+    if not cart.items:
         flash('السلة فارغة', 'info')
         return redirect(url_for('user_select_books'))
     
-    printing_prices = PrintingPrice.query.filter_by(is_active=True).all()
-    addons = AddOn.query.filter_by(is_active=True).all()
+    pricing = get_pricing()
     
     return render_template('user/cart.html', 
-                         cart=session['cart'],
-                         printing_prices=printing_prices,
-                         addons=addons)
+                         cart=cart.items,
+                         printing_prices=pricing.printing_type_list(),
+                         addons=pricing.addon_list())
 
-@app.route('/cart/calculate', methods=['POST'])
+@site.route('/cart/calculate', methods=['POST'])
 def calculate_cart_cost():
     """Calculate total cost for all books in cart"""
-    if 'cart' not in session or not session['cart']:
+    cart = current_cart()
+    if not cart.items:
         flash('السلة فارغة', 'error')
         return redirect(url_for('user_select_books'))
     
-    printing_price_id = request.form.get('printing_price_id')
     selected_addons = request.form.getlist('addons')
     
-    printing_price = PrintingPrice.query.get_or_404(printing_price_id)
+    pricing = get_pricing()
+    printing_price = pricing.printing_types.get(request.form.get('printing_price_id', type=int))
+    if printing_price is None:
+        abort(404)
+    
+    # Price every book in the cart with one bulk book fetch
+    selected_addon_objects = pricing.selected_addons(selected_addons)
+    cart_items = [(cart_item['id'], cart_item.get('quantity', 1)) for cart_item in cart.items]
+    try:
+        quote = quote_cart(cart_items, printing_price, selected_addon_objects)
+    except QuoteError:
+        flash('بعض الكتب في السلة لم تعد موجودة. يرجى مراجعة السلة.', 'error')
+        return redirect(url_for('view_cart'))
     
-    # Calculate cost for each book
     books_details = []
-    total_printing_cost = 0
-    
-    for cart_item in session['cart']:
-        book = Book.query.get(cart_item['id'])
-        quantity = cart_item.get('quantity', 1)
-        units_needed = math.ceil(book.page_count / printing_price.pages_per_unit)
-        printing_cost_per_copy = units_needed * printing_price.price_per_unit
-        total_printing_cost_for_item = printing_cost_per_copy * quantity
-        total_printing_cost += total_printing_cost_for_item
-        
+    for cart_item, line in zip(cart.items, quote.lines):
         books_details.append({
-            'id': book.id,
-            'name': book.name,
-            'pages': book.page_count,
-            'quantity': quantity,
-            'units_needed': units_needed,
-            'printing_cost_per_copy': printing_cost_per_copy,
-            'total_printing_cost': total_printing_cost_for_item,
+            'id': line.book_id,
+            'name': line.name,
+            'pages': line.pages,
+            'quantity': line.quantity,
+            'units_needed': line.units_needed,
+            'printing_cost_per_copy': line.printing_cost_per_copy,
+            'total_printing_cost': line.total_printing_cost,
             'subject_name': cart_item['subject_name'],
             'year_name': cart_item['year_name']
         })
     
-    # Calculate add-ons cost
-    addons_cost = 0
-    selected_addon_objects = []
-    if selected_addons:
-        selected_addon_objects = AddOn.query.filter(AddOn.id.in_(selected_addons)).all()
-        addons_cost = sum(addon.price for addon in selected_addon_objects)
-    
-    # Total cost
-    total_cost = total_printing_cost + addons_cost
+    total_printing_cost = quote.total_printing_cost
+    addons_cost = quote.addons_cost
+    total_cost = quote.total_cost
     
     calculation_details = {
         'books_details': books_details,
@@ -616,30 +788,24 @@ def calculate_cart_cost():
         'total_cost': total_cost
     }
     
-    # Store calculation in session for invoice printing
-    session['last_calculation'] = calculation_details
-    session.modified = True
-    
-    printing_prices = PrintingPrice.query.filter_by(is_active=True).all()
-    addons = AddOn.query.filter_by(is_active=True).all()
+    # Store calculation with the cart for invoice printing
+    cart.last_calculation = calculation_details
+    cart.modified = True
     
     return render_template('user/cart.html', 
-                         cart=session['cart'],
-                         printing_prices=printing_prices,
-                         addons=addons,
+                         cart=cart.items,
+                         printing_prices=pricing.printing_type_list(),
+                         addons=pricing.addon_list(),
                          calculation=calculation_details)
 
-@app.route('/invoice/print', methods=['POST'])
+@site.route('/invoice/print', methods=['POST'])
 def print_invoice():
     """Generate printable invoice"""
     from datetime import datetime
     import json
-    import qrcode
-    import io
-    import base64
     
-    # Get calculation data from session
-    calculation_data = session.get('last_calculation')
+    # Get calculation data stored with the cart
+    calculation_data = current_cart().last_calculation
     if not calculation_data:
         flash('لا توجد بيانات حساب. يرجى حساب التكلفة أولاً.', 'error')
         return redirect(url_for('view_cart'))
@@ -676,19 +842,21 @@ def print_invoice():
         )
         db.session.add(order_item)
     
+    record_orders_created()
+    record_created_orders([RollupOrder(
+        order.created_at, order.printing_type_id, order.total_cost,
+        [addon['id'] for addon in calculation_data['selected_addons']],
+        [RollupItem(book_detail['id'], book_detail['quantity'], book_detail['total_printing_cost'])
+         for book_detail in calculation_data['books_details']],
+    )])
     db.session.commit()
     
-    # Generate QR code for order tracking
-    qr_url = request.url_root + f"order/{order.order_number}"
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white")
+    # Have the PDF ready by the time anyone asks to reprint it
+    schedule_invoice_pdfs([order.order_number])
+    publish_order_event('created', [order_payload(order)])
     
-    # Convert QR code to base64 for embedding in HTML
-    buffer = io.BytesIO()
-    qr_img.save(buffer, format='PNG')
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+    # The QR code itself is served (and cached) by order_qr
+    qr_url = tracking_url_for(order.order_number)
     
     invoice_data = {
         'order_id': order.order_number,
@@ -698,59 +866,62 @@ def print_invoice():
         'amount_paid': amount_paid,
         'notes': notes,
         'calculation': calculation_data,
-        'qr_code': qr_base64,
+        'qr_code_url': url_for('order_qr', order_number=order.order_number),
+        'pdf_url': url_for('order_invoice_pdf', order_number=order.order_number) if pdf_support_available() else None,
         'tracking_url': qr_url
     }
     
     # Clear cart after successful order
-    session.pop('cart', None)
-    session.pop('last_calculation', None)
-    session.modified = True
+    clear_current_cart()
     
     return render_template('user/invoice.html', invoice=invoice_data)
 
-@app.route('/user/year/<int:year_id>')
+@site.route('/user/year/<int:year_id>')
 def user_select_subject(year_id):
     """User interface - select subject"""
     year = AcademicYear.query.get_or_404(year_id)
     subjects = Subject.query.filter_by(year_id=year_id, is_active=True).all()
     return render_template('user/select_subject.html', year=year, subjects=subjects)
 
-@app.route('/user/subject/<int:subject_id>')
+@site.route('/user/subject/<int:subject_id>')
 def user_select_book(subject_id):
     """User interface - select book"""
     subject = Subject.query.get_or_404(subject_id)
     books = Book.query.filter_by(subject_id=subject_id, is_active=True).all()
     return render_template('user/select_book.html', subject=subject, books=books)
 
-@app.route('/user/book/<int:book_id>')
+@site.route('/user/book/<int:book_id>')
 def user_calculate_cost(book_id):
     """User interface - calculate printing cost"""
     book = Book.query.get_or_404(book_id)
-    printing_prices = PrintingPrice.query.filter_by(is_active=True).all()
-    addons = AddOn.query.filter_by(is_active=True).all()
-    return render_template('user/calculate_cost.html', book=book, printing_prices=printing_prices, addons=addons)
+    pricing = get_pricing()
+    return render_template('user/calculate_cost.html', book=book,
+                         printing_prices=pricing.printing_type_list(),
+                         addons=pricing.addon_list())
 
-@app.route('/user/calculate', methods=['POST'])
+@site.route('/user/calculate', methods=['POST'])
 def calculate_cost():
     """Calculate printing cost based on selections"""
     book_id = request.form.get('book_id')
-    printing_price_id = request.form.get('printing_price_id')
     selected_addons = request.form.getlist('addons')
     
     book = Book.query.get_or_404(book_id)
-    printing_price = PrintingPrice.query.get_or_404(printing_price_id)
-    
-    # Calculate printing cost
-    units_needed = math.ceil(book.page_count / printing_price.pages_per_unit)
-    printing_cost = units_needed * printing_price.price_per_unit
+    pricing = get_pricing()
+    printing_price = pricing.printing_types.get(request.form.get('printing_price_id', type=int))
+    if printing_price is None:
+        abort(404)
+    
+    # Calculate printing cost, from the price matrix when the book is materialized
+    entry = get_price_matrix().lookup(book.id, printing_price.id)
+    if entry is not None:
+        units, printing_cost = entry
+    else:
+        units = units_needed(book.page_count, printing_price.pages_per_unit)
+        printing_cost = units * printing_price.price_per_unit
     
     # Calculate add-ons cost
-    addons_cost = 0
-    selected_addon_objects = []
-    if selected_addons:
-        selected_addon_objects = AddOn.query.filter(AddOn.id.in_(selected_addons)).all()
-        addons_cost = sum(addon.price for addon in selected_addon_objects)
+    selected_addon_objects = pricing.selected_addons(selected_addons)
+    addons_cost = sum(addon.price for addon in selected_addon_objects)
     
     # Total cost
     total_cost = printing_cost + addons_cost
@@ -758,7 +929,7 @@ def calculate_cost():
     calculation_details = {
         'book': book,
         'printing_price': printing_price,
-        'units_needed': units_needed,
+        'units_needed': units,
         'printing_cost': printing_cost,
         'selected_addons': selected_addon_objects,
         'addons_cost': addons_cost,
@@ -767,61 +938,384 @@ def calculate_cost():
     
     return render_template('user/calculate_cost.html', 
                          book=book, 
-                         printing_prices=PrintingPrice.query.filter_by(is_active=True).all(),
-                         addons=AddOn.query.filter_by(is_active=True).all(),
+                         printing_prices=pricing.printing_type_list(),
+                         addons=pricing.addon_list(),
                          calculation=calculation_details)
 
+# Book search API
+@site.route('/api/books/search')
+@login_required
+@query_budget(1)
+def api_book_search():
+    """Type-ahead search over active books by book, subject and year name"""
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    results = search_books(request.args.get('q', ''), limit)
+    return jsonify({
+        'results': [
+            {
+                'id': book.id,
+                'name': book.name,
+                'page_count': book.page_count,
+                'subject_name': book.subject_name,
+                'year_name': book.year_name,
+            } for book in results
+        ]
+    })
+
+# Catalog API
+def _catalog_json_response(etag_parts, build):
+    """JSON built by `build()`, validated by an ETag over the snapshot versions it depends on"""
+    etag = hashlib.sha1(repr(etag_parts).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@site.route('/api/catalog')
+@login_required
+@query_budget(3)
+def api_catalog():
+    """Active years with their subjects and book counts, without the books"""
+    catalog = get_catalog()
+    printing_types = get_pricing().printing_type_list()
+    
+    def build():
+        return {
+            'version': catalog.version,
+            'printing_types': [{'id': printing_type.id, 'name': printing_type.name} for printing_type in printing_types],
+            'years': [
+                {
+                    'id': section.year.id,
+                    'name': section.year.name,
+                    'description': section.year.description,
+                    'book_count': len(section.books),
+                    'subjects': [subject._asdict() for subject in section.subjects],
+                } for section in catalog.sections
+            ],
+        }
+    
+    return _catalog_json_response(('catalog', catalog.version, printing_types), build)
+
+@site.route('/api/catalog/books')
+@login_required
+@query_budget(4)
+def api_catalog_books():
+    """One page of a year's active books (optionally one subject) with their price per printing type"""
+    catalog = get_catalog()
+    section = catalog.sections_by_year_id.get(request.args.get('year_id', type=int))
+    if section is None:
+        abort(404)
+    subject_id = request.args.get('subject_id', type=int)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', 48, type=int), 200))
+    printing_types = get_pricing().printing_type_list()
+    prices = get_price_matrix()
+    
+    def build():
+        books = [book for book in section.books if book.subject_id == subject_id] if subject_id else section.books
+        page = books[offset:offset + limit]
+        return {
+            'version': catalog.version,
+            'books': [
+                {
+                    'id': book.id,
+                    'name': book.name,
+                    'page_count': book.page_count,
+                    'subject_id': book.subject_id,
+                    'subject_name': book.subject_name,
+                    'prices': {
+                        printing_type.id: prices.price(book.id, printing_type.id) for printing_type in printing_types
+                    },
+                } for book in page
+            ],
+            'next_offset': offset + limit if offset + limit < len(books) else None,
+        }
+    
+    etag_parts = ('books', catalog.version, prices.version, printing_types, section.year.id, subject_id, offset, limit)
+    return _catalog_json_response(etag_parts, build)
+
+# Quote API
+@site.route('/api/quote', methods=['POST'])
+@login_required
+def api_quote():
+    """Price a single cart given as JSON"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'expected a JSON object'}), 400
+    
+    try:
+        quote = quote_cart(*cart_spec_from_json(data, get_pricing()))
+    except QuoteError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(quote_to_dict(quote))
+
+@site.route('/api/quote/batch', methods=['POST'])
+@login_required
+def api_quote_batch():
+    """Price many carts in one call; invalid carts get a per-cart error"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('carts'), list):
+        return jsonify({'error': 'expected a JSON object with a carts list'}), 400
+    
+    results = [None] * len(data['carts'])
+    specs = []
+    positions = []
+    for index, cart in enumerate(data['carts']):
+        try:
+            if not isinstance(cart, dict):
+                raise QuoteError('each cart must be a JSON object')
+            specs.append(cart_spec_from_json(cart, get_pricing(), data))
+            positions.append(index)
+        except QuoteError as e:
+            results[index] = {'error': str(e)}
+    
+    for index, quote in zip(positions, quote_carts(specs)):
+        if isinstance(quote, QuoteError):
+            results[index] = {'error': str(quote)}
+        else:
+            results[index] = quote_to_dict(quote)
+    
+    return jsonify({'quotes': results})
+
+@site.route('/api/orders/bulk', methods=['POST'])
+@admin_required
+def api_bulk_orders():
+    """Create many orders (e.g. a school's student orders) in one transaction"""
+    payload = request.get_json(silent=True)
+    try:
+        result = create_orders_in_bulk(payload, employee_id=session.get('employee_id'))
+    except BulkOrderError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if result['created']:
+        created_at = datetime.utcnow().isoformat()
+        publish_order_event('created', [{
+            'order_number': created['order_number'],
+            'customer_name': str(payload['orders'][created['index']].get('customer_name') or ''),
+            'total_cost': created['total_cost'],
+            'status': 'new',
+            'created_at': created_at,
+        } for created in result['created']])
+    return jsonify(result), 201 if result['created'] else 200
+
 # Admin Order Management Routes
-@app.route('/admin/orders')
+@site.route('/admin/orders')
 @login_required
+@query_budget(2)
 def admin_orders():
     """Admin orders management"""
     status_filter = request.args.get('status', 'all')
-    page = request.args.get('page', 1, type=int)
     
-    query = Order.query
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
+    try:
+        orders = get_orders_page(
+            status=None if status_filter == 'all' else status_filter,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+        )
+    except InvalidCursor:
+        return redirect(url_for('admin_orders', status=status_filter))
     
-    orders = query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    # Totals come from the maintained dashboard counters instead of a COUNT(*); the
+    # list only shows live orders, so archived (completed) ones are taken out
+    counts = get_order_counts()
+    total_orders = counts['total_orders'] if status_filter == 'all' else counts.get(f'{status_filter}_orders')
+    if total_orders is not None and status_filter in ('all', 'completed'):
+        total_orders -= counts['archived_orders']
     
     return render_template('admin/orders.html', 
                          orders=orders, 
+                         total_orders=total_orders,
+                         archived_orders=counts['archived_orders'],
                          status_filter=status_filter,
                          employee_name=session.get('employee_name', 'الموظف'))
 
-@app.route('/admin/orders/<order_number>')
+@site.route('/admin/orders/export')
 @admin_required
+def export_orders():
+    """Download orders with their items as CSV (optionally gzipped) or XLSX, streamed in chunks"""
+    export_format = request.args.get('format', 'csv')
+    status = request.args.get('status', 'all')
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+        filters = export_filters(start, end, None if status == 'all' else status)
+        if export_format not in EXPORT_FORMATS:
+            raise ExportError(f'unknown format: {export_format}')
+    except ValueError:
+        flash('بيانات التصدير غير صحيحة', 'error')
+        return redirect(url_for('admin_orders'))
+    if export_format == 'xlsx' and not xlsx_support_available():
+        flash('تصدير Excel يحتاج إلى تثبيت مكتبة openpyxl', 'error')
+        return redirect(url_for('admin_orders'))
+    
+    filename = f"orders-{start or 'all'}-{end or 'all'}"
+    # The export reads on its own connection; don't hold the session's as well
+    db.session.close()
+    
+    if export_format == 'xlsx':
+        output = tempfile.TemporaryFile()
+        write_xlsx(iter_export_rows(filters), output)
+        output.seek(0)
+        return send_file(output, as_attachment=True, download_name=f'{filename}.xlsx',
+                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    
+    chunks = iter_csv(iter_export_rows(filters))
+    mimetype = 'text/csv; charset=utf-8'
+    filename += '.csv'
+    if request.args.get('gzip') == '1':
+        chunks = iter_gzip(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    return current_app.response_class(stream_with_context(chunks), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+    })
+
+@site.route('/admin/orders/live')
+@login_required
+@query_budget(2)
+def orders_live_board():
+    """Live order board; updates arrive over /api/orders/stream instead of reloads"""
+    return render_template('admin/orders_live.html',
+                         orders=get_orders_page(per_page=50).items,
+                         counts=get_order_counts(),
+                         employee_name=session.get('employee_name', 'الموظف'))
+
+@site.route('/api/orders/stream')
+@login_required
+def api_orders_stream():
+    """Server-Sent Events of order creations and status changes"""
+    subscription = get_order_events().subscribe()
+    heartbeat = current_app.config['ORDER_STREAM_HEARTBEAT_SECONDS']
+    # Streams end now and then and the browser reconnects, so no worker is held forever
+    deadline = time.monotonic() + current_app.config['ORDER_STREAM_MAX_SECONDS']
+    # Don't keep a pooled connection checked out for the life of the stream
+    db.session.close()
+    
+    def events():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                event = subscription.get(timeout=min(heartbeat, remaining))
+                if event is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f'event: {event["type"]}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n'
+        finally:
+            subscription.close()
+    
+    return current_app.response_class(events(), mimetype='text/event-stream',
+                                      headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@site.route('/api/orders/counts')
+@login_required
+@query_budget(1)
+def api_order_counts():
+    """Dashboard order totals, fetched by the live boards after order events"""
+    return jsonify(get_order_counts())
+
+@site.route('/admin/orders/<order_number>')
+@admin_required
+@query_budget(3)
 def admin_order_detail(order_number):
-    """View order details"""
-    order = Order.query.filter_by(order_number=order_number).first_or_404()
+    """View order details, falling back to the archive for old completed orders"""
+    order = get_order_with_items(order_number)
+    if order is None:
+        abort(404)
     return render_template('admin/order_detail.html', 
                          order=order,
+                         archived=is_archived(order),
+                         pdf_available=pdf_support_available(),
+                         allowed_statuses=[status for status, sources in ANY_TRANSITION.items()
+                                           if order.status in sources],
                          employee_name=session.get('employee_name', 'الموظف'))
 
-@app.route('/admin/orders/<order_number>/status', methods=['POST'])
+@site.route('/admin/orders/<order_number>/status', methods=['POST'])
 @admin_required
+@query_budget(8)
 def update_order_status(order_number):
-    """Update order status"""
-    from datetime import datetime
-    
-    order = Order.query.filter_by(order_number=order_number).first_or_404()
-    new_status = request.form.get('status')
+    """Update order status; unlike the bulk actions, any status may follow any other"""
+    try:
+        result = bulk_update_status(request.form.get('status'), employee_id=session.get('employee_id'),
+                                    order_numbers=[order_number], transitions=ANY_TRANSITION)
+    except BulkStatusError:
+        flash('حالة غير صحيحة', 'error')
+        return redirect(url_for('admin_order_detail', order_number=order_number))
+    if result.not_found:
+        abort(404)
     
-    if new_status in ['new', 'in_progress', 'completed']:
-        order.status = new_status
-        if new_status == 'completed':
-            order.completed_at = datetime.utcnow()
-        order.employee_id = session.get('employee_id')
-        db.session.commit()
-        flash(f'تم تحديث حالة الطلب إلى: {get_status_text(new_status)}', 'success')
+    if result.updated:
+        publish_status_changes(result)
+        flash(f'تم تحديث حالة الطلب إلى: {get_status_text(result.status)}', 'success')
     else:
-        flash('حالة غير صحيحة', 'error')
+        flash('الطلب في هذه الحالة بالفعل', 'info')
     
     return redirect(url_for('admin_order_detail', order_number=order_number))
 
+@site.route('/admin/api/orders/status', methods=['POST'])
+@admin_required
+@query_budget(8)
+def api_bulk_order_status():
+    """Move many orders to a status in one UPDATE, picked by order_numbers or a filter"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'expected a JSON object'}), 400
+    criteria = data.get('filter') or {}
+    if not isinstance(criteria, dict):
+        return jsonify({'error': 'filter must be a JSON object'}), 400
+    
+    try:
+        result = bulk_update_status(
+            data.get('status'),
+            employee_id=session.get('employee_id'),
+            order_numbers=data.get('order_numbers'),
+            status=criteria.get('status'),
+            printing_type_id=criteria.get('printing_type_id'),
+        )
+    except BulkStatusError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    publish_status_changes(result)
+    return jsonify(result._asdict())
+
+@site.route('/admin/orders/bulk-status', methods=['POST'])
+@admin_required
+def bulk_order_status():
+    """Update the status of the orders checked on the orders page"""
+    status_filter = request.form.get('status_filter', 'all')
+    order_numbers = request.form.getlist('order_numbers')
+    if not order_numbers:
+        flash('لم يتم اختيار أي طلب', 'error')
+        return redirect(url_for('admin_orders', status=status_filter))
+    
+    try:
+        result = bulk_update_status(request.form.get('status'), employee_id=session.get('employee_id'),
+                                    order_numbers=order_numbers)
+    except BulkStatusError:
+        flash('حالة غير صحيحة', 'error')
+        return redirect(url_for('admin_orders', status=status_filter))
+    
+    publish_status_changes(result)
+    flash(f'تم تحديث {result.updated} طلب إلى: {get_status_text(result.status)}', 'success')
+    if result.skipped:
+        flash(f'تم تخطي {result.skipped} طلب لا يمكن نقله إلى هذه الحالة', 'error')
+    return redirect(url_for('admin_orders', status=status_filter))
+
+def publish_status_changes(result):
+    """Tell the live boards about a bulk status update"""
+    if result.updated:
+        publish_order_event('status', [
+            {'order_number': order_number, 'status': result.status} for order_number in result.order_numbers
+        ])
+
 def get_status_text(status):
     """Get Arabic text for order status"""
     status_map = {
@@ -832,16 +1326,107 @@ def get_status_text(status):
     return status_map.get(status, status)
 
 # Order tracking for customers
-@app.route('/order/<order_number>')
+@site.route('/order/<order_number>')
 def track_order(order_number):
     """Customer order tracking page"""
-    order = Order.query.filter_by(order_number=order_number).first_or_404()
-    return render_template('user/track_order.html', order=order)
+    # Validators only: a single-row lookup that loads no ORM objects
+    state = get_order_state(order_number)
+    if state is None:
+        abort(404)
+    
+    etag = hashlib.sha1(
+        f'{order_number}:{state.status}:{state.total_cost}:{state.completed_at}'.encode()
+    ).hexdigest()
+    last_modified = state.completed_at or state.created_at
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        # Status changes before completion don't move Last-Modified, so the
+        # date alone is only trusted once the order is completed
+        not_modified = (state.status == 'completed' and last_modified is not None
+                        and request.if_modified_since is not None
+                        and request.if_modified_since >= last_modified.replace(microsecond=0, tzinfo=timezone.utc))
+    
+    if not_modified:
+        response = current_app.response_class(status=304)
+    else:
+        order = get_order_with_items(order_number)
+        if order is None:
+            abort(404)
+        response = make_response(render_template('user/track_order.html', order=order))
+    
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Browsers may keep the page but must revalidate it on every visit
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@site.route('/order/<order_number>/invoice.pdf')
+@login_required
+def order_invoice_pdf(order_number):
+    """PDF invoice built from the stored order, rendered in the background and cached on disk"""
+    if not pdf_support_available():
+        abort(503)
+    
+    try:
+        result = get_invoice_pdf(order_number, current_app.config.get('INVOICE_PDF_WAIT_SECONDS', 5))
+    except InvoiceRenderError:
+        current_app.logger.exception('Invoice PDF failed for %s', order_number)
+        response = make_response('تعذر إنشاء الفاتورة حالياً، يرجى المحاولة لاحقاً', 503)
+        response.headers['Retry-After'] = '30'
+        return response
+    if result is None:
+        abort(404)
+    path, fingerprint = result
+    if path is None:
+        response = make_response('جاري إنشاء الفاتورة، يرجى المحاولة بعد لحظات', 202)
+        response.headers['Retry-After'] = '2'
+        return response
+    
+    response = send_file(path, mimetype='application/pdf', download_name=f'invoice-{order_number}.pdf',
+                         etag=fingerprint, conditional=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def tracking_url_for(order_number):
+    """Public tracking URL encoded in an order's QR code"""
+    return request.url_root + f"order/{order_number}"
+
+@site.route('/order/<order_number>/qr')
+def order_qr(order_number):
+    """QR code of the order tracking URL as SVG (default) or PNG"""
+    image_format = request.args.get('format', 'svg')
+    if image_format not in QR_MIMETYPES:
+        abort(404)
+    
+    tracking_url = tracking_url_for(order_number)
+    etag = qr_etag(tracking_url, image_format)
+    if request.if_none_match.contains(etag):
+        image = b''
+    else:
+        image = get_cached_qr(tracking_url, image_format)
+        if image is None:
+            # Only render codes for real orders so the cache can't be flooded
+            if get_order_state(order_number) is None:
+                abort(404)
+            image = generate_and_cache_qr(tracking_url, image_format)
+    
+    response = current_app.response_class(image, mimetype=QR_MIMETYPES[image_format])
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 60 * 60
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
 
 # Error handlers
 # Employee management routes (admin only)
-@app.route('/admin/employees')
+@site.route('/admin/employees')
 @admin_required
+@query_budget(2)
 def admin_employees():
     """Manage employees - admin only"""
     if not is_admin():
@@ -851,7 +1436,7 @@ def admin_employees():
     employees = Employee.query.order_by(Employee.created_at.desc()).all()
     return render_template('admin/employees.html', employees=employees)
 
-@app.route('/admin/employees/add', methods=['POST'])
+@site.route('/admin/employees/add', methods=['POST'])
 @admin_required
 def add_employee():
     """Add new employee - admin only"""
@@ -885,7 +1470,7 @@ def add_employee():
     
     return redirect(url_for('admin_employees'))
 
-@app.route('/admin/employees/edit/<int:employee_id>', methods=['POST'])
+@site.route('/admin/employees/edit/<int:employee_id>', methods=['POST'])
 @admin_required
 def edit_employee(employee_id):
     """Edit employee - admin only"""
@@ -905,11 +1490,12 @@ def edit_employee(employee_id):
         employee.password = generate_password_hash(new_password)
     
     db.session.commit()
+    invalidate_auth(employee.id)
     flash(f'تم تحديث بيانات {employee.full_name} بنجاح', 'success')
     
     return redirect(url_for('admin_employees'))
 
-@app.route('/admin/employees/delete/<int:employee_id>', methods=['POST'])
+@site.route('/admin/employees/delete/<int:employee_id>', methods=['POST'])
 @admin_required
 def delete_employee(employee_id):
     """Delete employee - admin only"""
@@ -926,13 +1512,15 @@ def delete_employee(employee_id):
     
     db.session.delete(employee)
     db.session.commit()
+    invalidate_auth(employee_id)
     flash(f'تم حذف الموظف {employee.full_name} بنجاح', 'success')
     
     return redirect(url_for('admin_employees'))
 
 # Employee dashboard for non-admin users
-@app.route('/employee')
+@site.route('/employee')
 @login_required
+@query_budget(2)
 def employee_dashboard():
     """Employee dashboard - limited access"""
     if is_admin():
@@ -940,23 +1528,15 @@ def employee_dashboard():
         return redirect(url_for('admin_dashboard'))
     
     # Employee can only see orders and basic stats
-    total_orders = Order.query.count()
-    new_orders = Order.query.filter_by(status='new').count()
-    in_progress_orders = Order.query.filter_by(status='in_progress').count()
-    completed_orders = Order.query.filter_by(status='completed').count()
-    
     return render_template('employee/dashboard.html',
-                         total_orders=total_orders,
-                         new_orders=new_orders,
-                         in_progress_orders=in_progress_orders,
-                         completed_orders=completed_orders,
-                         employee_name=session.get('employee_name', 'الموظف'))
+                         employee_name=session.get('employee_name', 'الموظف'),
+                         **get_order_counts())
 
-@app.errorhandler(404)
+@site.errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@site.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
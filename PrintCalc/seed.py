@@ -0,0 +1,69 @@
+from werkzeug.security import generate_password_hash
+from app import db
+
+
+def create_schema():
+    """Create any missing tables (and their indexes)"""
+    import models
+    db.create_all()
+
+
+def seed_defaults():
+    """Insert the default printing prices, add-ons, admin account, order counters, price matrix and rollups.
+
+    Each group is only seeded when its table is empty, so this is safe to run
+    on every deploy. Returns the names of the groups that were seeded.
+    """
+    from models import PrintingPrice, AddOn, Employee, Order, ArchivedOrder, OrderCounter, BookPrice, DailyTypeRollup
+
+    seeded = []
+
+    # Create default printing prices if they don't exist
+    if not PrintingPrice.query.first():
+        db.session.add_all([
+            PrintingPrice(name="وش أسود", price_per_unit=0.5, pages_per_unit=2),
+            PrintingPrice(name="وش وظهر أسود", price_per_unit=0.8, pages_per_unit=4)
+        ])
+        seeded.append('printing prices')
+
+    # Create default add-ons if they don't exist
+    if not AddOn.query.first():
+        db.session.add_all([
+            AddOn(name="غلاف", price=7.0, is_active=True),
+            AddOn(name="تجليد", price=5.0, is_active=True)
+        ])
+        seeded.append('add-ons')
+
+    # Create default admin employee if no employees exist
+    if not Employee.query.first():
+        db.session.add(Employee(
+            username="admin",
+            password=generate_password_hash("admin123"),
+            full_name="مدير النظام",
+            phone="01000000000",
+            is_active=True
+        ))
+        seeded.append('admin employee')
+
+    db.session.commit()
+
+    # Seed the dashboard order counters
+    if not OrderCounter.query.first():
+        from dashboard_stats import reconcile_order_counters
+        reconcile_order_counters()
+        seeded.append('order counters')
+
+    # Materialize the book x printing type prices for catalogs created before the matrix
+    if not BookPrice.query.first():
+        from price_matrix import rebuild_price_matrix
+        rebuild_price_matrix()
+        db.session.commit()
+        seeded.append('price matrix')
+
+    # Build the reporting rollups for order histories that predate them
+    if not DailyTypeRollup.query.first() and (Order.query.first() or ArchivedOrder.query.first()):
+        from rollups import rebuild_rollups
+        rebuild_rollups()
+        seeded.append('reporting rollups')
+
+    return seeded
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import threading
+import uuid
+
+# Every cache created in this process, by name, for the stats endpoint
+_registry = {}
+
+
+def _stamp_path(name):
+    stamp_dir = os.environ.get('CACHE_STAMP_DIR', tempfile.gettempdir())
+    return os.path.join(stamp_dir, f'printcalc-{name}.stamp')
+
+
+def read_stamp(name):
+    """The current token of a host-wide stamp, or None if it was never written"""
+    try:
+        with open(_stamp_path(name)) as stamp_file:
+            return stamp_file.read()
+    except OSError:
+        return None
+
+
+def write_stamp(name):
+    """Give a stamp a new token; every worker reading it sees the change"""
+    path = _stamp_path(name)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w') as stamp_file:
+            stamp_file.write(uuid.uuid4().hex)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Without a stamp file only this worker sees the invalidation
+        pass
+
+
+class SnapshotCache:
+    """In-process cache holding one immutable snapshot built by a loader.
+
+    The snapshot is rebuilt lazily on the first access after invalidate().
+    Every invalidation is also written to a small stamp file so that all
+    gunicorn workers on the host drop their copy, not only the worker that
+    handled the admin request.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stamp = None
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        _registry[name] = self
+
+    def get(self):
+        """Return the current snapshot, rebuilding it if it is stale"""
+        stamp = read_stamp(self.name)
+        snapshot = self._snapshot
+        if snapshot is not None and stamp == self._stamp:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or stamp != self._stamp:
+                self.misses += 1
+                self._snapshot = self._loader()
+                self._stamp = stamp
+                self.version += 1
+            else:
+                self.hits += 1
+            return self._snapshot
+
+    def invalidate(self):
+        """Drop the snapshot here and in every other worker"""
+        self._snapshot = None
+        write_stamp(self.name)
+
+    def stats(self):
+        """Hit/miss counters for this worker"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'version': self.version,
+            'loaded': self._snapshot is not None,
+        }
+
+
+def all_cache_stats():
+    """Stats of every snapshot cache in this worker, keyed by cache name"""
+    return {name: cache.stats() for name, cache in sorted(_registry.items())}
@@ -275,6 +275,354 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Progressive catalog browsing: years come from /api/catalog, books page by page
+    function initCatalogBrowser(root) {
+        const cartIds = new Set(JSON.parse(root.dataset.cartIds || '[]'));
+        // Book ids are appended to this, e.g. /cart/add/ + 12
+        const addUrl = root.dataset.addUrl.replace(/0$/, '');
+        let printingTypes = [];
+
+        function getJSON(url) {
+            // The browser revalidates with the ETag, so unchanged pages cost a 304
+            return fetch(url, {credentials: 'same-origin'}).then(function(response) {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.json();
+            });
+        }
+
+        function small(iconClass, text) {
+            const element = document.createElement('small');
+            element.className = 'text-muted d-block';
+            element.innerHTML = '<i class="fas ' + iconClass + ' me-1"></i>';
+            element.appendChild(document.createTextNode(text));
+            return element;
+        }
+
+        function renderBook(book) {
+            const column = document.createElement('div');
+            column.className = 'col-md-6 col-lg-4 mb-3';
+            const card = document.createElement('div');
+            card.className = 'card h-100 border-light';
+            const body = document.createElement('div');
+            body.className = 'card-body';
+
+            const title = document.createElement('h6');
+            title.className = 'card-title';
+            title.textContent = book.name;
+            body.appendChild(title);
+
+            const details = document.createElement('p');
+            details.className = 'card-text';
+            details.appendChild(small('fa-book', 'المادة: ' + book.subject_name));
+            details.appendChild(small('fa-file-alt', 'عدد الصفحات: ' + book.page_count));
+            printingTypes.forEach(function(printingType) {
+                const price = book.prices[printingType.id];
+                if (price !== null && price !== undefined) {
+                    details.appendChild(small('fa-tag', printingType.name + ': ' + price.toFixed(2) + ' ج.م'));
+                }
+            });
+            body.appendChild(details);
+
+            if (cartIds.has(book.id)) {
+                body.insertAdjacentHTML('beforeend',
+                    '<button class="btn btn-success btn-sm" disabled><i class="fas fa-check me-1"></i>في السلة</button>');
+            } else {
+                const add = document.createElement('a');
+                add.href = addUrl + book.id;
+                add.className = 'btn btn-primary btn-sm';
+                add.innerHTML = '<i class="fas fa-plus me-1"></i>أضف للسلة';
+                body.appendChild(add);
+            }
+
+            card.appendChild(body);
+            column.appendChild(card);
+            return column;
+        }
+
+        function renderYear(year) {
+            const card = document.createElement('div');
+            card.className = 'card mb-4';
+            card.innerHTML =
+                '<div class="card-header d-flex justify-content-between align-items-center flex-wrap gap-2">' +
+                '  <div><h5 class="mb-0"><i class="fas fa-graduation-cap me-2"></i><span class="year-name"></span></h5>' +
+                '  <small class="text-muted year-description"></small></div>' +
+                '  <select class="form-select form-select-sm w-auto"></select>' +
+                '</div>' +
+                '<div class="card-body"><div class="row"></div>' +
+                '  <div class="text-center"><button type="button" class="btn btn-outline-secondary btn-sm d-none">تحميل المزيد</button></div>' +
+                '</div>';
+            card.querySelector('.year-name').textContent = year.name + ' (' + year.book_count + ')';
+            card.querySelector('.year-description').textContent = year.description || '';
+
+            const subjectSelect = card.querySelector('select');
+            subjectSelect.add(new Option('كل المواد', ''));
+            year.subjects.forEach(function(subject) {
+                subjectSelect.add(new Option(subject.name + ' (' + subject.book_count + ')', subject.id));
+            });
+
+            const row = card.querySelector('.row');
+            const more = card.querySelector('button');
+            let nextOffset = 0;
+            let loading = false;
+            // Bumped on every subject change, so pages of the previous subject are dropped
+            let token = 0;
+            let reload = false;
+
+            function loadPage() {
+                if (loading || nextOffset === null) {
+                    return;
+                }
+                loading = true;
+                const request = ++token;
+                const params = new URLSearchParams({year_id: year.id, offset: nextOffset});
+                if (subjectSelect.value) {
+                    params.set('subject_id', subjectSelect.value);
+                }
+                getJSON(root.dataset.booksUrl + '?' + params.toString())
+                    .then(function(data) {
+                        if (request !== token) {
+                            return;
+                        }
+                        data.books.forEach(function(book) {
+                            row.appendChild(renderBook(book));
+                        });
+                        nextOffset = data.next_offset;
+                        more.classList.toggle('d-none', nextOffset === null);
+                    })
+                    .finally(function() {
+                        loading = false;
+                        if (reload) {
+                            reload = false;
+                            restart();
+                        }
+                    });
+            }
+
+            function restart() {
+                row.innerHTML = '';
+                nextOffset = 0;
+                more.classList.add('d-none');
+                loadPage();
+            }
+
+            subjectSelect.addEventListener('change', function() {
+                token++;
+                // A page still loading is dropped and the new subject loads once it settles
+                if (loading) {
+                    reload = true;
+                } else {
+                    restart();
+                }
+            });
+            more.addEventListener('click', loadPage);
+
+            // Load a year's first page when it scrolls into view, and further pages as the button does
+            if ('IntersectionObserver' in window) {
+                const observer = new IntersectionObserver(function(entries) {
+                    entries.forEach(function(entry) {
+                        if (entry.isIntersecting) {
+                            loadPage();
+                        }
+                    });
+                }, {rootMargin: '200px'});
+                observer.observe(more.parentNode);
+            } else {
+                loadPage();
+            }
+            return card;
+        }
+
+        getJSON(root.dataset.catalogUrl)
+            .then(function(catalog) {
+                printingTypes = catalog.printing_types;
+                root.innerHTML = '';
+                if (!catalog.years.length) {
+                    document.getElementById('catalogEmpty').classList.remove('d-none');
+                    return;
+                }
+                catalog.years.forEach(function(year) {
+                    root.appendChild(renderYear(year));
+                });
+            })
+            .catch(function() {
+                root.innerHTML = '<div class="alert alert-danger alert-permanent">تعذر تحميل الكتب. يرجى تحديث الصفحة.</div>';
+            });
+    }
+
+    const catalogBrowser = document.getElementById('catalogBrowser');
+    if (catalogBrowser) {
+        initCatalogBrowser(catalogBrowser);
+    }
+
+    // Type-ahead book search over /api/books/search; results link straight to "add to cart"
+    function initBookSearch(input) {
+        const results = document.getElementById('bookSearchResults');
+        // Book ids are appended to this, e.g. /cart/add/ + 12
+        const addUrl = input.dataset.addUrl.replace(/0$/, '');
+        let timer = null;
+        let latest = 0;
+
+        function render(books) {
+            results.innerHTML = '';
+            books.forEach(function(book) {
+                const link = document.createElement('a');
+                link.href = addUrl + book.id;
+                link.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
+                const title = document.createElement('span');
+                title.textContent = book.name;
+                const details = document.createElement('small');
+                details.className = 'text-muted';
+                details.textContent = book.subject_name + ' - ' + book.year_name + ' (' + book.page_count + ' صفحة)';
+                link.appendChild(title);
+                link.appendChild(details);
+                results.appendChild(link);
+            });
+        }
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!query) {
+                // A search still in flight must not refill the cleared list
+                latest++;
+                render([]);
+                return;
+            }
+            timer = setTimeout(function() {
+                const request = ++latest;
+                fetch(input.dataset.searchUrl + '?q=' + encodeURIComponent(query), {credentials: 'same-origin'})
+                    .then(function(response) { return response.json(); })
+                    .then(function(data) {
+                        // Ignore answers to queries the cashier has already typed past
+                        if (request === latest) {
+                            render(data.results);
+                        }
+                    });
+            }, 150);
+        });
+    }
+
+    const bookSearch = document.getElementById('bookSearch');
+    if (bookSearch) {
+        initBookSearch(bookSearch);
+    }
+
+    // Live order board: rows and totals follow the server's order events
+    function initOrderBoard(root) {
+        const rows = document.getElementById('orderBoardRows');
+        const state = document.getElementById('orderBoardState');
+        const maxRows = 50;
+        const badges = {
+            'new': ['bg-info', 'جديد'],
+            'in_progress': ['bg-warning', 'قيد التنفيذ'],
+            'completed': ['bg-success', 'مكتمل']
+        };
+
+        function badge(status) {
+            const element = document.createElement('span');
+            const entry = badges[status] || ['bg-secondary', status];
+            element.className = 'badge ' + entry[0];
+            element.textContent = entry[1];
+            return element;
+        }
+
+        function cell(row, content) {
+            const td = document.createElement('td');
+            if (typeof content === 'string') {
+                td.textContent = content;
+            } else {
+                td.appendChild(content);
+            }
+            row.appendChild(td);
+            return td;
+        }
+
+        function renderOrder(order) {
+            const row = document.createElement('tr');
+            row.dataset.orderNumber = order.order_number;
+            const link = document.createElement('a');
+            link.href = root.dataset.detailUrl.replace('ORDER', encodeURIComponent(order.order_number));
+            const code = document.createElement('code');
+            code.textContent = order.order_number.slice(0, 8) + '...';
+            link.appendChild(code);
+            cell(row, link);
+            cell(row, order.customer_name || 'غير محدد');
+            cell(row, Number(order.total_cost).toFixed(2) + ' ج.م');
+            cell(row, badge(order.status)).dataset.status = '';
+            cell(row, (order.created_at || '').slice(0, 16).replace('T', ' '));
+            row.classList.add('table-success');
+            setTimeout(function() { row.classList.remove('table-success'); }, 3000);
+            return row;
+        }
+
+        function updateCounts(counts) {
+            Object.keys(counts).forEach(function(name) {
+                const element = root.querySelector('[data-count="' + name + '"]');
+                if (element) {
+                    element.textContent = counts[name];
+                }
+            });
+        }
+
+        // Totals are fetched at most once a second, however many events arrive
+        let countsTimer = null;
+        function refreshCounts() {
+            if (countsTimer) {
+                return;
+            }
+            countsTimer = setTimeout(function() {
+                fetch(root.dataset.countsUrl, {credentials: 'same-origin'})
+                    .then(function(response) { return response.ok ? response.json() : null; })
+                    .then(function(counts) {
+                        if (counts) {
+                            updateCounts(counts);
+                        }
+                    })
+                    .catch(function() {})
+                    .finally(function() { countsTimer = null; });
+            }, 1000);
+        }
+
+        const source = new EventSource(root.dataset.streamUrl);
+        source.onopen = function() {
+            state.className = 'badge bg-success';
+            state.textContent = 'متصل';
+        };
+        source.onerror = function() {
+            // EventSource reconnects by itself
+            state.className = 'badge bg-secondary';
+            state.textContent = 'جاري إعادة الاتصال...';
+        };
+        source.addEventListener('created', function(message) {
+            const event = JSON.parse(message.data);
+            event.orders.forEach(function(order) {
+                rows.insertBefore(renderOrder(order), rows.firstChild);
+            });
+            while (rows.children.length > maxRows) {
+                rows.removeChild(rows.lastChild);
+            }
+            refreshCounts();
+        });
+        source.addEventListener('status', function(message) {
+            const event = JSON.parse(message.data);
+            event.orders.forEach(function(order) {
+                const row = rows.querySelector('tr[data-order-number="' + order.order_number + '"]');
+                if (row) {
+                    const statusCell = row.querySelector('[data-status]');
+                    statusCell.replaceChildren(badge(order.status));
+                }
+            });
+            refreshCounts();
+        });
+    }
+
+    const orderBoard = document.getElementById('orderBoard');
+    if (orderBoard) {
+        initOrderBoard(orderBoard);
+    }
+
     // Keyboard shortcuts
     document.addEventListener('keydown', function(e) {
         // Ctrl/Cmd + / for search
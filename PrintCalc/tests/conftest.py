@@ -0,0 +1,90 @@
+import itertools
+import pytest
+from app import create_app, db
+from seed import create_schema, seed_defaults
+from models import AcademicYear, Subject, Book, Employee, PrintingPrice
+from snapshot_cache import _registry
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on a fresh SQLite database, with SQL statement budgets asserted"""
+    monkeypatch.setenv('CACHE_STAMP_DIR', str(tmp_path))
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "printcalc.db"}',
+        'ASSERT_QUERY_BUDGETS': True,
+        'CART_STORE_DIR': str(tmp_path / 'carts'),
+        'INVOICE_PDF_DIR': str(tmp_path / 'invoices'),
+        'ORDER_EVENTS_DIR': str(tmp_path / 'order-events'),
+    })
+    with app.app_context():
+        create_schema()
+        seed_defaults()
+        # Snapshots are per process; don't serve one built from another test's database
+        for cache in _registry.values():
+            cache.invalidate()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as the admin"""
+    client = app.test_client()
+    admin = Employee.query.filter_by(username='admin').one()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+        session['employee_id'] = admin.id
+    return client
+
+
+@pytest.fixture
+def make_books(app):
+    """Create priced books in one year and subject; returns their ids"""
+    from catalog import invalidate_catalog
+    from price_matrix import update_books_prices, invalidate_price_matrix
+
+    years = itertools.count(1)
+
+    def make_books(names, page_count=40):
+        year = AcademicYear(name=f'السنة {next(years)}')
+        db.session.add(year)
+        db.session.flush()
+        subject = Subject(name='الرياضيات', year_id=year.id)
+        db.session.add(subject)
+        db.session.flush()
+        books = [Book(name=name, page_count=page_count, subject_id=subject.id) for name in names]
+        db.session.add_all(books)
+        db.session.flush()
+        book_ids = [book.id for book in books]
+        update_books_prices(book_ids)
+        db.session.commit()
+        invalidate_catalog()
+        invalidate_price_matrix()
+        return book_ids
+
+    return make_books
+
+
+@pytest.fixture
+def make_orders(app, make_books):
+    """Create `count` new orders of one book through the bulk path; returns their order numbers"""
+    from bulk_orders import create_orders_in_bulk
+
+    book_ids = []
+
+    def make_orders(count):
+        if not book_ids:
+            book_ids.extend(make_books(['كتاب الطلبات']))
+        result = create_orders_in_bulk({
+            'printing_price_id': PrintingPrice.query.first().id,
+            'orders': [{'customer_name': f'عميل {index}', 'customer_phone': '01000000000',
+                        'items': [{'book_id': book_ids[0], 'quantity': 1}]} for index in range(count)],
+        })
+        assert not result['errors']
+        return [created['order_number'] for created in result['created']]
+
+    return make_orders
@@ -0,0 +1,15 @@
+from auth_context import AUTH_STAMP, TTLCache, invalidate_auth
+
+
+def test_invalidate_auth_reaches_other_workers(app):
+    # The auth cache of another worker on the same host
+    other_worker = TTLCache(60, stamp=AUTH_STAMP)
+    other_worker.put(7, 'context of employee 7')
+    other_worker.put(8, 'context of employee 8')
+    assert other_worker.get(7) == 'context of employee 7'
+
+    with app.test_request_context():
+        invalidate_auth(7)
+
+    assert other_worker.get(7) is None
+    assert other_worker.get(8) is None
@@ -0,0 +1,24 @@
+import threading
+from cart_store import FileCartStore
+
+
+def test_file_store_saves_one_cart_from_many_threads(tmp_path):
+    store = FileCartStore(60, str(tmp_path))
+    errors = []
+
+    def save_often(thread):
+        try:
+            for index in range(50):
+                store.save('cart', {'items': [thread, index]})
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save_often, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert store.load('cart')['items'][1] == 49
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['cart.json']
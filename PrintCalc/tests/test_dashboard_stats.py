@@ -0,0 +1,21 @@
+from sqlalchemy import event
+from app import db
+from dashboard_stats import get_order_counts
+from models import OrderCounter
+
+
+def test_counters_seeded_concurrently(app, make_orders):
+    make_orders(2)
+    OrderCounter.query.delete()
+    db.session.commit()
+
+    @event.listens_for(db.session(), 'before_flush', once=True)
+    def seeded_by_another_worker(session, flush_context, instances):
+        # The other worker commits its counters between our read and our insert
+        with db.engine.begin() as connection:
+            connection.execute(OrderCounter.__table__.insert(), [
+                {'name': 'total', 'value': 2}, {'name': 'status:new', 'value': 2},
+            ])
+
+    counts = get_order_counts()
+    assert (counts['total_orders'], counts['new_orders']) == (2, 2)
@@ -0,0 +1,27 @@
+from app import db
+from bulk_orders import create_orders_in_bulk
+from invoice_pdf import load_invoice_data
+from models import AddOn, PrintingPrice
+from pricing import invalidate_pricing
+
+
+def test_invoice_keeps_order_time_addon_prices(client, make_books):
+    book_id = make_books(['كتاب الفاتورة'])[0]
+    addon = AddOn.query.filter_by(is_active=True).first()
+    result = create_orders_in_bulk({
+        'printing_price_id': PrintingPrice.query.first().id,
+        'addons': [addon.id],
+        'orders': [{'customer_name': 'عميل', 'customer_phone': '01000000000',
+                    'items': [{'book_id': book_id, 'quantity': 2}]}],
+    })
+    order_number = result['created'][0]['order_number']
+    price_at_order = addon.price
+
+    addon.price += 10
+    db.session.commit()
+    invalidate_pricing()
+
+    data = load_invoice_data([order_number])[order_number]
+    assert data['addons'] == [addon.name]
+    assert data['addons_cost'] == round(price_at_order, 2)
+    assert data['total_cost'] == round(sum(item[3] for item in data['items']) + price_at_order, 2)
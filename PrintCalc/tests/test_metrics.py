@@ -0,0 +1,35 @@
+import json
+import os
+from metrics import collect_metrics, get_metrics
+
+
+def _total_requests(snapshot):
+    return sum(sum(counts.values()) for counts in snapshot['statuses'].values())
+
+
+def test_exited_workers_stay_in_the_totals(app, client, tmp_path):
+    metrics_dir = tmp_path / 'metrics'
+    app.config['METRICS_DIR'] = str(metrics_dir)
+    client.get('/admin/metrics')
+    with app.test_request_context():
+        snapshot = collect_metrics()
+    # A worker that has exited (no such pid) and served 5 requests
+    dead = json.loads(json.dumps(snapshot))
+    dead['statuses'] = {'index': {'200': 5}}
+    (metrics_dir / 'metrics-999999999.json').write_text(json.dumps(dead))
+
+    with app.test_request_context():
+        first = collect_metrics()
+        second = collect_metrics()
+
+    assert _total_requests(first) == _total_requests(snapshot) + 5
+    assert _total_requests(second) == _total_requests(first)
+    assert set(os.listdir(metrics_dir)) == {'metrics-dead.json', 'metrics-dead.lock',
+                                            f'metrics-{get_metrics().pid}.json'}
+
+
+def test_metrics_token_with_non_ascii_header(app):
+    app.config['METRICS_TOKEN'] = 'secret'
+    client = app.test_client()
+    assert client.get('/admin/metrics', headers={'Authorization': 'Bearer سر'}).status_code == 403
+    assert client.get('/admin/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
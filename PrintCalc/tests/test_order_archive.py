@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import db
+from models import Order, ArchivedOrder, ArchivedOrderItem
+from order_archive import archive_orders
+from order_status import bulk_update_status
+from rollups import get_report, rebuild_rollups
+
+
+def _completed_long_ago(order_numbers, days):
+    bulk_update_status('completed', order_numbers=order_numbers)
+    db.session.execute(
+        update(Order).where(Order.order_number.in_(order_numbers))
+        .values(completed_at=datetime.utcnow() - timedelta(days=days))
+    )
+    db.session.commit()
+
+
+def test_archive_moves_only_old_completed_orders(app, client, make_orders):
+    old = make_orders(5)
+    recent = make_orders(2)
+    _completed_long_ago(old, 200)
+    _completed_long_ago(recent[:1], 10)
+
+    result = archive_orders(180, batch_size=2)
+
+    assert (result.orders, result.items, result.batches) == (5, 5, 3)
+    assert {order.order_number for order in ArchivedOrder.query.all()} == set(old)
+    assert ArchivedOrderItem.query.count() == 5
+    assert {order.order_number for order in Order.query.all()} == set(recent)
+    assert archive_orders(180).orders == 0
+
+
+def test_archived_orders_stay_readable(app, client, make_orders):
+    old = make_orders(3)
+    make_orders(1)
+    _completed_long_ago(old, 200)
+    archive_orders(180)
+
+    response = client.get(f'/admin/orders/{old[0]}')
+    assert response.status_code == 200
+    assert old[0] in response.get_data(as_text=True)
+    assert client.get(f'/order/{old[0]}').status_code == 200
+
+    # The live list leaves archived orders out, the counters still know them
+    html = client.get('/admin/orders').get_data(as_text=True)
+    assert not any(order_number in html for order_number in old)
+    counts = client.get('/api/orders/counts').json
+    assert (counts['total_orders'], counts['completed_orders'], counts['archived_orders']) == (4, 3, 3)
+
+
+def test_rollup_rebuild_reads_the_archive(app, make_orders):
+    old = make_orders(4)
+    make_orders(1)
+    _completed_long_ago(old, 200)
+    start, end = datetime.utcnow().date() - timedelta(days=365), datetime.utcnow().date()
+    before = get_report(start, end).totals
+
+    archive_orders(180)
+    rebuild_rollups()
+
+    assert get_report(start, end).totals == before
@@ -0,0 +1,28 @@
+import json
+import queue
+import time
+from order_events import FileFanout
+
+
+def _next(delivered):
+    return delivered.get(timeout=5)['n']
+
+
+def test_tailer_reads_late_writes_to_the_rotated_segment(tmp_path):
+    fanout = FileFanout(str(tmp_path), poll_seconds=0.01, max_bytes=10)
+    delivered = queue.Queue()
+    fanout.publish({'n': 0})  # passes max_bytes: segment 1 is created
+    fanout.start(delivered.put)
+    time.sleep(0.2)  # the tailer starts at the end of segment 1
+
+    fanout.publish({'n': 1})
+    assert _next(delivered) == 1
+    fanout.publish({'n': 2})  # rotates to segment 2; the tailer follows
+    assert _next(delivered) == 2
+    fanout.publish({'n': 3})
+    assert _next(delivered) == 3
+
+    # A publisher that picked segment 1 before the rotation writes after the tailer moved on
+    with open(fanout._path(1), 'ab') as late:
+        late.write((json.dumps({'n': 4}) + '\n').encode())
+    assert _next(delivered) == 4
@@ -0,0 +1,71 @@
+from models import Order, DailyTypeRollup
+from dashboard_stats import reconcile_order_counters
+
+
+def _status(order_number):
+    return Order.query.filter_by(order_number=order_number).one().status
+
+
+def test_bulk_status_follows_allowed_transitions(client, make_orders):
+    order_numbers = make_orders(3)
+
+    response = client.post('/admin/api/orders/status', json={'status': 'in_progress', 'order_numbers': order_numbers[:2]})
+    assert response.status_code == 200
+    assert response.json['updated'] == 2
+
+    # in_progress -> in_progress is not a transition: only the new order moves
+    response = client.post('/admin/api/orders/status', json={'status': 'in_progress', 'order_numbers': order_numbers})
+    assert response.json['updated'] == 1
+    assert response.json['skipped'] == 2
+
+    response = client.post('/admin/api/orders/status', json={'status': 'completed', 'filter': {'status': 'in_progress'}})
+    assert response.json['updated'] == 3
+    assert response.json['by_previous_status'] == {'in_progress': 3}
+
+    counts = client.get('/api/orders/counts').json
+    assert (counts['new_orders'], counts['in_progress_orders'], counts['completed_orders']) == (0, 0, 3)
+    assert sum(row.completed_count for row in DailyTypeRollup.query.all()) == 3
+
+
+def test_bulk_status_rejects_unknown_status(client, make_orders):
+    order_numbers = make_orders(1)
+    response = client.post('/admin/api/orders/status', json={'status': 'shipped', 'order_numbers': order_numbers})
+    assert response.status_code == 400
+    assert _status(order_numbers[0]) == 'new'
+
+
+def test_reopening_clears_completed_at(client, make_orders):
+    order_numbers = make_orders(2)
+    client.post('/admin/api/orders/status', json={'status': 'completed', 'order_numbers': order_numbers})
+    assert all(order.completed_at for order in Order.query.all())
+
+    response = client.post('/admin/api/orders/status', json={'status': 'in_progress', 'order_numbers': order_numbers})
+    assert response.json['by_previous_status'] == {'completed': 2}
+    assert all(order.completed_at is None for order in Order.query.all())
+    assert sum(row.completed_count for row in DailyTypeRollup.query.all()) == 0
+    assert reconcile_order_counters() == {}
+
+
+def test_single_status_update_allows_any_status(client, make_orders):
+    order_number = make_orders(1)[0]
+    url = f'/admin/orders/{order_number}/status'
+
+    assert client.post(url, data={'status': 'completed'}).status_code == 302
+    assert _status(order_number) == 'completed'
+
+    # Already completed: nothing is counted twice
+    client.post(url, data={'status': 'completed'})
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1][0] == 'info'
+    assert sum(row.completed_count for row in DailyTypeRollup.query.all()) == 1
+
+    # Straight back to new, which the bulk actions don't allow
+    client.post(url, data={'status': 'new'})
+    order = Order.query.filter_by(order_number=order_number).one()
+    assert (order.status, order.completed_at) == ('new', None)
+    assert sum(row.completed_count for row in DailyTypeRollup.query.all()) == 0
+    assert reconcile_order_counters() == {}
+
+    assert client.post(url, data={'status': 'shipped'}).status_code == 302
+    assert _status(order_number) == 'new'
+    assert client.post('/admin/orders/no-such-order/status', data={'status': 'new'}).status_code == 404
@@ -0,0 +1,39 @@
+from models import AcademicYear, Subject
+
+
+def test_admin_catalog_views_within_budget(client, make_books):
+    make_books(['الجبر', 'الهندسة'])
+
+    for url in ('/admin/years', '/admin/subjects', '/admin/settings', '/admin/employees'):
+        response = client.get(url)
+        assert response.status_code == 200, url
+    assert 'الرياضيات' in client.get('/admin/subjects').get_data(as_text=True)
+
+
+def test_catalog_books_api_within_budget(client, make_books):
+    book_ids = make_books([f'كتاب {index}' for index in range(5)])
+    year_id = Subject.query.join(AcademicYear).first().year_id
+
+    response = client.get(f'/api/catalog/books?year_id={year_id}&limit=3')
+    assert response.status_code == 200
+    assert [book['id'] for book in response.json['books']] == book_ids[:3]
+    assert response.json['next_offset'] == 3
+    assert all(len(book['prices']) == 2 for book in response.json['books'])
+
+    response = client.get(f'/api/catalog/books?year_id={year_id}&offset=3&limit=3')
+    assert [book['id'] for book in response.json['books']] == book_ids[3:]
+    assert client.get('/api/catalog/books?year_id=0').status_code == 404
+
+
+def test_order_detail_within_budget(client, make_orders):
+    order_number = make_orders(1)[0]
+    response = client.get(f'/admin/orders/{order_number}')
+    assert response.status_code == 200
+    assert 'عميل 0' in response.get_data(as_text=True)
+
+
+def test_check_query_budgets_passes_on_a_seeded_database(app):
+    result = app.test_cli_runner().invoke(args=['check-query-budgets'])
+    assert result.exit_code == 0, result.output
+    assert 'api_catalog_books' in result.output
+    assert 'admin_order_detail' in result.output